@@ -0,0 +1,336 @@
+"""
+Open-loop load generator for cellaserv.
+
+Send requests to an action, or publish events, at a fixed offered rate, and
+report the throughput and the latency percentiles::
+
+    $ python3 -m cellaserv.bench request date time --rate 2000 --duration 10
+    $ python3 -m cellaserv.bench publish tick --rate 5000 --processes 2
+
+The schedule is fixed before the run: the n-th message is due at
+``start + n / rate``, and its latency is measured from that time, not from
+the time it was actually sent. A slow reply therefore delays neither the
+following messages nor their measurement, which would hide the queueing
+delay (coordinated omission).
+
+The load is spread over ``--processes`` processes, each sending on
+``--connections`` pipelined ``SynClient`` connections. The latency of a
+request is the time until its reply. The latency of a publish is the time
+until it is received by a subscriber opened by the generator, which uses the
+wall clock and therefore needs all the processes to run on the same machine.
+
+With ``--fake``, the generator starts a ``cellaserv.testing.FakeBroker`` and
+an ``echo`` action on the ``bench`` service, to measure the client without
+cellaserv.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import wait
+from functools import partial
+
+from cellaserv.protobuf.cellaserv_pb2 import Message, Publish
+
+import cellaserv.settings
+from cellaserv.client import SynClient
+from cellaserv.metrics import Histogram
+
+# Delay between the creation of the processes and the start of the schedule,
+# so that all the processes are connected before it starts
+START_DELAY = .5
+
+
+def _connect(options):
+    if options.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(options.socket)
+        return sock
+    return socket.create_connection((options.host, options.port))
+
+
+def _encode_data(options):
+    return options.data.encode() if options.data else None
+
+
+def _request_worker(options, index, start, clients):
+    """Send the requests of the process ``index``, return its results."""
+    lock = threading.Lock()
+    latency = Histogram()
+    errors = Counter()
+    data = _encode_data(options)
+
+    def _done(due, future):
+        elapsed = time.perf_counter() - due
+        error = future.exception()
+        with lock:
+            if error is None:
+                latency.record(elapsed)
+            else:
+                errors[type(error).__name__] += 1
+
+    futures = []
+    for due, client in _schedule(options, index, start, clients):
+        future = client.request_async(options.action, options.service,
+                                      options.identification, data)
+        future.add_done_callback(partial(_done, due))
+        futures.append(future)
+
+    _, not_done = wait(futures, timeout=options.timeout)
+    with lock:
+        errors['Timeout'] += len(not_done)
+        return latency.to_dict(), dict(errors), len(futures)
+
+
+def _publish_worker(options, index, start, clients):
+    """Publish the events of the process ``index``, return its results."""
+    data = json.loads(options.data) if options.data else {}
+    sent = 0
+    # Convert due times to the wall clock, used by the subscriber
+    wall_offset = time.time() - time.perf_counter()
+    for due, client in _schedule(options, index, start, clients):
+        data['bench_due'] = due + wall_offset
+        client.publish(options.event, json.dumps(data).encode())
+        sent += 1
+    return None, {}, sent
+
+
+def _schedule(options, index, start, clients):
+    """
+    Yield the due time of each message sent by the process ``index``, and the
+    client to send it with, once it is due.
+    """
+    rate = options.rate / options.processes
+    interval = 1 / rate
+    # Interleave the schedules of the processes
+    t0 = (time.perf_counter() + (start - time.time())
+          + index * interval / options.processes)
+
+    for i in range(int(options.duration * rate)):
+        due = t0 + i * interval
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield due, clients[i % len(clients)]
+
+
+def _worker(options, index, start, results):
+    clients = [SynClient(_connect(options), pipelined=True)
+               for _ in range(options.connections)]
+    worker = (_request_worker if options.command == 'request'
+              else _publish_worker)
+    try:
+        results.put(worker(options, index, start, clients))
+    finally:
+        for client in clients:
+            client.close()
+
+
+def _subscriber(options, ready, latency, stop):
+    """Record the delivery latency of the published events."""
+    client = SynClient(_connect(options))
+    client.subscribe(options.event)
+    # The reply proves that the subscription was handled
+    client.request('list-services', 'cellaserv')
+    ready.set()
+
+    while not stop.is_set():
+        try:
+            message = client.read_message()
+        except OSError:
+            return
+        if message.type != Message.Publish:
+            continue
+        received = time.time()
+        publish = Publish()
+        publish.ParseFromString(message.content)
+        due = json.loads(publish.data.decode())['bench_due']
+        latency.record(received - due)
+
+
+def run(options):
+    """
+    Run the load generator.
+
+    :return: The results, as a dict that can be encoded in JSON.
+    """
+    latency = Histogram()
+    errors = Counter()
+    sent = 0
+
+    if options.command == 'publish':
+        ready = threading.Event()
+        stop = threading.Event()
+        subscriber = threading.Thread(
+            target=_subscriber, args=(options, ready, latency, stop),
+            daemon=True)
+        subscriber.start()
+        ready.wait()
+
+    start = time.time() + START_DELAY
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_worker,
+                                         args=(options, i, start, results))
+                 for i in range(options.processes)]
+    for process in processes:
+        process.start()
+
+    for _ in processes:
+        process_latency, process_errors, process_sent = results.get()
+        if process_latency is not None:
+            latency.merge(Histogram.from_dict(process_latency))
+        errors.update(process_errors)
+        sent += process_sent
+    end = time.time()
+
+    for process in processes:
+        process.join()
+
+    if options.command == 'publish':
+        # Let the last events arrive
+        deadline = time.time() + options.timeout
+        while latency.count < sent and time.time() < deadline:
+            time.sleep(.01)
+        stop.set()
+        errors['Lost'] = sent - latency.count
+        end = time.time()
+
+    percentiles = {p: latency.percentile(p)
+                   for p in (50, 90, 99, 99.9, 99.99)}
+    return {
+        'command': options.command,
+        'target': (options.event if options.command == 'publish'
+                   else '{0}.{1}'.format(options.service, options.action)),
+        'offered_rate': options.rate,
+        'duration': options.duration,
+        'processes': options.processes,
+        'connections': options.connections,
+        'sent': sent,
+        'completed': latency.count,
+        'throughput': latency.count / (end - start),
+        'errors': {k: v for k, v in errors.items() if v},
+        'latency': {
+            'min': latency.min,
+            'mean': latency.total / latency.count if latency.count else None,
+            'max': latency.max,
+            'percentiles': percentiles,
+            'buckets': latency.to_dict()['buckets'],
+        },
+    }
+
+
+def report(results, out=sys.stdout):
+    """Print ``results`` in a human readable form."""
+    def _ms(value):
+        return '-' if value is None else '{:.3f} ms'.format(value * 1e3)
+
+    print("{command} {target}: {processes} processes x {connections} "
+          "connections".format(**results), file=out)
+    print("offered rate {offered_rate:.0f}/s, throughput {throughput:.0f}/s, "
+          "sent {sent}, completed {completed}".format(**results), file=out)
+    for error, count in sorted(results['errors'].items()):
+        print("  {0}: {1}".format(error, count), file=out)
+
+    latency = results['latency']
+    print("latency min {0}, mean {1}, max {2}".format(
+        _ms(latency['min']), _ms(latency['mean']), _ms(latency['max'])),
+        file=out)
+    for percentile, value in sorted(latency['percentiles'].items()):
+        print("  p{0:<6} {1:>12}".format(percentile, _ms(value)), file=out)
+
+
+def parse_args(argv=None):
+    # Options of all the commands
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--host', default=None,
+                        help="cellaserv host, defaults to the settings")
+    common.add_argument('--port', type=int, default=None,
+                        help="cellaserv port, defaults to the settings")
+    common.add_argument('--socket', default=None,
+                        help="unix socket of cellaserv, defaults to the "
+                        "settings if neither --host nor --port is given")
+    common.add_argument('--rate', type=float, default=1000,
+                        help="messages per second, for all the processes")
+    common.add_argument('--duration', type=float, default=10,
+                        help="duration of the run, in seconds")
+    common.add_argument('--processes', type=int, default=1)
+    common.add_argument('--connections', type=int, default=1,
+                        help="connections per process")
+    common.add_argument('--timeout', type=float, default=5,
+                        help="seconds to wait for the last replies")
+    common.add_argument('--data', default=None,
+                        help="JSON data of the messages")
+    common.add_argument('--json', dest='json_output', default=None,
+                        help="save the results as JSON in this file")
+    common.add_argument('--fake', action='store_true',
+                        help="run against an in-process fake broker")
+
+    parser = argparse.ArgumentParser(
+        prog='python3 -m cellaserv.bench',
+        description="Open-loop load generator for cellaserv.")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    request = commands.add_parser('request', parents=[common],
+                                  help="send requests")
+    request.add_argument('service')
+    request.add_argument('action')
+    request.add_argument('--identification', default=None)
+    publish = commands.add_parser('publish', parents=[common],
+                                  help="publish events")
+    publish.add_argument('event')
+
+    options = parser.parse_args(argv)
+    if options.socket is None and not (options.host or options.port):
+        options.socket = cellaserv.settings.SOCKET
+    options.host = options.host or cellaserv.settings.HOST
+    options.port = options.port or cellaserv.settings.PORT
+    return options
+
+
+def _serve_fake_broker(options):
+    """Start a fake broker with a ``bench`` service, for ``--fake``."""
+    from cellaserv.service import Service
+    from cellaserv.testing import FakeBroker
+
+    class Bench(Service):
+
+        @Service.action
+        def echo(self, *args, **kwargs):
+            return args or kwargs or None
+
+    broker = FakeBroker(request_timeout=options.timeout).start()
+    options.host, options.port = broker.address
+    options.socket = None
+    with broker.settings():
+        broker.serve(Bench)
+    return broker
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    # Errors are counted in the results, do not log each of them
+    logging.disable(logging.ERROR)
+
+    broker = None
+    try:
+        if options.fake:
+            broker = _serve_fake_broker(options)
+        results = run(options)
+    finally:
+        if broker is not None:
+            broker.stop()
+        logging.disable(logging.NOTSET)
+
+    report(results)
+    if options.json_output:
+        with open(options.json_output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
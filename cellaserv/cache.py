@@ -0,0 +1,110 @@
+"""
+Cache with a time to live and LRU eviction, used to cache the replies of
+actions.
+
+Entries expire ``ttl`` seconds after they were stored. When the cache holds
+``maxsize`` entries, storing a new one evicts the least recently used.
+
+The cache counts its hits and misses. It can be used from multiple threads.
+
+Example::
+
+    >>> cache = TTLCache(maxsize=2, ttl=60)
+    >>> cache.put('a', b'1')
+    >>> cache.get('a')
+    b'1'
+    >>> cache.get('b', 'missing')
+    'missing'
+    >>> cache.stats()['hits'], cache.stats()['misses']
+    (1, 1)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Cache with a time to live and LRU eviction."""
+
+    def __init__(self, maxsize=128, ttl=None):
+        """
+        :param int maxsize: Maximum number of entries.
+        :param float ttl: Time to live of the entries, in seconds. If None,
+            entries do not expire.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # map keys to (expiry time, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Incremented when entries are invalidated, see put()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the value of ``key``, or ``default`` if it is missing."""
+        with self._lock:
+            try:
+                expiry, value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expiry is not None and expiry <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """
+        Store ``value`` for ``key``.
+
+        :param int generation: If given, only store the value if no entry was
+            invalidated since ``generation`` was read, so that a value computed
+            before an invalidation is not stored after it.
+        """
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        """Invalidate the entry of ``key``, if any."""
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Invalidate all the entries."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Return the size, hits, misses and evictions of the cache."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -7,13 +7,18 @@ high level API you should use ``cellaserv.service.Service``.
 Sample usage is provided in the ``example/`` folder of the source distribution.
 """
 
-import asynchat
-import fnmatch
+import asyncio
 import logging
+import queue
 import random
-import struct
+import socket
 import threading
-from collections import deque
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from functools import partial
 
 from collections import defaultdict
 
@@ -28,13 +33,30 @@ from cellaserv.protobuf.cellaserv_pb2 import (
     Subscribe
 )
 
-from cellaserv.settings import DEBUG, get_socket
+from cellaserv import envelope, local
+from cellaserv.framing import HEADER, FrameDecoder
+from cellaserv.patterns import PatternIndex
+from cellaserv.settings import DEBUG, FAST_CODEC, LOCAL_DISPATCH, get_socket
+
+try:
+    import asynchat
+except ImportError:
+    # asynchat and asyncore were removed in python 3.12, only the asyncio
+    # client is available there.
+    asynchat = None
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG if DEBUG >= 2
                 else logging.INFO if DEBUG == 1
                 else logging.WARNING)
 
+
+def _message_to_string(msg):
+    """Text representation of a protobuf or ``cellaserv.envelope`` message."""
+    if isinstance(msg, envelope.DecodedMessage):
+        return str(msg)
+    return MessageToString(msg).decode()
+
 # Exceptions
 
 
@@ -43,7 +65,7 @@ class ReplyError(Exception):
         self.rep = rep
 
     def __str__(self):
-        return MessageToString(self.rep).decode()
+        return _message_to_string(self.rep)
 
 
 class RequestTimeout(ReplyError):
@@ -81,25 +103,211 @@ class NoSuchMethod(Exception):
     def __str__(self):
         return "No such method: {0}.{1}".format(self.service, self.method)
 
+
+def _check_reply(reply, method, service, identification=None):
+    """
+    Return the data of ``reply``, or raise the exception matching its error.
+    """
+    if reply.HasField('error'):
+        logger.error("[Reply] Received error")
+        if reply.error.type == Reply.Error.Timeout:
+            raise RequestTimeout(reply)
+        elif reply.error.type == Reply.Error.NoSuchService:
+            raise NoSuchService(service)
+        elif reply.error.type == Reply.Error.InvalidIdentification:
+            raise NoSuchIdentification(service, identification)
+        elif reply.error.type == Reply.Error.NoSuchMethod:
+            raise NoSuchMethod(service, method)
+        elif reply.error.type == Reply.Error.BadArguments:
+            raise BadArguments(reply)
+        else:
+            raise ReplyError(reply)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received:\n%s", _message_to_string(reply))
+
+    return reply.data if reply.HasField('data') else None
+
+
+def _request_timeout(timeout, req_id=None):
+    """Return the ``RequestTimeout`` of a request without reply."""
+    error = Reply.Error(type=Reply.Error.Timeout,
+                        what="No reply after {0}s".format(timeout))
+    reply = Reply(error=error)
+    if req_id is not None:
+        reply.id = req_id
+    return RequestTimeout(reply)
+
+
+def _local_request(target, method, service, identification, data,
+                   inline=False):
+    """
+    Send a request to ``target``, a service of this process, see
+    ``cellaserv.local``.
+
+    :return: A future resolved with the data of the reply, or with the
+        exception raised by ``_check_reply()``.
+    :rtype: concurrent.futures.Future
+    """
+    future = Future()
+
+    def _on_reply(reply):
+        try:
+            future.set_result(
+                _check_reply(reply, method, service, identification))
+        except Exception as e:
+            future.set_exception(e)
+
+    local.request(target, method, identification, data, _on_reply, inline)
+    return future
+
+# Event loop
+
+_thread_local = threading.local()
+
+
+def get_event_loop():
+    """
+    Return the asyncio event loop running in this thread, or the loop used by
+    the clients of this thread. It is created on first use.
+    """
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+
+    loop = getattr(_thread_local, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _thread_local.loop = loop
+    return loop
+
+
+def _in_loop_thread(loop):
+    """Return True if the caller is running inside ``loop``."""
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
 # Clients
 
 
 class AbstractClient:
-    """Abstract client. Send protobuf messages."""
+    """
+    Abstract client. Send protobuf messages.
+
+    Outgoing messages can be batched: they are gathered in a buffer and
+    written at once, saving a system call per message. Messages sent in a
+    ``batch()`` block are always batched. If ``batch_delay`` is not None,
+    every message is batched and the buffer is flushed at most
+    ``batch_delay`` seconds later. In both cases, the buffer is flushed as
+    soon as it holds ``batch_size`` bytes.
+    """
+
+    # Flush the batched messages when they reach this size, in bytes
+    batch_size = 64 * 1024
+    # Maximum delay before the batched messages are flushed, in seconds. If
+    # None, messages are only batched in batch() blocks.
+    batch_delay = None
+    # Encode and decode messages with ``cellaserv.envelope`` instead of the
+    # protobuf classes
+    fast_codec = bool(FAST_CODEC) and envelope.AVAILABLE
+    # Dispatch requests and events to the services of this process without
+    # going through cellaserv, see ``cellaserv.local``
+    local_dispatch = bool(LOCAL_DISPATCH)
 
     def __init__(self):
         # Nonce used to identify requests
         self._request_seq_id = random.randrange(0, 2**32)
 
+        # Batched messages, with their header
+        self._obuffer = bytearray()
+        # Serialize the writes, so that messages are sent in order
+        self._write_lock = threading.RLock()
+        # Pending call to flush(), if any
+        self._flush_timer = None
+        # Depth of the batch() blocks of each thread
+        self._batch_state = threading.local()
+
     def send_message(self, msg):
         logger.debug("Sending:\n%s", msg)
 
         self._send_message(msg=msg.SerializeToString())
 
-    def _send_message(self, *args, **kwargs):
-        """Implementation specific method for sending messages."""
+    def _send_message(self, msg):
+        """Send the serialized message ``msg``, or add it to the batch."""
+        self._send_frame(HEADER.pack(len(msg)) + msg)
+
+    def _send_frame(self, frame):
+        """Send ``frame``, a message and its header, or add it to the batch."""
+        with self._write_lock:
+            batching = getattr(self._batch_state, 'depth', 0) > 0
+            if not batching and self.batch_delay is None:
+                if self._obuffer:
+                    # Keep the batched messages in order
+                    self.flush()
+                self._write(frame)
+                return
+
+            self._obuffer += frame
+
+            if len(self._obuffer) >= self.batch_size:
+                self.flush()
+            elif not batching and self._flush_timer is None:
+                self._flush_timer = self._schedule_flush()
+
+    def _write(self, data):
+        """Implementation specific method for writing bytes to cellaserv."""
         raise NotImplementedError
 
+    def _schedule_flush(self):
+        """
+        Arrange for ``flush()`` to be called in ``batch_delay`` seconds.
+
+        :return: An object with a ``cancel()`` method.
+        """
+        timer = threading.Timer(self.batch_delay, self.flush)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def flush(self):
+        """Write the batched messages."""
+        with self._write_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+            if not self._obuffer:
+                return
+
+            data = self._obuffer
+            self._obuffer = bytearray()
+            self._write(data)
+
+    @contextmanager
+    def batch(self):
+        """
+        Batch the messages sent by this thread in the ``with`` block, they are
+        written when the outermost block exits.
+
+        Example::
+
+            >>> with client.batch():
+            ...     for i in range(1000):
+            ...         client.publish('tick', str(i).encode())
+        """
+        state = self._batch_state
+        state.depth = getattr(state, 'depth', 0) + 1
+        try:
+            yield self
+        finally:
+            state.depth -= 1
+            if state.depth == 0:
+                self.flush()
+
     def reply_to(self, req, data=None):
         """
         Send a reply to the request req, with optional data in the reply.
@@ -107,6 +315,10 @@ class AbstractClient:
         :param Request req: the original request
         :param bytes data: optional data to put in the reply
         """
+        if self.fast_codec:
+            self._send_frame(envelope.encode_reply(req.id, data))
+            return
+
         reply = Reply()
         reply.id = req.id
         if data:
@@ -124,6 +336,11 @@ class AbstractClient:
         :param Reply.Error error_type: An error code.
         :param bytes what: an error message.
         """
+        if self.fast_codec:
+            self._send_frame(envelope.encode_reply(req.id, None, error_type,
+                                                   what))
+            return
+
         error = Reply.Error()
         error.type = error_type
         if what is not None:
@@ -146,6 +363,10 @@ class AbstractClient:
         :param str identification: Optional identification for the service.
         """
 
+        if self.fast_codec:
+            self._send_frame(envelope.encode_register(name, identification))
+            return
+
         register = Register(name=name)
         if identification:
             register.identification = identification
@@ -166,24 +387,39 @@ class AbstractClient:
         :rtype: int
         """
 
+        req_id = self._next_request_id()
+        self._send_request_message(req_id, method, service, identification,
+                                   data)
+        return req_id
+
+    def _next_request_id(self):
+        """Return the id of a new request."""
+        req_id = self._request_seq_id
+        self._request_seq_id += 1
+        return req_id
+
+    def _send_request_message(self, req_id, method, service, identification,
+                              data):
+        """Send the ``request`` message of id ``req_id``."""
         logger.info("[Request] %s/%s.%s(%s)", service, identification, method,
                     data)
 
-        request = Request(service_name=service, method=method)
+        if self.fast_codec:
+            self._send_frame(envelope.encode_request(
+                req_id, service, method, identification, data))
+            return
+
+        request = Request(service_name=service, method=method, id=req_id)
         if identification:
             request.service_identification = identification
         if data:
             request.data = data
-        request.id = self._request_seq_id
-        self._request_seq_id += 1
 
         message = Message(type=Message.Request,
                           content=request.SerializeToString())
 
         self.send_message(message)
 
-        return request.id
-
     def publish(self, event, data=None):
         """
         Send a ``publish`` message.
@@ -194,6 +430,13 @@ class AbstractClient:
 
         logger.info("[Publish] %s(%s)", event, data)
 
+        if self.local_dispatch:
+            local.publish(event, data)
+
+        if self.fast_codec:
+            self._send_frame(envelope.encode_publish(event, data))
+            return
+
         publish = Publish(event=event)
         if data:
             publish.data = data
@@ -212,6 +455,10 @@ class AbstractClient:
 
         logger.info("[Subscribe] %s", event)
 
+        if self.fast_codec:
+            self._send_frame(envelope.encode_subscribe(event))
+            return
+
         subscribe = Subscribe(event=event)
 
         message = Message(type=Message.Subscribe,
@@ -225,161 +472,684 @@ class SynClient(AbstractClient):
     Synchronous (aka. blocking) cellaserv client.
 
     Wait for ``reply`` after every ``request`` message.
+
+    A pipelined client can have multiple requests in flight on the same
+    connection: ``request_async()`` returns a future for the reply and a
+    reader thread routes each reply to its future, using the id of the
+    request. It is safe to send requests from multiple threads.
+
+    Example::
+
+        >>> client = SynClient(pipelined=True)
+        >>> futures = [client.request_async('time', 'date') for _ in range(10)]
+        >>> [f.result() for f in futures]
+
+    ``timeout`` is the default deadline of the requests, in seconds. When it
+    expires, ``RequestTimeout`` is raised without waiting for cellaserv, and
+    the reply is discarded if it arrives later.
     """
 
-    def __init__(self, sock=None):
+    # Number of expired requests remembered to discard their late reply
+    expired_requests_max = 1024
+
+    def __init__(self, sock=None, pipelined=False, timeout=None):
         super().__init__()
 
         self._socket = sock or get_socket()
+        self._decoder = FrameDecoder()
         self.missed_msg = deque()
 
-    def _send_message(self, msg):
-        self._socket.send(struct.pack("!I", len(msg)) + msg)
+        self.timeout = timeout
+        # Ids of the requests that expired, used as an ordered set
+        self._expired_requests = OrderedDict()
+
+        # Protects the table of futures and the expired requests. It is not
+        # held while writing to the socket: the reader thread must be able to
+        # route replies while a sender is blocked on a full socket buffer.
+        self._futures_lock = threading.Lock()
+
+        self.pipelined = pipelined
+        if pipelined:
+            # map request ids to (future, method, service, identification)
+            self._reply_futures = {}
+            # Non reply messages, read by read_message()
+            self._messages = queue.Queue()
+
+            self._reader = threading.Thread(target=self._reader_loop)
+            self._reader.daemon = True
+            self._reader.start()
+
+    def _write(self, data):
+        # The socket may have the timeout of a request waiting for its reply.
+        # sendall() could stop in the middle of a message on timeout and
+        # corrupt the stream, only retry the writes that sent nothing.
+        view = memoryview(data)
+        while view:
+            try:
+                sent = self._socket.send(view)
+            except socket.timeout:
+                continue
+            view = view[sent:]
+
+    def close(self):
+        """Close the connection to cellaserv."""
+        self.flush()
+        self._socket.close()
+
+    def _recv_frame(self):
+        """Read the frame of a message from the socket."""
+        # A single recv may have returned multiple messages, only read from
+        # the socket if there is no complete message left.
+        frame = self._decoder.next_frame()
+        while frame is None:
+            if self._decoder.recv_into(self._socket) == 0:
+                raise ConnectionError("Connection to cellaserv closed")
+            frame = self._decoder.next_frame()
+        return frame
+
+    def _recv_message(self):
+        """Read a message from the socket."""
+        with self._recv_frame() as frame:
+            message = Message()
+            message.ParseFromString(frame)
+
+        return message
+
+    def _recv_reply(self):
+        """
+        Read a message from the socket, and parse its content if it is a
+        reply.
+
+        :return: ``(None, reply)`` for replies, ``(message, None)`` for other
+            messages.
+        """
+        with self._recv_frame() as frame:
+            if self.fast_codec:
+                msg_type, content = envelope.decode(frame)
+                if msg_type == Message.Reply:
+                    return None, content
+
+            message = Message()
+            message.ParseFromString(frame)
+
+        if message.type != Message.Reply:
+            return message, None
+
+        reply = Reply()
+        reply.ParseFromString(message.content)
+        return None, reply
 
     def read_message(self, reply=False):
         """Read a message from the socket or the missed message queue."""
+        # Messages we wait an answer for may still be batched
+        self.flush()
+
+        if self.pipelined:
+            # Replies are consumed by the reader thread
+            message = self._messages.get()
+            if isinstance(message, Exception):
+                # Let other readers see the error too
+                self._messages.put(message)
+                raise message
+            return message
+
         # Check if missed message queue is empty
         if len(self.missed_msg) > 0 and reply == False:
             return self.missed_msg.pop()
-        # Receive message header
-        hdr = self._socket.recv(4)
-        # Header is the size of the message as a uint32 in network byte order
-        msg_len = struct.unpack("!I", hdr)[0]
-
-        # Receive message, which may be in multiple packets so use a loop
-        msg = b""
-        while msg_len != 0:
-            buf = self._socket.recv(msg_len)
-            msg_len -= len(buf)
-            msg += buf
-
-        # Parse message
-        message = Message()
-        message.ParseFromString(msg)
 
-        return message
+        return self._recv_message()
+
+    def _reader_loop(self):
+        """Route incoming replies to their futures, used in pipelined mode."""
+        while True:
+            try:
+                message, reply = self._recv_reply()
+            except Exception as e:
+                logger.debug("[Reader] Stopping: %s", e)
+                self._fail_futures(e)
+                self._messages.put(e)
+                return
+
+            if reply is None:
+                self._messages.put(message)
+                continue
+
+            with self._futures_lock:
+                pending = self._reply_futures.pop(reply.id, None)
+
+            if pending is None:
+                self._drop_reply(reply)
+                continue
+
+            future, method, service, identification = pending
+            try:
+                future.set_result(
+                    _check_reply(reply, method, service, identification))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _expire(self, req_id, timeout):
+        """
+        Record that the request ``req_id`` expired after ``timeout`` seconds.
+
+        :return: The ``RequestTimeout`` exception to raise.
+        """
+        with self._futures_lock:
+            self._expired_requests[req_id] = None
+            if len(self._expired_requests) > self.expired_requests_max:
+                self._expired_requests.popitem(last=False)
+
+        logger.error("[Request] No reply after %ss for request #%s", timeout,
+                     req_id)
+        return _request_timeout(timeout, req_id)
+
+    def _drop_reply(self, reply):
+        """Drop a reply that nobody waits for."""
+        with self._futures_lock:
+            try:
+                del self._expired_requests[reply.id]
+            except KeyError:
+                expired = False
+            else:
+                expired = True
+
+        if expired:
+            logger.debug("[Request] Dropping late Reply: %s",
+                         _message_to_string(reply))
+        else:
+            logger.warning("[Request] Dropping Reply for unknown "
+                           "request: " + _message_to_string(reply))
+
+    def _fail_futures(self, exc):
+        """Fail all the pending requests with ``exc``."""
+        with self._futures_lock:
+            pending = list(self._reply_futures.values())
+            self._reply_futures.clear()
+
+        for future, *_ in pending:
+            future.set_exception(exc)
 
     # Actions
 
-    def request(self, method, service, identification=None, data=None):
+    def request_async(self, method, service, identification=None, data=None):
+        """
+        Send a ``request`` without waiting for the reply, only available on
+        pipelined clients. If the request is batched, the reply cannot be
+        received before the batch is flushed.
+
+        :return: A future resolved with the data of the reply, or with the
+            exception ``request()`` would raise.
+        :rtype: concurrent.futures.Future
+        """
+        if not self.pipelined:
+            raise RuntimeError("request_async() needs a pipelined client")
+
+        if self.local_dispatch:
+            target = local.lookup(service, identification)
+            if target is not None:
+                return _local_request(target, method, service, identification,
+                                      data)
+
+        return self._send_request(method, service, identification, data)[1]
+
+    def _send_request(self, method, service, identification, data):
+        """
+        Send a request in pipelined mode.
+
+        :return: The id of the request and the future of its reply.
+        """
+        future = Future()
+        # Register the future before sending, the reply may be read before
+        # the request is written entirely
+        with self._futures_lock:
+            req_id = self._next_request_id()
+            self._reply_futures[req_id] = (future, method, service,
+                                           identification)
+        try:
+            self._send_request_message(req_id, method, service,
+                                       identification, data)
+        except BaseException:
+            with self._futures_lock:
+                self._reply_futures.pop(req_id, None)
+            raise
+        return req_id, future
+
+    def request(self, method, service, identification=None, data=None,
+                timeout=None):
         """
         Send a blocking ``request``.
 
         Send the ``request`` message, then wait for the reply.
+
+        :param float timeout: Raise ``RequestTimeout`` if there is no reply
+            after this number of seconds, defaults to the timeout of the
+            client.
         """
 
+        if timeout is None:
+            timeout = self.timeout
+
+        if self.local_dispatch:
+            target = local.lookup(service, identification)
+            if target is not None:
+                return self._local_request(target, method, service,
+                                           identification, data, timeout)
+
+        if self.pipelined:
+            req_id, future = self._send_request(method, service,
+                                                identification, data)
+            self.flush()
+            return self._wait_reply(req_id, future, timeout, timeout)
+
         # Send the request
         req_id = super().request(method=method, service=service,
                                  identification=identification, data=data)
 
         # Wait for response
-        while True:
-            message = self.read_message(reply=True)
+        reply = self._recv_replies({req_id: (method, service,
+                                             identification)},
+                                   timeout, timeout)[req_id]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def request_many(self, requests, timeout=None):
+        """
+        Send multiple requests back-to-back, then wait for all the replies.
 
-            if message.type != Message.Reply:
-                # Currentyle Dropping non-reply is not an issue as the
-                # SynClient is only used to send queries
-                logger.debug("[Request] Non Reply message queued for future use")
-                self.missed_msg.append(message)
-                continue
+        The requests are written at once, so this costs about one round trip
+        to cellaserv instead of one per request.
 
-            # Parse reply
-            reply = Reply()
-            reply.ParseFromString(message.content)
+        Example::
 
-            if reply.id != req_id:
-                logger.warning("[Request] Dropping Reply for the wrong "
-                               "request: " + MessageToString(reply).decode())
-                continue
+            >>> client.request_many([('sensor', 'left', 'read', None),
+            ...                      ('sensor', 'right', 'read', None)])
+            [b'12', b'14']
 
-            # Check if reply is an error
-            if reply.HasField('error'):
-                logger.error("[Reply] Received error")
-                if reply.error.type == Reply.Error.Timeout:
-                    raise RequestTimeout(reply)
-                elif reply.error.type == Reply.Error.NoSuchService:
-                    raise NoSuchService(service)
-                elif reply.error.type == Reply.Error.InvalidIdentification:
-                    raise NoSuchIdentification(service, identification)
-                elif reply.error.type == Reply.Error.NoSuchMethod:
-                    raise NoSuchMethod(service, method)
-                elif reply.error.type == Reply.Error.BadArguments:
-                    raise BadArguments(reply)
+        :param requests: List of ``(service, identification, method, data)``.
+        :param float timeout: Deadline of all the requests, in seconds,
+            defaults to the timeout of the client.
+        :return: The data of the replies, in the order of ``requests``. The
+            item of a failed request is the exception ``request()`` would
+            raise, ``NoSuchService`` or ``RequestTimeout`` for example.
+        :rtype: list
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        def remaining():
+            if timeout is None:
+                return None
+            return max(deadline - time.monotonic(), 0)
+
+        results = [None] * len(requests)
+        # map indexes of the results to (request id, future of the reply),
+        # the request id is None for local requests
+        futures = {}
+        # map the ids of the requests waiting for their reply on the socket
+        # to (method, service, identification)
+        pending = {}
+        # map the ids of these requests to indexes of the results
+        indexes = {}
+
+        with self.batch():
+            for i, (service, identification, method, data) in enumerate(
+                    requests):
+                target = None
+                if self.local_dispatch:
+                    target = local.lookup(service, identification)
+
+                if target is not None:
+                    inline = _in_loop_thread(target._loop)
+                    futures[i] = (None, _local_request(
+                        target, method, service, identification, data,
+                        inline))
+                elif self.pipelined:
+                    futures[i] = self._send_request(method, service,
+                                                    identification, data)
+                else:
+                    req_id = AbstractClient.request(
+                        self, method, service, identification=identification,
+                        data=data)
+                    pending[req_id] = (method, service, identification)
+                    indexes[req_id] = i
+
+        if pending:
+            replies = self._recv_replies(pending, remaining(), timeout)
+            for req_id, reply in replies.items():
+                results[indexes[req_id]] = reply
+
+        for i, (req_id, future) in futures.items():
+            try:
+                if req_id is None:
+                    service, _, method, _ = requests[i]
+                    results[i] = self._wait_local_reply(
+                        future, remaining(), timeout, service, method)
                 else:
-                    raise ReplyError(reply)
+                    results[i] = self._wait_reply(req_id, future,
+                                                  remaining(), timeout)
+            except Exception as e:
+                results[i] = e
 
-            logger.debug("Received:\n%s", MessageToString(reply).decode())
+        return results
 
-            return reply.data if reply.HasField('data') else None
+    def _wait_reply(self, req_id, future, wait, timeout):
+        """
+        Wait ``wait`` seconds for the reply of a pipelined request.
 
+        :param float timeout: Timeout of the request, for the error message.
+        """
+        try:
+            return future.result(wait)
+        except FutureTimeoutError:
+            with self._futures_lock:
+                pending = self._reply_futures.pop(req_id, None)
+            if pending is None:
+                # The reply arrived in the meantime
+                return future.result()
+            raise self._expire(req_id, timeout) from None
+
+    def _recv_replies(self, pending, wait, timeout):
+        """
+        Read the replies of requests from the socket, used when the client is
+        not pipelined.
+
+        :param dict pending: Maps the ids of the requests to their ``(method,
+            service, identification)``. Requests are removed when their reply
+            is read.
+        :param float wait: Stop reading after this number of seconds.
+        :param float timeout: Timeout of the requests, for the error message.
+        :return: The data of the replies, or the exceptions ``request()``
+            would raise, by request id.
+        :rtype: dict
+        """
+        replies = {}
 
-class AsynClient(asynchat.async_chat, AbstractClient):
-    """Asynchronous cellaserv client."""
+        # The requests may still be batched, send them before setting the
+        # timeout of the socket
+        self.flush()
 
-    def __init__(self, sock=None):
-        self._socket = sock or get_socket()
+        if wait is not None:
+            deadline = time.monotonic() + wait
+            socket_timeout = self._socket.gettimeout()
 
-        # Init base classes
-        asynchat.async_chat.__init__(self, sock=self._socket)
-        AbstractClient.__init__(self)
+        try:
+            while pending:
+                if wait is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._socket.settimeout(remaining)
 
-        self.push_lock = threading.Lock()
+                try:
+                    message = self.read_message(reply=True)
+                except socket.timeout:
+                    break
+
+                if message.type != Message.Reply:
+                    # Currentyle Dropping non-reply is not an issue as the
+                    # SynClient is only used to send queries
+                    logger.debug("[Request] Non Reply message queued for "
+                                 "future use")
+                    self.missed_msg.append(message)
+                    continue
+
+                # Parse reply
+                reply = Reply()
+                reply.ParseFromString(message.content)
 
-        # setup asynchat
-        self.set_terminator(4)  # first, we are looking for a message header
+                try:
+                    method, service, identification = pending.pop(reply.id)
+                except KeyError:
+                    self._drop_reply(reply)
+                    continue
 
-        # hold incoming data
-        self._ibuffer = bytearray()
-        self._read_header = True
+                try:
+                    replies[reply.id] = _check_reply(reply, method, service,
+                                                     identification)
+                except Exception as e:
+                    replies[reply.id] = e
+        finally:
+            if wait is not None:
+                self._socket.settimeout(socket_timeout)
+
+        for req_id in pending:
+            replies[req_id] = self._expire(req_id, timeout)
+        return replies
+
+    def _local_request(self, target, method, service, identification, data,
+                       timeout):
+        """Send a blocking request to ``target``, a service of this process."""
+        # Called from an action of a service sharing the loop of the target,
+        # waiting would block the loop: call the target now.
+        inline = _in_loop_thread(target._loop)
+        future = _local_request(target, method, service, identification, data,
+                                inline)
+        return self._wait_local_reply(future, timeout, timeout, service,
+                                      method)
+
+    @staticmethod
+    def _wait_local_reply(future, wait, timeout, service, method):
+        """Wait ``wait`` seconds for the reply of a local request."""
+        try:
+            return future.result(wait)
+        except FutureTimeoutError:
+            logger.error("[Request] No reply after %ss for local request "
+                         "%s.%s", timeout, service, method)
+            raise _request_timeout(timeout) from None
+
+
+class ClientPool:
+    """
+    Pool of ``SynClient`` connections, that can be used from multiple threads.
 
-        # map events to a list of callbacks
-        self._events_cb = defaultdict(list)
-        self._events_pattern_cb = defaultdict(list)
+    Connections are opened when needed, up to ``size`` connections. Each
+    request checks out a connection for its duration, then puts it back in
+    the pool. Connections idle for more than ``idle_timeout`` seconds are
+    closed.
 
-    def _send_message(self, msg):
-        # 'push' is asynchat version of socket.send
-        with self.push_lock:
-            self.push(struct.pack("!I", len(msg)) + msg)
+    The pool has the ``request()`` and ``publish()`` methods of a SynClient,
+    so it can be used as the client of a ``CellaservProxy``.
+    """
+
+    def __init__(self, size=8, idle_timeout=60, connect=None):
+        """
+        :param int size: Maximum number of connections.
+        :param float idle_timeout: Close the connections unused for this
+            number of seconds.
+        :param connect: Function returning a new connected SynClient.
+        """
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._connect = connect or SynClient
+
+        # Idle connections as (time of last use, client), most recent last
+        self._idle = deque()
+        # Number of open connections, idle or checked out
+        self._opened = 0
+        self._cond = threading.Condition()
+
+    def _evict_idle(self):
+        """Close the connections idle for too long, call with the lock."""
+        deadline = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][0] < deadline:
+            _, client = self._idle.popleft()
+            self._opened -= 1
+            client.close()
+
+    def checkout(self):
+        """Take a connection from the pool, open it if needed."""
+        with self._cond:
+            self._evict_idle()
+            while not self._idle and self._opened >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()[1]
+            self._opened += 1
+
+        try:
+            return self._connect()
+        except:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+    def checkin(self, client, broken=False):
+        """
+        Put back a connection in the pool. ``broken`` connections are closed.
+        """
+        with self._cond:
+            if broken:
+                self._opened -= 1
+                client.close()
+            else:
+                self._idle.append((time.monotonic(), client))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the ``with`` block."""
+        client = self.checkout()
+        try:
+            yield client
+        except OSError:
+            # Socket error, the connection is not usable anymore
+            self.checkin(client, broken=True)
+            raise
+        except:
+            self.checkin(client)
+            raise
+        else:
+            self.checkin(client)
 
-    # Asyncore methods
+    def close(self):
+        """Close the idle connections."""
+        with self._cond:
+            while self._idle:
+                _, client = self._idle.pop()
+                self._opened -= 1
+                client.close()
 
-    def collect_incoming_data(self, data):
-        """Store incoming data in the buffer."""
-        self._ibuffer.extend(data)
+    # Actions
 
-    def found_terminator(self):
-        """Process an incoming header or message."""
+    def request(self, method, service, identification=None, data=None,
+                timeout=None):
+        """Send a blocking ``request`` on a connection of the pool."""
+        with self.connection() as client:
+            return client.request(method, service, identification, data,
+                                  timeout=timeout)
 
-        if self._read_header:
-            self._read_header = False
+    def request_many(self, requests, timeout=None):
+        """
+        Send multiple requests on a connection of the pool, see
+        ``SynClient.request_many()``.
+        """
+        with self.connection() as client:
+            return client.request_many(requests, timeout=timeout)
 
-            msg_len = struct.unpack("!I", self._ibuffer)[0]
-            self.set_terminator(msg_len)
+    def publish(self, event, data=None):
+        """Send a ``publish`` message on a connection of the pool."""
+        with self.connection() as client:
+            client.publish(event, data)
 
-            self._ibuffer = bytearray()
-        else:
-            self._read_header = True
-            self.set_terminator(4)
 
-            msg = Message()
-            msg.ParseFromString(bytes(self._ibuffer))
+class AbstractAsynClient(AbstractClient):
+    """
+    Base class of the asynchronous clients.
 
-            self._ibuffer = bytearray()
+    Keep track of the subscriptions and dispatch incoming messages to the
+    ``on_request``, ``on_reply`` and subscription callbacks.
+    """
 
-            self.on_message_recieved(msg)
+    def __init__(self):
+        super().__init__()
+
+        # map events to a list of callbacks
+        self._events_cb = defaultdict(list)
+        # map event patterns to callbacks
+        self._events_pattern_cb = PatternIndex()
 
     # Methods called by subclasses
 
-    def add_subscribe_cb(self, event, event_cb):
-        """On event ``event`` recieved, call ``event_cb``"""
-        self._events_cb[event].append(event_cb)
+    def add_subscribe_cb(self, event, event_cb, decode=None):
+        """
+        On event ``event`` recieved, call ``event_cb``.
+
+        :param decode: Optional function converting the data of the event
+            (bytes, or None if there is none) to the argument of ``event_cb``.
+            The data is decoded once for all the callbacks sharing the same
+            ``decode`` function.
+        """
+        self._events_cb[event].append((event_cb, decode))
         self.subscribe(event)
 
-    def add_subscribe_pattern_cb(self, pattern, event_cb):
-        """On event ``event`` recieved, call ``event_cb``"""
-        self._events_pattern_cb[pattern].append(event_cb)
+    def add_subscribe_pattern_cb(self, pattern, event_cb, decode=None):
+        """
+        On event matching ``pattern`` recieved, call ``event_cb`` with the
+        name of the event as the ``event`` keyword argument. See
+        ``add_subscribe_cb()`` for ``decode``.
+        """
+        self._events_pattern_cb.add(pattern, (event_cb, decode))
         self.subscribe(pattern)
 
+    def _on_frame(self, frame):
+        """Parse a message received from cellaserv and dispatch it."""
+        if self.fast_codec:
+            msg_type, content = envelope.decode(frame)
+            if content is not None:
+                self._dispatch_message(msg_type, content)
+                return
+
+        msg = Message()
+        msg.ParseFromString(frame)
+        self.on_message_recieved(msg)
+
+    def _dispatch_publish(self, event, data):
+        """Call the subscription callbacks of ``event``."""
+        # (decoded data, exception raised by decode) by decode function, so
+        # that the data is decoded at most once, even if it is invalid
+        decoded = {}
+
+        def _payload(decode):
+            if decode is None:
+                return data
+            try:
+                value, error = decoded[decode]
+            except KeyError:
+                try:
+                    value, error = decode(data), None
+                except Exception as e:
+                    value, error = None, e
+                decoded[decode] = value, error
+            if error is not None:
+                raise error
+            return value
+
+        # Basic subscriptions
+        for cb, decode in self._events_cb.get(event, ()):
+            try:
+                if decode is None and data is None:
+                    cb()
+                else:
+                    cb(_payload(decode))
+            except Exception:
+                logger.error("Exception during publish %s(%s)", event, data,
+                             exc_info=True)
+
+        # Pattern subscriptions
+        for cb, decode in self._events_pattern_cb.match(event):
+            try:
+                if decode is None and data is None:
+                    cb(event=event)
+                else:
+                    cb(_payload(decode), event=event)
+            except Exception:
+                logger.error("Exception during publish %s(%s)", event, data,
+                             exc_info=True)
+
     # Callbacks
 
     def on_message_recieved(self, msg):
@@ -387,41 +1157,280 @@ class AsynClient(asynchat.async_chat, AbstractClient):
         if msg.type == Message.Request:
             req = Request()
             req.ParseFromString(msg.content)
-            self.on_request(req)
+            self._dispatch_message(msg.type, req)
         elif msg.type == Message.Reply:
             rep = Reply()
             rep.ParseFromString(msg.content)
-            self.on_reply(rep)
+            self._dispatch_message(msg.type, rep)
         elif msg.type == Message.Publish:
             pub = Publish()
             pub.ParseFromString(msg.content)
-
-            # Basic subscriptions
-            for cb in self._events_cb[pub.event]:
-                try:
-                    if pub.HasField('data'):
-                        cb(pub.data)
-                    else:
-                        cb()
-                except Exception as e:
-                    logger.error("Exception during %s", MessageToString(msg),
-                            exc_info=True)
-
-            # Pattern subscriptions
-            for pattern, cb_list in self._events_pattern_cb.items():
-                if fnmatch.fnmatch(pub.event, pattern):
-                    for cb in cb_list:
-                        if pub.HasField('data'):
-                            cb(pub.data, event=pub.event)
-                        else:
-                            cb(event=pub.event)
-
+            self._dispatch_message(msg.type, pub)
         else:
             logger.warning("Invalid message:\n%s",
                            MessageToString(msg).decode())
 
+    def _dispatch_message(self, msg_type, content):
+        """Dispatch ``content``, the parsed content of a message."""
+        if msg_type == Message.Request:
+            self.on_request(content)
+        elif msg_type == Message.Reply:
+            self.on_reply(content)
+        elif msg_type == Message.Publish:
+            self._dispatch_publish(
+                content.event,
+                content.data if content.HasField('data') else None)
+        else:
+            logger.warning("Invalid message:\n%s",
+                           _message_to_string(content))
+
     def on_request(self, req):
         pass
 
     def on_reply(self, rep):
         pass
+
+
+if asynchat is not None:
+    class AsynClient(asynchat.async_chat, AbstractAsynClient):
+        """Asynchronous cellaserv client, running in the asyncore loop."""
+
+        def __init__(self, sock=None):
+            self._socket = sock or get_socket()
+
+            # Init base classes
+            asynchat.async_chat.__init__(self, sock=self._socket)
+            AbstractAsynClient.__init__(self)
+
+            self.push_lock = threading.Lock()
+
+            # hold incoming data
+            self._decoder = FrameDecoder()
+
+        def _write(self, data):
+            # 'push' is asynchat version of socket.send
+            with self.push_lock:
+                self.push(data)
+
+        # Asyncore methods
+
+        def handle_read(self):
+            """Read incoming data and process the messages it contains."""
+            try:
+                received = self._decoder.recv_into(self.socket)
+            except BlockingIOError:
+                return
+            except ConnectionError:
+                self.handle_close()
+                return
+
+            if received == 0:
+                self.handle_close()
+                return
+
+            for frame in self._decoder.frames():
+                self._on_frame(frame)
+
+
+# Transports of the sockets used by asyncio clients, so that a client created
+# on a socket that is already in use can take it over, like asyncore does.
+_socket_transports = weakref.WeakKeyDictionary()
+
+
+class AsyncioClient(AbstractAsynClient, asyncio.BufferedProtocol):
+    """
+    Asynchronous cellaserv client, running in an asyncio event loop.
+
+    ``request()`` returns an ``asyncio.Future`` that resolves to the data of
+    the reply, or to the exception ``SynClient.request()`` would raise.
+    Requests must be sent from the thread running the loop, other messages can
+    be sent from any thread.
+
+    Outgoing messages are batched until the loop is idle, or for
+    ``batch_delay`` seconds if it is set.
+
+    Example::
+
+        >>> client = AsyncioClient()
+        >>> async def main():
+        ...     print(await client.request('time', 'date'))
+        >>> get_event_loop().run_until_complete(main())
+    """
+
+    # Batch messages until the loop is idle
+    batch_delay = 0
+
+    def __init__(self, sock=None, loop=None):
+        self._socket = sock or get_socket()
+        self._loop = loop or get_event_loop()
+
+        AbstractAsynClient.__init__(self)
+
+        self._transport = None
+        # Data written before the connection is made
+        self._pending_writes = []
+        # hold incoming data
+        self._decoder = FrameDecoder()
+        # map request ids to (future, method, service, identification)
+        self._reply_futures = {}
+
+        transport = _socket_transports.get(self._socket)
+        if transport is not None and not transport.is_closing():
+            # Socket is already used by another client, take it over
+            previous = transport.get_protocol()
+            transport.set_protocol(self)
+            self.connection_made(transport)
+            if previous is not self:
+                previous.connection_lost(None)
+            return
+
+        connect = self._loop.create_connection(lambda: self, sock=self._socket)
+        if _in_loop_thread(self._loop):
+            self._loop.create_task(connect)
+        elif self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(connect, self._loop)
+        else:
+            self._loop.run_until_complete(connect)
+
+    def close(self):
+        """Close the connection to cellaserv."""
+        self.flush()
+        if self._transport is not None:
+            self._transport.close()
+
+    def write_queue_size(self):
+        """Number of bytes waiting to be written to cellaserv."""
+        size = len(self._obuffer) + sum(map(len, self._pending_writes))
+        if self._transport is not None:
+            size += self._transport.get_write_buffer_size()
+        return size
+
+    def _write(self, data):
+        if self._loop.is_running() and not _in_loop_thread(self._loop):
+            self._loop.call_soon_threadsafe(self._transport_write, data)
+        else:
+            self._transport_write(data)
+
+    def _transport_write(self, data):
+        if self._transport is None:
+            self._pending_writes.append(data)
+        else:
+            self._transport.write(data)
+
+    def _schedule_flush(self):
+        """Flush when the loop is idle, or after ``batch_delay``."""
+        if self.batch_delay:
+            schedule = partial(self._loop.call_later, self.batch_delay)
+        else:
+            schedule = self._loop.call_soon
+
+        if self._loop.is_running() and not _in_loop_thread(self._loop):
+            return self._loop.call_soon_threadsafe(schedule, self.flush)
+        return schedule(self.flush)
+
+    # asyncio.Protocol methods
+
+    def connection_made(self, transport):
+        self._transport = transport
+        _socket_transports[self._socket] = transport
+
+        if self._pending_writes:
+            transport.writelines(self._pending_writes)
+            self._pending_writes = []
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            logger.warning("Connection to cellaserv lost: %s", exc)
+
+        self._transport = None
+        for future, *_ in self._reply_futures.values():
+            if not future.done():
+                future.set_exception(
+                    ConnectionError("Connection to cellaserv lost"))
+        self._reply_futures.clear()
+
+    def get_buffer(self, sizehint):
+        return self._decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        """Process the messages received."""
+        self._decoder.buffer_updated(nbytes)
+
+        for frame in self._decoder.frames():
+            self._on_frame(frame)
+
+    # Actions
+
+    def request(self, method, service, *, identification=None, data=None):
+        """
+        Send a ``request`` message.
+
+        :return: A future resolved with the data of the reply.
+        :rtype: asyncio.Future
+        """
+        if self.local_dispatch:
+            target = local.lookup(service, identification)
+            if target is not None:
+                return asyncio.wrap_future(
+                    _local_request(target, method, service, identification,
+                                   data),
+                    loop=self._loop)
+
+        future = self._loop.create_future()
+
+        req_id = super().request(method, service,
+                                 identification=identification, data=data)
+        self._reply_futures[req_id] = (future, method, service,
+                                       identification)
+
+        return future
+
+    async def request_many(self, requests, timeout=None):
+        """
+        Send multiple requests, then wait for all the replies. This is the
+        coroutine version of ``SynClient.request_many()``.
+
+        :param requests: List of ``(service, identification, method, data)``.
+        :param float timeout: Deadline of all the requests, in seconds.
+        :return: The data of the replies, or the exceptions of the failed
+            requests, in the order of ``requests``.
+        :rtype: list
+        """
+        futures = [self.request(method, service,
+                                identification=identification, data=data)
+                   for service, identification, method, data in requests]
+        if futures:
+            await asyncio.wait(futures, timeout=timeout)
+
+        results = []
+        for future in futures:
+            if not future.done():
+                # The reply will be dropped by on_reply()
+                future.cancel()
+                results.append(_request_timeout(timeout))
+            elif future.exception() is not None:
+                results.append(future.exception())
+            else:
+                results.append(future.result())
+        return results
+
+    # Callbacks
+
+    def on_reply(self, rep):
+        """Resolve the future waiting for the reply ``rep``."""
+        try:
+            future, method, service, identification = (
+                self._reply_futures.pop(rep.id))
+        except KeyError:
+            logger.warning("[Reply] Dropping Reply for unknown request: %s",
+                           _message_to_string(rep))
+            return
+
+        if future.cancelled():
+            return
+
+        try:
+            future.set_result(
+                _check_reply(rep, method, service, identification))
+        except Exception as e:
+            future.set_exception(e)
@@ -0,0 +1,394 @@
+"""
+Fast encoder and decoder for the cellaserv messages.
+
+With the generated protobuf classes, every message is serialized twice: the
+inner ``Request``, ``Reply``, ``Publish``... then the ``Message`` envelope
+that contains it. Receiving a message parses it twice as well.
+
+This module writes the frame header, the envelope and the inner message in a
+single pass, and decodes the envelope and the inner message in a single pass
+too. It is written in pure python with struct and varint tables, and is byte
+compatible with protobuf: field numbers and enum values are read from the
+descriptors of ``cellaserv_pb2``. If the fields are not numbered in the order
+the encoder writes them, ``AVAILABLE`` is False and the clients keep using
+protobuf.
+
+Decoded messages have the interface of the protobuf messages used by the
+clients: the fields as attributes and ``HasField()``.
+
+Compared to the pure python implementation of protobuf, encoding is about 10
+times faster and decoding 5 times faster. The C++ implementation encodes as
+fast but decodes faster, which is why the clients only use this module if
+``fast_codec`` is enabled (see ``examples/benchmark/bench_envelope.py``).
+
+Example::
+
+    >>> frame = encode_publish('time', b'42')
+    >>> msg_type, pub = decode(frame[4:])
+    >>> pub.event, pub.data
+    ('time', b'42')
+"""
+
+import logging
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.text_format import MessageToString
+
+from cellaserv.framing import HEADER
+from cellaserv.protobuf.cellaserv_pb2 import (
+    Message,
+    Register,
+    Request,
+    Reply,
+    Publish,
+    Subscribe
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DecodeError(Exception):
+    pass
+
+# Varints
+
+
+def _encode_varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+# Encoded varints of the small values, used for most sizes and enums
+_VARINTS = [_encode_varint(i) for i in range(4096)]
+
+
+def _varint(value):
+    if value < 4096:
+        return _VARINTS[value]
+    return _encode_varint(value)
+
+
+def _read_varint(buf, pos):
+    """Read a varint at ``pos`` in ``buf``, return it and the next position."""
+    byte = buf[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+
+    result = byte & 0x7f
+    shift = 7
+    while True:
+        pos += 1
+        byte = buf[pos]
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos + 1
+        shift += 7
+
+# Keys of the fields, read from the descriptors
+
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH_DELIMITED = 2
+_WIRE_FIXED32 = 5
+
+
+def _key(message_class, name):
+    field = message_class.DESCRIPTOR.fields_by_name[name]
+    if field.type in (FieldDescriptor.TYPE_STRING, FieldDescriptor.TYPE_BYTES,
+                      FieldDescriptor.TYPE_MESSAGE):
+        wire_type = _WIRE_LENGTH_DELIMITED
+    else:
+        wire_type = _WIRE_VARINT
+    return _varint(field.number << 3 | wire_type)
+
+
+def _numbered_in_order(message_class, names):
+    fields = message_class.DESCRIPTOR.fields_by_name
+    numbers = [fields[name].number for name in names]
+    return numbers == sorted(numbers)
+
+# Fields in the order they are written by the encoders
+_FIELDS_ORDER = [
+    (Message, ['type', 'content']),
+    (Register, ['name', 'identification']),
+    (Request, ['service_name', 'service_identification', 'method', 'data',
+               'id']),
+    (Reply, ['id', 'data', 'error']),
+    (Reply.Error, ['type', 'what']),
+    (Publish, ['event', 'data']),
+    (Subscribe, ['event']),
+]
+
+AVAILABLE = all(_numbered_in_order(cls, names)
+                for cls, names in _FIELDS_ORDER)
+if not AVAILABLE:
+    logger.warning("cellaserv.envelope is not compatible with cellaserv_pb2, "
+                   "using protobuf")
+
+_MESSAGE_TYPE = _key(Message, 'type')
+_MESSAGE_CONTENT = _key(Message, 'content')
+_MESSAGE_TYPE_KEY = _read_varint(_MESSAGE_TYPE, 0)[0]
+_MESSAGE_CONTENT_KEY = _read_varint(_MESSAGE_CONTENT, 0)[0]
+_REGISTER_NAME = _key(Register, 'name')
+_REGISTER_IDENTIFICATION = _key(Register, 'identification')
+_REQUEST_SERVICE_NAME = _key(Request, 'service_name')
+_REQUEST_SERVICE_IDENTIFICATION = _key(Request, 'service_identification')
+_REQUEST_METHOD = _key(Request, 'method')
+_REQUEST_DATA = _key(Request, 'data')
+_REQUEST_ID = _key(Request, 'id')
+_REPLY_ID = _key(Reply, 'id')
+_REPLY_DATA = _key(Reply, 'data')
+_REPLY_ERROR = _key(Reply, 'error')
+_ERROR_TYPE = _key(Reply.Error, 'type')
+_ERROR_WHAT = _key(Reply.Error, 'what')
+_PUBLISH_EVENT = _key(Publish, 'event')
+_PUBLISH_DATA = _key(Publish, 'data')
+_SUBSCRIBE_EVENT = _key(Subscribe, 'event')
+
+# Beginning of the envelope of each type of message, up to its content key
+_ENVELOPE = {
+    msg_type: _MESSAGE_TYPE + _varint(msg_type) + _MESSAGE_CONTENT
+    for msg_type in Message.MessageType.values()
+}
+
+# Encoders, they return the frame of the message: its size then the envelope
+
+
+def _frame(msg_type, parts):
+    """Wrap the ``parts`` of an inner message in an envelope and a frame."""
+    content = b''.join(parts)
+    envelope = _ENVELOPE[msg_type] + _varint(len(content))
+    return b''.join((HEADER.pack(len(envelope) + len(content)), envelope,
+                     content))
+
+
+def encode_register(name, identification=None):
+    name = name.encode()
+    parts = [_REGISTER_NAME, _varint(len(name)), name]
+    if identification:
+        identification = identification.encode()
+        parts += [_REGISTER_IDENTIFICATION, _varint(len(identification)),
+                  identification]
+    return _frame(Message.Register, parts)
+
+
+def encode_request(req_id, service, method, identification=None, data=None):
+    service = service.encode()
+    method = method.encode()
+    parts = [_REQUEST_SERVICE_NAME, _varint(len(service)), service]
+    if identification:
+        identification = identification.encode()
+        parts += [_REQUEST_SERVICE_IDENTIFICATION,
+                  _varint(len(identification)), identification]
+    parts += [_REQUEST_METHOD, _varint(len(method)), method]
+    if data:
+        parts += [_REQUEST_DATA, _varint(len(data)), data]
+    parts += [_REQUEST_ID, _varint(req_id)]
+    return _frame(Message.Request, parts)
+
+
+def encode_reply(req_id, data=None, error_type=None, what=None):
+    parts = [_REPLY_ID, _varint(req_id)]
+    if data:
+        parts += [_REPLY_DATA, _varint(len(data)), data]
+    if error_type is not None:
+        error = [_ERROR_TYPE, _varint(error_type)]
+        if what is not None:
+            what = what.encode() if isinstance(what, str) else what
+            error += [_ERROR_WHAT, _varint(len(what)), what]
+        error = b''.join(error)
+        parts += [_REPLY_ERROR, _varint(len(error)), error]
+    return _frame(Message.Reply, parts)
+
+
+def encode_publish(event, data=None):
+    event = event.encode()
+    parts = [_PUBLISH_EVENT, _varint(len(event)), event]
+    if data:
+        parts += [_PUBLISH_DATA, _varint(len(data)), data]
+    return _frame(Message.Publish, parts)
+
+
+def encode_subscribe(event):
+    event = event.encode()
+    return _frame(Message.Subscribe,
+                  [_SUBSCRIBE_EVENT, _varint(len(event)), event])
+
+# Decoded messages
+
+
+class DecodedMessage:
+    """
+    Message decoded by this module. Subclasses are created for each protobuf
+    message class, from its descriptor: the default values of the fields are
+    class attributes, the fields present in the message are set on the
+    instance.
+    """
+
+    # Protobuf class of the message
+    _pb_class = None
+    # map field keys to (name, type, class of the decoded sub-message)
+    _fields = {}
+
+    def HasField(self, name):
+        return name in self.__dict__
+
+    def to_protobuf(self):
+        """Return the equivalent protobuf message."""
+        msg = self._pb_class()
+        for name, value in self.__dict__.items():
+            if isinstance(value, DecodedMessage):
+                getattr(msg, name).CopyFrom(value.to_protobuf())
+            else:
+                setattr(msg, name, value)
+        return msg
+
+    def __str__(self):
+        text = MessageToString(self.to_protobuf())
+        return text.decode() if isinstance(text, bytes) else text
+
+    def __repr__(self):
+        return "<{0} {1}>".format(type(self).__name__,
+                                  str(self).replace('\n', ' ').strip())
+
+
+def _decoded_class(pb_class):
+    """Create the DecodedMessage subclass of ``pb_class``."""
+    descriptor = pb_class.DESCRIPTOR
+    attrs = {'_pb_class': pb_class, '_fields': {}}
+    for field in descriptor.fields:
+        if field.type == FieldDescriptor.TYPE_MESSAGE:
+            sub_class = _decoded_class(
+                getattr(pb_class, field.message_type.name))
+            attrs[field.name] = None
+        else:
+            sub_class = None
+            attrs[field.name] = field.default_value
+        key = _read_varint(_key(pb_class, field.name), 0)[0]
+        attrs['_fields'][key] = (field.name, field.type, sub_class)
+
+    return type('Decoded' + descriptor.name, (DecodedMessage,), attrs)
+
+DecodedRegister = _decoded_class(Register)
+DecodedRequest = _decoded_class(Request)
+DecodedReply = _decoded_class(Reply)
+DecodedPublish = _decoded_class(Publish)
+DecodedSubscribe = _decoded_class(Subscribe)
+
+_DECODED_CLASSES = {
+    Message.Register: DecodedRegister,
+    Message.Request: DecodedRequest,
+    Message.Reply: DecodedReply,
+    Message.Publish: DecodedPublish,
+    Message.Subscribe: DecodedSubscribe,
+}
+
+_TYPE_STRING = FieldDescriptor.TYPE_STRING
+_TYPE_BYTES = FieldDescriptor.TYPE_BYTES
+_TYPE_MESSAGE = FieldDescriptor.TYPE_MESSAGE
+
+
+def _skip_field(buf, pos, wire_type):
+    """Skip the value of an unknown field, return the next position."""
+    if wire_type == _WIRE_VARINT:
+        return _read_varint(buf, pos)[1]
+    elif wire_type == _WIRE_LENGTH_DELIMITED:
+        size, pos = _read_varint(buf, pos)
+        return pos + size
+    elif wire_type == _WIRE_FIXED64:
+        return pos + 8
+    elif wire_type == _WIRE_FIXED32:
+        return pos + 4
+    raise DecodeError("Invalid wire type: {0}".format(wire_type))
+
+
+def _decode_message(cls, buf, pos, end):
+    """Decode a message of type ``cls`` from ``buf[pos:end]``."""
+    msg = cls.__new__(cls)
+    values = msg.__dict__
+    fields = cls._fields
+
+    while pos < end:
+        key = buf[pos]
+        if key < 0x80:
+            pos += 1
+        else:
+            key, pos = _read_varint(buf, pos)
+
+        try:
+            name, field_type, sub_class = fields[key]
+        except KeyError:
+            pos = _skip_field(buf, pos, key & 0x7)
+            continue
+
+        value = buf[pos]
+        if value < 0x80:
+            pos += 1
+        else:
+            value, pos = _read_varint(buf, pos)
+
+        if field_type == _TYPE_STRING:
+            values[name] = str(buf[pos:pos + value], 'utf-8')
+            pos += value
+        elif field_type == _TYPE_BYTES:
+            # Copied, the buffer may be reused after the message is decoded
+            values[name] = bytes(buf[pos:pos + value])
+            pos += value
+        elif field_type == _TYPE_MESSAGE:
+            values[name] = _decode_message(sub_class, buf, pos, pos + value)
+            pos += value
+        else:
+            values[name] = value
+
+    if pos != end:
+        raise DecodeError("Truncated message")
+
+    return msg
+
+
+# Frames up to this size are copied before being decoded, copying them costs
+# less than decoding from a memoryview
+_COPY_MAX_SIZE = 4096
+
+
+def decode(frame):
+    """
+    Decode the envelope in ``frame`` (bytes or memoryview, without the
+    header) and the message it contains. Large frames are decoded from the
+    memoryview without copying the frame, only the bytes fields are copied.
+
+    :return: The type of the message and the decoded message, or None if the
+        type is unknown.
+    """
+    if len(frame) <= _COPY_MAX_SIZE:
+        # Indexing bytes is faster than indexing a memoryview
+        frame = bytes(frame)
+    msg_type = 0
+    content = None
+    pos = 0
+    end = len(frame)
+
+    while pos < end:
+        key, pos = _read_varint(frame, pos)
+        if key == _MESSAGE_TYPE_KEY:
+            msg_type, pos = _read_varint(frame, pos)
+        elif key == _MESSAGE_CONTENT_KEY:
+            size, pos = _read_varint(frame, pos)
+            content = (pos, pos + size)
+            pos += size
+        else:
+            pos = _skip_field(frame, pos, key & 0x7)
+
+    if pos != end:
+        raise DecodeError("Truncated message")
+
+    try:
+        cls = _DECODED_CLASSES[msg_type]
+    except KeyError:
+        return msg_type, None
+    if content is None:
+        return msg_type, cls()
+    return msg_type, _decode_message(cls, frame, *content)
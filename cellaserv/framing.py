@@ -0,0 +1,119 @@
+"""
+Framing of cellaserv messages.
+
+On the wire, each message is prefixed by its size as an uint32 in network byte
+order. ``FrameDecoder`` extracts these frames from a stream of bytes, it is
+shared by all the clients.
+"""
+
+import struct
+
+HEADER = struct.Struct("!I")
+
+
+class FrameDecoder:
+    """
+    Decode length-prefixed frames without copying them.
+
+    Incoming data is received in a preallocated buffer, using ``recv_into()``
+    or the ``get_buffer()``/``buffer_updated()`` pair of
+    ``asyncio.BufferedProtocol``. The buffer grows when a frame does not fit.
+
+    Frames are returned as memoryviews of the buffer, that can be parsed
+    directly by protobuf. A frame is only valid until data is received again.
+
+    Example::
+
+        >>> decoder = FrameDecoder()
+        >>> decoder.recv_into(sock)
+        >>> for frame in decoder.frames():
+        ...     msg = Message()
+        ...     msg.ParseFromString(frame)
+    """
+
+    def __init__(self, size=64 * 1024, min_free=4096):
+        """
+        :param int size: Initial size of the buffer.
+        :param int min_free: Minimum free space given to a read.
+        """
+        self._buffer = bytearray(size)
+        self._min_free = min_free
+        # Data in self._buffer[self._start:self._end] is not processed yet
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        """Number of bytes received but not returned as frames yet."""
+        return self._end - self._start
+
+    def get_buffer(self, sizehint=-1):
+        """
+        Return a writable memoryview on the free space of the buffer. Call
+        ``buffer_updated()`` with the number of bytes written to it.
+        """
+        pending = self._end - self._start
+
+        # Make room for the frame being received
+        needed = max(sizehint, self._min_free)
+        if pending >= HEADER.size:
+            frame_size = HEADER.size + HEADER.unpack_from(self._buffer,
+                                                          self._start)[0]
+            needed = max(needed, frame_size - pending)
+
+        if len(self._buffer) - self._end < needed:
+            if 2 * (pending + needed) > len(self._buffer):
+                # Grow, so that at least half of the buffer is free after a
+                # compaction. Frames returned earlier are still valid in the
+                # old buffer.
+                size = max(2 * (pending + needed), 2 * len(self._buffer))
+                buffer = bytearray(size)
+                buffer[:pending] = self._buffer[self._start:self._end]
+                self._buffer = buffer
+            else:
+                # Compact, this does not resize the buffer
+                self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._start = 0
+            self._end = pending
+
+        return memoryview(self._buffer)[self._end:]
+
+    def buffer_updated(self, nbytes):
+        """Record that ``nbytes`` were written in the buffer."""
+        self._end += nbytes
+
+    def recv_into(self, sock):
+        """
+        Receive data from ``sock`` into the buffer.
+
+        :return: The number of bytes received, 0 if the connection is closed.
+        """
+        with self.get_buffer() as view:
+            nbytes = sock.recv_into(view)
+        self.buffer_updated(nbytes)
+        return nbytes
+
+    def next_frame(self):
+        """
+        Return the next complete frame as a memoryview, or None if more data is
+        needed.
+        """
+        pending = self._end - self._start
+        if pending >= HEADER.size:
+            size = HEADER.unpack_from(self._buffer, self._start)[0]
+            if pending >= HEADER.size + size:
+                begin = self._start + HEADER.size
+                self._start = begin + size
+                return memoryview(self._buffer)[begin:self._start]
+        elif pending == 0:
+            # Everything was processed, start again from the beginning
+            self._start = self._end = 0
+        return None
+
+    def frames(self):
+        """Iterate over the complete frames received."""
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            with frame:
+                yield frame
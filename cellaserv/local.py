@@ -0,0 +1,150 @@
+"""
+Registry of the services running in this process.
+
+A process can host many services with ``Service.loop()``. When a client of
+the same process sends a request to one of them, or publishes an event it
+subscribed to, the message does not need to go through cellaserv: it can be
+dispatched directly to the service. This module keeps track of the services
+of the process and dispatches messages to them.
+
+Dispatching keeps the semantics of cellaserv:
+
+- the data of requests, replies and events stays encoded in JSON, the
+  service and the client do not share objects,
+- the actions and the event callbacks of a service run in the thread of its
+  event loop, in the order the messages were sent,
+- errors are returned as error replies, so clients raise the same
+  exceptions as when the request goes through cellaserv.
+
+Events are still published on cellaserv, so that the subscribers of other
+processes receive them. Services drop the copy of the event sent back by
+cellaserv, they have already received it.
+
+Local dispatch is disabled by default, set ``CS_LOCAL_DISPATCH=1`` in the
+environment (or ``local_dispatch`` in the ``client`` section of the
+configuration) to enable it. Clients and services can also set their
+``local_dispatch`` attribute.
+
+A service is only added to the registry once cellaserv has processed its
+registration and its subscriptions, it receives all the messages sent before
+through cellaserv.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+
+from cellaserv.protobuf.cellaserv_pb2 import Reply, Request
+
+from cellaserv.patterns import is_pattern
+from cellaserv.settings import DEBUG
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG if DEBUG >= 2
+                else logging.INFO if DEBUG == 1
+                else logging.WARNING)
+
+# Services of this process, by (name, identification)
+_services = {}
+# Services subscribed to events, by event: list of (service, number of
+# subscriptions of the service to the event)
+_subscribers = defaultdict(list)
+_lock = threading.Lock()
+
+
+def register(service):
+    """
+    Add ``service`` to the registry. Its subscriptions to patterns, and the
+    subscriptions made after this call, are only served by cellaserv.
+    """
+    key = (service.service_name, service.identification or '')
+    with _lock:
+        previous = _services.get(key)
+        if previous is not None:
+            _unregister(previous)
+        _services[key] = service
+
+        for event, callbacks in service._events_cb.items():
+            if not is_pattern(event):
+                _subscribers[event].append((service, len(callbacks)))
+
+    logger.info("[Local] Registered %s[%s]", *key)
+
+
+def unregister(service):
+    """Remove ``service`` from the registry, if it is registered."""
+    with _lock:
+        _unregister(service)
+
+
+def _unregister(service):
+    key = (service.service_name, service.identification or '')
+    if _services.get(key) is service:
+        del _services[key]
+
+    for event, subscribers in list(_subscribers.items()):
+        subscribers[:] = [s for s in subscribers if s[0] is not service]
+        if not subscribers:
+            del _subscribers[event]
+
+
+def lookup(service, identification=None):
+    """
+    :return: The service ``service`` with ``identification`` of this process,
+        or None.
+    """
+    return _services.get((service, identification or ''))
+
+
+class _LocalReply:
+    """Receive the reply of a service to a local request."""
+
+    def __init__(self, on_reply):
+        self._on_reply = on_reply
+
+    def reply_to(self, req, data=None):
+        reply = Reply(id=req.id)
+        if data:
+            reply.data = data
+        self._on_reply(reply)
+
+    def reply_error_to(self, req, error_type, what=None):
+        error = Reply.Error(type=error_type)
+        if what is not None:
+            error.what = what
+        self._on_reply(Reply(id=req.id, error=error))
+
+
+def request(service, method, identification, data, on_reply, inline=False):
+    """
+    Send a request to ``service``, a service of this process.
+
+    :param on_reply: Called with the ``Reply``, in the thread of the service.
+    :param bool inline: Call the action now, in this thread. Only use it from
+        the thread running the event loop of the service.
+    """
+    req = Request(service_name=service.service_name, method=method, id=0)
+    if identification:
+        req.service_identification = identification
+    if data:
+        req.data = data
+
+    if inline:
+        service._handle_request(req, _LocalReply(on_reply))
+    else:
+        service._loop.call_soon_threadsafe(service._handle_request, req,
+                                           _LocalReply(on_reply))
+
+
+def publish(event, data=None):
+    """Dispatch the event to the services of this process subscribed to it."""
+    subscribers = _subscribers.get(event)
+    if not subscribers:
+        return
+
+    data = data or None
+    with _lock:
+        subscribers = list(subscribers)
+    for service, copies in subscribers:
+        service._loop.call_soon_threadsafe(service._on_local_publish, event,
+                                           data, copies)
@@ -0,0 +1,307 @@
+"""
+Metrics of the requests and events handled by a service.
+
+For each action and each event, ``ServiceMetrics`` counts the calls and the
+errors, and records the latencies in a ``Histogram``. Histograms have a fixed
+number of buckets, so that metrics can be collected continuously.
+
+``MetricsReporter`` summarizes the calls made since its previous report, it
+is used by services to publish their metrics periodically.
+
+Example::
+
+    >>> metrics = ServiceMetrics()
+    >>> metrics.record_action('time', 0.0002)
+    >>> metrics.snapshot()['actions']['time']['calls']
+    1
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+
+class Histogram:
+    """
+    HDR-style histogram of latencies, in seconds.
+
+    Values are recorded in microseconds, in buckets whose width is a fixed
+    fraction of their value: each power of two is split in
+    ``2**(sub_bucket_bits - 1)`` buckets, so percentiles are accurate to
+    about 3%. The number of buckets is fixed, values larger than
+    ``2**max_bits`` microseconds (about 19 hours) are counted in the last
+    bucket. Histograms with the same layout can be merged, or subtracted to
+    get the values recorded between two snapshots.
+    """
+
+    sub_bucket_bits = 5
+    max_bits = 36
+
+    def __init__(self):
+        self.counts = [0] * (self._index(1 << self.max_bits) + 1)
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def _index(cls, micros):
+        """Index of the bucket of ``micros``."""
+        bits = micros.bit_length()
+        if bits <= cls.sub_bucket_bits:
+            return micros
+        shift = bits - cls.sub_bucket_bits
+        return (shift << (cls.sub_bucket_bits - 1)) + (micros >> shift)
+
+    @classmethod
+    def _upper_bound(cls, index):
+        """Upper bound of the bucket ``index``, in microseconds."""
+        half = 1 << (cls.sub_bucket_bits - 1)
+        if index < 2 * half:
+            return index + 1
+        shift = (index >> (cls.sub_bucket_bits - 1)) - 1
+        return (index - shift * half + 1) << shift
+
+    def record(self, value):
+        """Add ``value``, in seconds, to the histogram."""
+        index = self._index(int(value * 1e6))
+        self.counts[min(index, len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the values of the histogram ``other`` to this one."""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min,
+                                                              other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max,
+                                                              other.max)
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.merge(self)
+        return histogram
+
+    def since(self, previous):
+        """
+        Return the histogram of the values recorded since ``previous``, an
+        earlier copy of this histogram. Min and max are estimated from the
+        buckets.
+        """
+        histogram = Histogram()
+        if previous.count > self.count:
+            # Reset since previous
+            previous = Histogram()
+        histogram.counts = [a - b
+                            for a, b in zip(self.counts, previous.counts)]
+        histogram.count = self.count - previous.count
+        histogram.total = self.total - previous.total
+        if histogram.count:
+            indexes = [i for i, count in enumerate(histogram.counts) if count]
+            histogram.min = self._upper_bound(indexes[0] - 1) / 1e6
+            histogram.max = self._upper_bound(indexes[-1]) / 1e6
+        return histogram
+
+    def percentile(self, percent):
+        """
+        Return the value below which ``percent`` % of the values fall, or None
+        if the histogram is empty.
+        """
+        if not self.count:
+            return None
+
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        value = self._upper_bound(index) / 1e6
+        return min(value, self.max) if self.max is not None else value
+
+    def to_dict(self):
+        """
+        :return: The count, total, min, max, mean and percentiles of the
+            values, and the non-empty buckets as a list of ``[upper bound,
+            count]``.
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+            'buckets': [[self._upper_bound(i) / 1e6, count]
+                        for i, count in enumerate(self.counts) if count],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a histogram from the result of ``to_dict()``."""
+        histogram = cls()
+        for upper_bound, count in data['buckets']:
+            index = cls._index(round(upper_bound * 1e6) - 1)
+            histogram.counts[index] += count
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+class CallMetrics:
+    """Calls, errors and latency of an action or an event."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'latency': self.latency.to_dict(),
+        }
+
+
+class ServiceMetrics:
+    """Metrics of the actions and events of a service."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Reset all the metrics."""
+        with self._lock:
+            self.since = time.time()
+            self.actions = defaultdict(CallMetrics)
+            self.events = defaultdict(CallMetrics)
+            # Requests that could not be dispatched to an action, by error
+            self.dropped = defaultdict(int)
+
+    def _record(self, metrics, name, elapsed, error):
+        with self._lock:
+            call = metrics[name]
+            call.calls += 1
+            if error:
+                call.errors += 1
+            call.latency.record(elapsed)
+
+    def record_action(self, action, elapsed, error=False):
+        """
+        Record a call to an action.
+
+        :param str action: Name of the action.
+        :param float elapsed: Duration of the call, in seconds.
+        :param bool error: True if the call replied with an error.
+        """
+        self._record(self.actions, action, elapsed, error)
+
+    def record_event(self, event, elapsed, error=False):
+        """
+        Record a call to the callback of an event.
+
+        :param str event: Name of the event.
+        :param float elapsed: Duration of the callback, in seconds.
+        :param bool error: True if the callback raised an exception.
+        """
+        self._record(self.events, event, elapsed, error)
+
+    def record_dropped(self, reason):
+        """Record a request that was not dispatched to an action."""
+        with self._lock:
+            self.dropped[reason] += 1
+
+    def snapshot(self):
+        """Return the metrics as a dict that can be encoded in JSON."""
+        with self._lock:
+            return {
+                'since': self.since,
+                'uptime': time.time() - self.since,
+                'actions': {name: call.to_dict()
+                            for name, call in self.actions.items()},
+                'events': {name: call.to_dict()
+                           for name, call in self.events.items()},
+                'dropped': dict(self.dropped),
+            }
+
+    def copy_calls(self):
+        """
+        :return: A dict mapping ``('actions', name)`` and ``('events', name)``
+            to the number of calls, of errors and a copy of the latency
+            histogram.
+        """
+        with self._lock:
+            return {(kind, name): (call.calls, call.errors,
+                                   call.latency.copy())
+                    for kind, metrics in (('actions', self.actions),
+                                          ('events', self.events))
+                    for name, call in metrics.items()}
+
+
+class MetricsReporter:
+    """Report the calls recorded in a ``ServiceMetrics`` between reports."""
+
+    def __init__(self, metrics):
+        """
+        :param ServiceMetrics metrics: The metrics to report.
+        """
+        self.metrics = metrics
+        self._previous = {}
+        self._last_report = time.monotonic()
+
+    def report(self):
+        """
+        Return the number of requests, the request rate, and the calls, errors,
+        latency percentiles and histogram buckets of each action and event
+        called since the previous report.
+        """
+        now = time.monotonic()
+        interval = now - self._last_report
+        self._last_report = now
+
+        current = self.metrics.copy_calls()
+        report = {
+            'interval': interval,
+            'requests': 0,
+            'actions': {},
+            'events': {},
+        }
+
+        for (kind, name), (calls, errors, latency) in current.items():
+            previous = self._previous.get((kind, name))
+            if previous is None or previous[0] > calls:
+                # New, or reset since the previous report
+                previous = (0, 0, Histogram())
+            if calls == previous[0]:
+                continue
+
+            latency = latency.since(previous[2])
+            report[kind][name] = {
+                'calls': calls - previous[0],
+                'errors': errors - previous[1],
+                'p50': latency.percentile(50),
+                'p99': latency.percentile(99),
+                'p999': latency.percentile(99.9),
+                'buckets': latency.to_dict()['buckets'],
+            }
+            if kind == 'actions':
+                report['requests'] += calls - previous[0]
+
+        report['request_rate'] = (report['requests'] / interval
+                                  if interval > 0 else 0.)
+        self._previous = current
+        return report
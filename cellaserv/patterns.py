@@ -0,0 +1,146 @@
+"""
+Index of event patterns.
+
+Pattern subscriptions use the shell-style wildcards of ``fnmatch``. Instead of
+matching every event against every pattern, ``PatternIndex`` stores the
+patterns in a trie of their literal dot-separated segments: only the patterns
+whose literal prefix is a prefix of the event are matched. The values
+resolved for an event are kept in a bounded LRU cache, which is cleared when
+the patterns change.
+
+Example::
+
+    >>> index = PatternIndex()
+    >>> index.add('log.*', 'all logs')
+    >>> index.add('log.robot.*', 'robot logs')
+    >>> index.match('log.robot.error')
+    ('all logs', 'robot logs')
+"""
+
+import fnmatch
+import re
+from collections import OrderedDict
+from itertools import count
+
+_WILDCARD = re.compile(r'[*?[]')
+
+
+def is_pattern(event):
+    """Return True if ``event`` contains wildcards."""
+    return _WILDCARD.search(event) is not None
+
+
+class _Node:
+    """Node of the trie, holds the patterns whose literal prefix ends here."""
+
+    __slots__ = ('children', 'patterns')
+
+    def __init__(self):
+        self.children = {}
+        # list of (pattern, compiled match function)
+        self.patterns = []
+
+
+class PatternIndex:
+    """Map ``fnmatch`` patterns to lists of values."""
+
+    def __init__(self, cache_size=1024):
+        """
+        :param int cache_size: Number of event names for which the matching
+            values are cached.
+        """
+        self.cache_size = cache_size
+
+        self._root = _Node()
+        # map patterns to their values
+        self._values = {}
+        # map patterns to their rank, to return values in insertion order
+        self._rank = {}
+        self._counter = count()
+        self._cache = OrderedDict()
+        # Incremented when the patterns change, so that a match computed
+        # concurrently with a change is not cached.
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __bool__(self):
+        return bool(self._values)
+
+    def items(self):
+        """Return a list of ``(pattern, values)``."""
+        return [(pattern, list(values))
+                for pattern, values in self._values.items()]
+
+    def add(self, pattern, value):
+        """Add ``value`` to the values matched by ``pattern``."""
+        values = self._values.get(pattern)
+        if values is None:
+            values = self._values[pattern] = []
+            self._rank[pattern] = next(self._counter)
+
+            node = self._root
+            for segment in pattern.split('.'):
+                if _WILDCARD.search(segment):
+                    break
+                node = node.children.setdefault(segment, _Node())
+            match = re.compile(fnmatch.translate(pattern)).match
+            node.patterns.append((pattern, match))
+
+        values.append(value)
+        self._invalidate()
+
+    def remove(self, pattern, value):
+        """Remove ``value`` from the values matched by ``pattern``."""
+        values = self._values[pattern]
+        values.remove(value)
+        if not values:
+            del self._values[pattern]
+            del self._rank[pattern]
+
+            node = self._root
+            for segment in pattern.split('.'):
+                if _WILDCARD.search(segment):
+                    break
+                node = node.children[segment]
+            node.patterns = [p for p in node.patterns if p[0] != pattern]
+
+        self._invalidate()
+
+    def _invalidate(self):
+        self._generation += 1
+        self._cache.clear()
+
+    def match(self, event):
+        """Return the values of all the patterns matching ``event``."""
+        try:
+            values = self._cache[event]
+        except KeyError:
+            pass
+        else:
+            self._cache.move_to_end(event)
+            return values
+
+        generation = self._generation
+        matched = []
+        node = self._root
+        segments = iter(event.split('.'))
+        while node is not None:
+            for pattern, match in node.patterns:
+                if match(event):
+                    matched.append(pattern)
+            node = node.children.get(next(segments, None))
+
+        # Keep the order in which the patterns were added
+        matched.sort(key=self._rank.__getitem__)
+        values = tuple(value
+                       for pattern in matched
+                       for value in self._values[pattern])
+
+        if generation == self._generation:
+            self._cache[event] = values
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return values
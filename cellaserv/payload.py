@@ -0,0 +1,333 @@
+"""
+Codecs of the data of requests, replies and events.
+
+Each action of a service declares the codec of its arguments and reply,
+``json`` by default. It is listed in the ``help_actions`` of the service, so
+that proxies created with ``negotiate_codecs=True`` use the same codec to call
+the action, see ``cellaserv.proxy``.
+
+Available codecs:
+
+- ``json``: JSON text, encoded in UTF-8,
+- ``binary``: a compact binary format, a subset of MessagePack supporting
+  None, booleans, integers of 64 bits, floats, strings, bytes, lists and
+  dicts. Unlike JSON, it can carry bytes,
+- ``raw``: the data is not encoded, actions receive it as a single bytes
+  argument and return bytes.
+
+Other codecs can be added with ``register_codec()``.
+
+Example::
+
+    >>> BINARY.decode(BINARY.encode({'x': 1, 'data': b'\\x00'}))
+    {'x': 1, 'data': b'\\x00'}
+    >>> get_codec('json').encode([1, 2])
+    b'[1, 2]'
+"""
+
+import json
+import struct
+
+
+class Codec:
+    """
+    Base class of the codecs, converting objects to bytes and back.
+
+    The arguments of a call are encoded as one object: the list of positional
+    arguments, or the dict of keyword arguments.
+    """
+
+    # Name of the codec, in the help of the actions
+    name = None
+
+    def encode(self, obj):
+        """Return ``obj`` encoded as bytes."""
+        raise NotImplementedError
+
+    def decode(self, data):
+        """
+        Return the object encoded in ``data``.
+
+        :raise ValueError: If ``data`` is not valid.
+        """
+        raise NotImplementedError
+
+    def encode_arguments(self, args, kwargs):
+        """
+        Return the data of a call with ``args`` or ``kwargs``, or None if
+        there are no arguments.
+        """
+        arguments = args or kwargs
+        return self.encode(arguments) if arguments else None
+
+    def __repr__(self):
+        return '<{0} codec>'.format(self.name)
+
+    def __reduce__(self):
+        # Codecs are sent to the processes running actions by name
+        return get_codec, (self.name,)
+
+
+class JSONCodec(Codec):
+    """JSON text, encoded in UTF-8."""
+
+    name = 'json'
+
+    def encode(self, obj):
+        return json.dumps(obj).encode()
+
+    def decode(self, data):
+        return json.loads(data.decode())
+
+
+class RawCodec(Codec):
+    """Bytes, not encoded."""
+
+    name = 'raw'
+
+    def encode(self, obj):
+        if not isinstance(obj, (bytes, bytearray)):
+            raise TypeError(
+                "raw codec can only encode bytes, not {0}".format(
+                    type(obj).__name__))
+        return bytes(obj)
+
+    def decode(self, data):
+        return data
+
+    def encode_arguments(self, args, kwargs):
+        if kwargs or len(args) > 1:
+            raise TypeError("raw codec can only encode a single argument")
+        return self.encode(args[0]) if args else None
+
+
+# Formats of the binary codec
+_UINT8 = struct.Struct('>B')
+_UINT16 = struct.Struct('>H')
+_UINT32 = struct.Struct('>I')
+_UINT64 = struct.Struct('>Q')
+_INT8 = struct.Struct('>b')
+_INT16 = struct.Struct('>h')
+_INT32 = struct.Struct('>i')
+_INT64 = struct.Struct('>q')
+_FLOAT64 = struct.Struct('>d')
+
+
+class BinaryCodec(Codec):
+    """
+    Compact binary format, a subset of MessagePack: data encoded by this
+    codec can be decoded by MessagePack libraries, and the other way round for
+    the supported types.
+
+    Tuples are encoded as lists, and maps are decoded as dicts.
+    """
+
+    name = 'binary'
+
+    def encode(self, obj):
+        out = bytearray()
+        self._encode(obj, out)
+        return bytes(out)
+
+    def _encode(self, obj, out):
+        if obj is None:
+            out.append(0xc0)
+        elif obj is True:
+            out.append(0xc3)
+        elif obj is False:
+            out.append(0xc2)
+        elif isinstance(obj, int):
+            self._encode_int(obj, out)
+        elif isinstance(obj, float):
+            out.append(0xcb)
+            out += _FLOAT64.pack(obj)
+        elif isinstance(obj, str):
+            data = obj.encode()
+            self._encode_header(len(data), out, 0xa0, 32, 0xd9, 0xda, 0xdb)
+            out += data
+        elif isinstance(obj, (bytes, bytearray)):
+            self._encode_header(len(obj), out, None, 0, 0xc4, 0xc5, 0xc6)
+            out += obj
+        elif isinstance(obj, (list, tuple)):
+            self._encode_header(len(obj), out, 0x90, 16, None, 0xdc, 0xdd)
+            for item in obj:
+                self._encode(item, out)
+        elif isinstance(obj, dict):
+            self._encode_header(len(obj), out, 0x80, 16, None, 0xde, 0xdf)
+            for key, value in obj.items():
+                self._encode(key, out)
+                self._encode(value, out)
+        else:
+            raise TypeError("Object of type {0} cannot be encoded".format(
+                type(obj).__name__))
+
+    @staticmethod
+    def _encode_int(value, out):
+        if 0 <= value < 0x80:
+            out.append(value)
+        elif -32 <= value < 0:
+            out.append(value & 0xff)
+        elif value >= 0:
+            for tag, fmt in ((0xcc, _UINT8), (0xcd, _UINT16),
+                             (0xce, _UINT32), (0xcf, _UINT64)):
+                if value < 1 << (fmt.size * 8):
+                    out.append(tag)
+                    out += fmt.pack(value)
+                    return
+            raise OverflowError("Integer too large: {0}".format(value))
+        else:
+            for tag, fmt in ((0xd0, _INT8), (0xd1, _INT16),
+                             (0xd2, _INT32), (0xd3, _INT64)):
+                if value >= -(1 << (fmt.size * 8 - 1)):
+                    out.append(tag)
+                    out += fmt.pack(value)
+                    return
+            raise OverflowError("Integer too small: {0}".format(value))
+
+    @staticmethod
+    def _encode_header(length, out, fix_tag, fix_max, tag8, tag16, tag32):
+        """Encode the length of a string, bytes, list or dict."""
+        if fix_tag is not None and length < fix_max:
+            out.append(fix_tag | length)
+        elif tag8 is not None and length < 1 << 8:
+            out.append(tag8)
+            out += _UINT8.pack(length)
+        elif length < 1 << 16:
+            out.append(tag16)
+            out += _UINT16.pack(length)
+        else:
+            out.append(tag32)
+            out += _UINT32.pack(length)
+
+    def decode(self, data):
+        data = memoryview(data)
+        try:
+            obj, offset = self._decode(data, 0)
+        except (IndexError, struct.error, UnicodeDecodeError) as e:
+            raise ValueError("Invalid binary data: {0}".format(e)) from None
+        if offset != len(data):
+            raise ValueError("Invalid binary data: {0} extra bytes".format(
+                len(data) - offset))
+        return obj
+
+    def _decode(self, data, offset):
+        """Decode the object at ``offset``, return it with the next offset."""
+        tag = data[offset]
+        offset += 1
+
+        if tag < 0x80:
+            return tag, offset
+        if tag >= 0xe0:
+            return tag - 0x100, offset
+        if 0xa0 <= tag <= 0xbf:
+            return self._decode_str(data, offset, tag & 0x1f)
+        if 0x90 <= tag <= 0x9f:
+            return self._decode_list(data, offset, tag & 0x0f)
+        if 0x80 <= tag <= 0x8f:
+            return self._decode_dict(data, offset, tag & 0x0f)
+
+        if tag == 0xc0:
+            return None, offset
+        if tag == 0xc2:
+            return False, offset
+        if tag == 0xc3:
+            return True, offset
+
+        fmt = _NUMBERS.get(tag)
+        if fmt is not None:
+            return fmt.unpack_from(data, offset)[0], offset + fmt.size
+
+        try:
+            kind, fmt = _CONTAINERS[tag]
+        except KeyError:
+            raise ValueError(
+                "Unsupported type 0x{0:02x}".format(tag)) from None
+        length = fmt.unpack_from(data, offset)[0]
+        offset += fmt.size
+        if kind is bytes:
+            end = offset + length
+            if end > len(data):
+                raise ValueError("Truncated binary data")
+            return bytes(data[offset:end]), end
+        if kind is str:
+            return self._decode_str(data, offset, length)
+        if kind is list:
+            return self._decode_list(data, offset, length)
+        return self._decode_dict(data, offset, length)
+
+    @staticmethod
+    def _decode_str(data, offset, length):
+        end = offset + length
+        if end > len(data):
+            raise ValueError("Truncated binary data")
+        return str(data[offset:end], 'utf-8'), end
+
+    def _decode_list(self, data, offset, length):
+        items = []
+        for _ in range(length):
+            item, offset = self._decode(data, offset)
+            items.append(item)
+        return items, offset
+
+    def _decode_dict(self, data, offset, length):
+        items = {}
+        for _ in range(length):
+            key, offset = self._decode(data, offset)
+            value, offset = self._decode(data, offset)
+            try:
+                items[key] = value
+            except TypeError:
+                raise ValueError("Unhashable key in binary data") from None
+        return items, offset
+
+
+# Fixed size numbers of the binary codec, by tag
+_NUMBERS = {
+    0xcb: _FLOAT64,
+    0xcc: _UINT8,
+    0xcd: _UINT16,
+    0xce: _UINT32,
+    0xcf: _UINT64,
+    0xd0: _INT8,
+    0xd1: _INT16,
+    0xd2: _INT32,
+    0xd3: _INT64,
+}
+
+# Types and length formats of the variable size objects, by tag
+_CONTAINERS = {
+    0xc4: (bytes, _UINT8),
+    0xc5: (bytes, _UINT16),
+    0xc6: (bytes, _UINT32),
+    0xd9: (str, _UINT8),
+    0xda: (str, _UINT16),
+    0xdb: (str, _UINT32),
+    0xdc: (list, _UINT16),
+    0xdd: (list, _UINT32),
+    0xde: (dict, _UINT16),
+    0xdf: (dict, _UINT32),
+}
+
+JSON = JSONCodec()
+BINARY = BinaryCodec()
+RAW = RawCodec()
+
+# Codecs by name
+_codecs = {codec.name: codec for codec in (JSON, BINARY, RAW)}
+
+
+def register_codec(codec):
+    """Make ``codec``, an instance of a ``Codec`` subclass, available."""
+    _codecs[codec.name] = codec
+
+
+def get_codec(name):
+    """
+    Return the codec called ``name``.
+
+    :raise ValueError: If there is no such codec.
+    """
+    try:
+        return _codecs[name]
+    except KeyError:
+        raise ValueError("Unknown codec: {0}".format(name)) from None
@@ -1,6 +1,9 @@
 """Proxy object for cellaserv.
 
-Data for requests and events is encoded as JSON objects.
+Data for events and requests is encoded as JSON objects. A proxy created with
+``negotiate_codecs=True`` reads the codecs of the actions of a service with
+its ``help_actions`` action before the first call to the service, and encodes
+the requests with the codec of the action, see ``cellaserv.payload``.
 
 Example usage::
 
@@ -12,15 +15,50 @@ Example usage::
     >>> robot('match-start')
     >>> # Send event 'wait' with data
     >>> robot('wait', seconds=2)
+
+Threads can share a proxy that uses a pool of connections::
+
+    >>> robot = CellaservProxy(pool_size=4)
+
+In asyncio code, use ``AsyncCellaservProxy``, whose requests are coroutines::
+
+    >>> robot = AsyncCellaservProxy()
+    >>> async def main():
+    ...     print(await robot.date.time())
+
+The replies of read-only actions can be cached by the proxy, for ``ttl``
+seconds and/or until an event of ``invalidate_on`` is published::
+
+    >>> robot = CellaservProxy(cache={
+    ...     'config.get': {'invalidate_on': 'config.updated'},
+    ...     'map.get_obstacles': {'ttl': 0.1, 'size': 16},
+    ... })
+
+Identical concurrent calls of idempotent actions can be coalesced, so that a
+single request is sent::
+
+    >>> robot = CellaservProxy(pool_size=4, coalesce=['map.get_obstacles'])
+
+Multiple actions can be called at once, in about one round trip::
+
+    >>> robot.request_many([('sensor', 'left', 'read', None),
+    ...                     ('sensor', 'right', 'read', None)])
+    [12, 14]
 """
 
-import json
 import logging
 import socket
+import threading
+import time
 import traceback
+from concurrent.futures import Future
+from functools import partial
 
 import cellaserv.client
 import cellaserv.settings
+from cellaserv import payload
+from cellaserv.cache import TTLCache
+from cellaserv.protobuf.cellaserv_pb2 import Message, Publish
 from cellaserv.settings import DEBUG
 
 logger = logging.getLogger(__name__)
@@ -28,17 +66,368 @@ logger.setLevel(logging.DEBUG if DEBUG >= 2
                 else logging.INFO if DEBUG == 1
                 else logging.WARNING)
 
+# Marks a miss in the reply caches
+_MISSING = object()
+
+
+def _make_cache(ttl=None, size=None, invalidate_on=()):
+    """
+    Create the reply cache of an action, from its options in the ``cache``
+    argument of ``CellaservProxy``.
+
+    :return: The cache and the list of events invalidating it.
+    """
+    if isinstance(invalidate_on, str):
+        invalidate_on = [invalidate_on]
+    return TTLCache(size or 128, ttl), list(invalidate_on)
+
+
+def _make_caches(cache):
+    """
+    Create the reply caches configured by the ``cache`` argument of
+    ``CellaservProxy``.
+
+    :return: The caches by service and action, and the caches by event
+        invalidating them.
+    """
+    caches = {}
+    caches_by_event = {}
+    for name, options in (cache or {}).items():
+        service, _, action = name.rpartition('.')
+        if not service or not action:
+            raise ValueError(
+                "Cached action must be 'service.action', got {!r}".format(
+                    name))
+
+        action_cache, events = _make_cache(**options)
+        caches.setdefault(service, {})[action] = action_cache
+        for event in events:
+            caches_by_event.setdefault(event, []).append(action_cache)
+
+    return caches, caches_by_event
+
+
+class _CacheInvalidator:
+    """
+    Connection subscribed to the events invalidating reply caches, with a
+    thread clearing the caches when one of the events is received.
+    """
+
+    def __init__(self, sock, caches_by_event):
+        self._socket = sock
+        self._caches_by_event = caches_by_event
+        self.client = cellaserv.client.SynClient(sock)
+
+        for event in caches_by_event:
+            self.client.subscribe(event)
+        # cellaserv handles the messages of a connection in order: once this
+        # request is answered, the subscriptions are registered and no event
+        # can be missed.
+        self.client.request('list-services', 'cellaserv')
+
+        self._thread = threading.Thread(target=self._read_events)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read_events(self):
+        while True:
+            try:
+                msg = self.client.read_message()
+            except Exception as e:
+                logger.debug("[Cache] Stopping invalidation: %s", e)
+                return
+
+            if msg.type != Message.Publish:
+                continue
+
+            pub = Publish()
+            pub.ParseFromString(msg.content)
+            for cache in self._caches_by_event.get(pub.event, ()):
+                cache.clear()
+
+    def close(self):
+        """Close the connection, which stops the thread."""
+        try:
+            # Wake up the thread blocked reading the socket
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+class _SingleFlight:
+    """
+    Coalesce identical concurrent requests: while a request is in flight,
+    identical requests wait for its reply instead of being sent.
+    """
+
+    def __init__(self, actions=True):
+        """
+        :param actions: True to coalesce the requests of all the actions, or
+            the ``'service.action'`` names of the coalesced actions.
+        """
+        self.actions = actions if actions is True else set(actions)
+        self._lock = threading.Lock()
+        # map requests in flight to the future of their reply
+        self._calls = {}
+
+    def call(self, key, request):
+        """
+        Call ``request``, unless an identical request is in flight.
+
+        :param tuple key: ``(service, identification, action, data)`` of the
+            request.
+        :param request: Function sending the request and returning its reply.
+        :return: The reply of ``request``, or of the identical request in
+            flight. Its exception is raised in all the callers.
+        """
+        if self.actions is not True:
+            service, _, action, _ = key
+            if service + '.' + action not in self.actions:
+                return request()
+
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            return future.result()
+
+        try:
+            reply = request()
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._calls[key]
+        future.set_result(reply)
+        return reply
+
+
+class _ActionCodecs:
+    """Codecs of the actions of services, read from their ``help_actions``."""
+
+    # When help_actions fails, the actions of the service are called in JSON
+    # for this number of seconds, then help_actions is requested again
+    retry_interval = 1.
+
+    def __init__(self):
+        # map (service, identification) to (codecs of the actions by name,
+        # time of the next help_actions request or None)
+        self._services = {}
+        # concurrent first calls to a service read its codecs once
+        self._single_flight = _SingleFlight()
+
+    def get(self, service, identification):
+        """
+        Return the codecs of the actions of a service by name, or None if they
+        are not known yet.
+        """
+        try:
+            codecs, retry_at = self._services[(service, identification)]
+        except KeyError:
+            return None
+        if retry_at is not None and time.monotonic() >= retry_at:
+            return None
+        return codecs
+
+    def learn(self, service, identification, help_actions):
+        """
+        Record the codecs of the actions of a service.
+
+        :param help_actions: The decoded reply of ``help_actions``, or the
+            exception raised by the request.
+        """
+        retry_at = None
+        if isinstance(help_actions, cellaserv.client.NoSuchMethod):
+            # Not a python service, its actions use json
+            codecs = {}
+        elif isinstance(help_actions, ValueError):
+            logger.warning("[Proxy] Invalid help_actions of %s[%s]: %s",
+                           service, identification, help_actions)
+            codecs = {}
+        elif isinstance(help_actions, Exception):
+            # The service may be busy or not registered yet, use json until
+            # asking again
+            logger.warning("[Proxy] Cannot read the codecs of %s[%s]: %s",
+                           service, identification, help_actions)
+            codecs = {}
+            retry_at = time.monotonic() + self.retry_interval
+        elif not isinstance(help_actions, dict):
+            logger.warning("[Proxy] Invalid help_actions of %s[%s]: %r",
+                           service, identification, help_actions)
+            codecs = {}
+        else:
+            codecs = {}
+            for action, entry in help_actions.items():
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    codecs[action] = payload.get_codec(
+                        entry.get('codec', 'json'))
+                except ValueError as e:
+                    # Unknown here, the action is called in json
+                    logger.warning("[Proxy] Action %s of %s[%s]: %s", action,
+                                   service, identification, e)
+        self._services[(service, identification)] = codecs, retry_at
+
+    def negotiate(self, service, identification, request):
+        """
+        Record the codecs of a service, read by ``request``. Concurrent
+        callers wait for the same request.
+
+        :param request: Function returning the decoded reply of
+            ``help_actions``, or the exception raised by the request.
+        """
+        key = (service, identification, 'help_actions', None)
+        self._single_flight.call(
+            key, lambda: self.learn(service, identification, request()))
+
+
+# Errors of the help_actions requests, recorded by _ActionCodecs.learn()
+_HELP_ERRORS = (cellaserv.client.ReplyError, cellaserv.client.NoSuchService,
+                cellaserv.client.NoSuchIdentification,
+                cellaserv.client.NoSuchMethod, ValueError)
+
+
+def _deadline(timeout):
+    """Return the time at which ``timeout`` expires, or None."""
+    if timeout is None:
+        return None
+    return time.monotonic() + timeout
+
+
+def _time_left(deadline):
+    """Return the number of seconds left before ``deadline``, or None."""
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0)
+
+
+def _encode_call(codec, args):
+    """
+    Encode ``args``, the list of positional arguments or the dict of keyword
+    arguments of a call, or None.
+    """
+    if isinstance(args, dict):
+        return codec.encode_arguments((), args)
+    return codec.encode_arguments(args or (), {})
+
 
 class ActionProxy:
     """Action proxy for cellaserv."""
 
-    def __init__(self, action, service, identification, client):
+    def __init__(self, action, service, identification, client, cache=None,
+                 single_flight=None, codecs=None, timeout=None):
+        """
+        :param TTLCache cache: Cache of the encoded replies, by
+            identification and encoded arguments.
+        :param _SingleFlight single_flight: Coalesces the identical
+            concurrent requests.
+        :param _ActionCodecs codecs: Codecs of the actions, JSON is used if
+            None.
+        :param float timeout: Timeout of the calls, in seconds. The request
+            reading the codecs of the service counts in the timeout of the
+            first call.
+        """
         self.action = action
         self.service = service
         self.identification = identification
         self.client = client
+        self.cache = cache
+        self.single_flight = single_flight
+        self.codecs = codecs
+        self.timeout = timeout
 
     def __call__(self, *args, **kwargs):
+        if not self._check_args(args, kwargs):
+            return None
+
+        timeout = None
+        codec = self._codec()
+        if codec is None:
+            # First call to the service, the call gets the time left
+            deadline = _deadline(self.timeout)
+            self.codecs.negotiate(self.service, self.identification,
+                                  partial(self._help_actions, self.timeout))
+            codec = self._codec() or payload.JSON
+            timeout = _time_left(deadline)
+            if timeout == 0:
+                raise cellaserv.client._request_timeout(self.timeout)
+
+        data = codec.encode_arguments(args, kwargs)
+        if self.cache is not None:
+            key = (self.identification, data)
+            raw_data = self.cache.get(key, _MISSING)
+            if raw_data is not _MISSING:
+                return self._decode_reply(raw_data, codec)
+            generation = self.cache.generation
+
+        raw_data = self._request(data, timeout)
+        if self.cache is not None:
+            self.cache.put(key, raw_data, generation)
+        return self._decode_reply(raw_data, codec)
+
+    def _request(self, data, timeout=None):
+        """
+        Send the request, or wait for an identical one in flight.
+
+        :param float timeout: Timeout of the request, defaults to the timeout
+            of the client.
+        """
+        request = partial(self.client.request, self.action,
+                          service=self.service,
+                          identification=self.identification, data=data)
+        if timeout is not None:
+            request = partial(request, timeout=timeout)
+        if self.single_flight is None:
+            return request()
+
+        key = (self.service, self.identification, self.action, data)
+        return self.single_flight.call(key, request)
+
+    def _help_actions(self, timeout=None):
+        """Return the help of the actions of the service, or its error."""
+        request = partial(self.client.request, 'help_actions',
+                          service=self.service,
+                          identification=self.identification)
+        if timeout is not None:
+            request = partial(request, timeout=timeout)
+        try:
+            return self._decode_reply(request())
+        except _HELP_ERRORS as e:
+            return e
+
+    def _codec(self):
+        """
+        Return the codec of the action, or None if the codecs of the service
+        must be read first.
+        """
+        if self.codecs is None:
+            return payload.JSON
+        codecs = self.codecs.get(self.service, self.identification)
+        if codecs is None:
+            return None
+        return codecs.get(self.action, payload.JSON)
+
+    def _learn_codecs(self, help_actions):
+        """
+        Record the codecs of the service, from the reply of ``help_actions``
+        or the exception it raised, and return the codec of the action.
+        """
+        self.codecs.learn(self.service, self.identification, help_actions)
+        codecs = self.codecs.get(self.service, self.identification) or {}
+        return codecs.get(self.action, payload.JSON)
+
+    def _check_args(self, args, kwargs):
+        """Log a coding error if both ``args`` and ``kwargs`` are given."""
         if args and kwargs:
             logger.error(
                 "[Proxy] Cannot send a request with both args and kwargs")
@@ -46,35 +435,83 @@ class ActionProxy:
             self.client.publish(
                 event='log.coding-error',
                 data=str_stack.encode())
-            return None
+            return False
+        return True
 
-        data = args or kwargs
-        req_data = json.dumps(data).encode() if data else None
-        raw_data = self.client.request(self.action,
-                                       service=self.service,
-                                       identification=self.identification,
-                                       data=req_data)
+    @staticmethod
+    def _decode_reply(raw_data, codec=payload.JSON):
         if raw_data is not None:
-            ret = json.loads(raw_data.decode("utf8"))
-        else:
-            ret = None
-        return ret
+            return codec.decode(raw_data)
+        return None
+
+
+class AsyncActionProxy(ActionProxy):
+    """Action proxy for cellaserv, whose calls are coroutines."""
+
+    async def __call__(self, *args, **kwargs):
+        if not self._check_args(args, kwargs):
+            return None
+
+        codec = self._codec()
+        if codec is None:
+            # First call to the service
+            try:
+                help_actions = self._decode_reply(await self.client.request(
+                    'help_actions', service=self.service,
+                    identification=self.identification))
+            except _HELP_ERRORS as e:
+                help_actions = e
+            codec = self._learn_codecs(help_actions)
+
+        data = codec.encode_arguments(args, kwargs)
+        if self.cache is not None:
+            key = (self.identification, data)
+            raw_data = self.cache.get(key, _MISSING)
+            if raw_data is not _MISSING:
+                return self._decode_reply(raw_data, codec)
+            generation = self.cache.generation
+
+        raw_data = await self.client.request(
+            self.action, service=self.service,
+            identification=self.identification, data=data)
+        if self.cache is not None:
+            self.cache.put(key, raw_data, generation)
+        return self._decode_reply(raw_data, codec)
 
 
 class ServiceProxy:
     """Service proxy for cellaserv."""
 
-    def __init__(self, service_name, client):
+    action_proxy = ActionProxy
+
+    def __init__(self, service_name, client, caches=None,
+                 single_flight=None, codecs=None, timeout=None):
+        """
+        :param dict caches: Reply caches of the actions of the service, by
+            action name.
+        :param _SingleFlight single_flight: Coalesces the identical
+            concurrent requests.
+        :param _ActionCodecs codecs: Codecs of the actions.
+        :param float timeout: Timeout of the calls.
+        """
         self.service_name = service_name
         self.client = client
         self.identification = None
+        self._caches = caches or {}
+        self._single_flight = single_flight
+        self._codecs = codecs
+        self._timeout = timeout
 
     def __getattr__(self, action):
         if action.startswith('__') or action in ['getdoc']:
             return super().__getattr__(action)
 
-        action = ActionProxy(action, self.service_name, self.identification,
-                             self.client)
+        action = self.action_proxy(action, self.service_name,
+                                   self.identification, self.client,
+                                   cache=self._caches.get(action),
+                                   single_flight=self._single_flight,
+                                   codecs=self._codecs,
+                                   timeout=self._timeout)
         return action
 
     def __getitem__(self, identification):
@@ -83,28 +520,204 @@ class ServiceProxy:
 
 
 class CellaservProxy:
-    """Proxy class for cellaserv."""
+    """
+    Proxy class for cellaserv.
+
+    By default, the proxy uses a single connection that must not be shared
+    between threads. With ``pool_size``, requests are sent on a pool of up to
+    ``pool_size`` connections, so that multiple threads can use the proxy
+    concurrently.
+
+    With ``timeout``, requests raise ``RequestTimeout`` if there is no reply
+    after ``timeout`` seconds, instead of waiting for cellaserv.
 
-    def __init__(self, client=None, host=None, port=None):
+    Without ``host`` and ``port``, the proxy connects with
+    ``cellaserv.settings.get_socket()``, over the unix socket ``CS_SOCKET``
+    if it is set.
+
+    ``cache`` maps the ``'service.action'`` names of read-only actions to the
+    options of their reply cache:
+
+    - ``ttl``: replies expire after this number of seconds, never by default,
+    - ``size``: number of replies kept, the least recently used are evicted,
+      128 by default,
+    - ``invalidate_on``: name of an event, or list of names, clearing the
+      cache when it is published. The proxy opens a second connection to
+      subscribe to these events.
+
+    Replies are cached by identification and arguments, errors are not
+    cached. The reply is decoded at each call, so callers do not share the
+    returned objects.
+
+    With ``coalesce``, identical calls made concurrently by multiple threads
+    send a single request, and all the callers get its reply or its
+    exception. Only idempotent actions should be coalesced: ``coalesce`` is
+    the list of their ``'service.action'`` names, or True for all the
+    actions. Calls are identical if they have the same service,
+    identification, action and arguments.
+
+    The actions are called in JSON. With ``negotiate_codecs=True``, the
+    proxy requests the ``help_actions`` of a service before the first call to
+    it, to use the codecs of its actions, see ``cellaserv.payload``. This
+    request counts in the timeout of the first call. If it fails, the actions
+    of the service are called in JSON, and it is retried a second later.
+    """
+
+    service_proxy = ServiceProxy
+
+    def __init__(self, client=None, host=None, port=None, pool_size=None,
+                 pool_idle_timeout=60, timeout=None, cache=None,
+                 coalesce=None, negotiate_codecs=False):
         self.socket = None
+        self.pool = None
+        self._invalidator = None
+        self._single_flight = _SingleFlight(coalesce) if coalesce else None
+        self._codecs = _ActionCodecs() if negotiate_codecs else None
+
+        if host or port:
+            host = host or cellaserv.settings.HOST
+            port = port or cellaserv.settings.PORT
+
+            def get_socket():
+                return socket.create_connection((host, port))
+        else:
+            # Use the unix socket if configured
+            get_socket = cellaserv.settings.get_socket
+
+        self._setup_caches(cache, get_socket)
 
         if client:
             self.client = client
         else:
-            if not host:
-                host = cellaserv.settings.HOST
-            if not port:
-                port = cellaserv.settings.PORT
 
-            self.socket = socket.create_connection((host, port))
-            self.client = cellaserv.client.SynClient(self.socket)
+            if pool_size:
+                def connect():
+                    return cellaserv.client.SynClient(get_socket(),
+                                                      timeout=timeout)
+
+                self.pool = cellaserv.client.ClientPool(
+                    size=pool_size, idle_timeout=pool_idle_timeout,
+                    connect=connect)
+                self.client = self.pool
+            else:
+                self.socket = get_socket()
+                self.client = cellaserv.client.SynClient(self.socket,
+                                                         timeout=timeout)
+
+        if timeout is None:
+            timeout = getattr(self.client, 'timeout', None)
+        # Timeout of the calls, shared with the help_actions requests
+        self.timeout = timeout
+
+    def _setup_caches(self, cache, get_socket):
+        """Create the reply caches, see the ``cache`` argument."""
+        self._caches, caches_by_event = _make_caches(cache)
+        if caches_by_event:
+            self._invalidator = _CacheInvalidator(get_socket(),
+                                                  caches_by_event)
 
     def __getattr__(self, service_name):
-        return ServiceProxy(service_name, self.client)
+        return self.service_proxy(service_name, self.client,
+                                  self._caches.get(service_name),
+                                  self._single_flight, self._codecs,
+                                  self.timeout)
+
+    def request_many(self, calls, timeout=None):
+        """
+        Call multiple actions: the requests are sent back-to-back, then the
+        replies are gathered. The replies are not cached.
+
+        :param calls: List of ``(service, identification, action, args)``,
+            where ``args`` is a list of positional arguments, a dict of
+            keyword arguments or None.
+        :param float timeout: Deadline of all the calls, in seconds, defaults
+            to the timeout of the proxy.
+        :return: The decoded replies, in the order of ``calls``. The item of a
+            failed call is the exception it raised, ``NoSuchService`` or
+            ``RequestTimeout`` for example.
+        :rtype: list
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = _deadline(timeout)
+
+        # Read the codecs of the services called for the first time
+        unknown = self._unknown_codecs(calls)
+        if unknown:
+            self._learn_codecs(unknown, self.client.request_many(
+                self._help_calls(unknown), timeout=timeout))
+            left = _time_left(deadline)
+            if left == 0:
+                return self._expired(calls, timeout)
+        else:
+            left = timeout
+
+        codecs = self._call_codecs(calls)
+        return self._decode_replies(self.client.request_many(
+            self._encode_calls(calls, codecs), timeout=left), codecs)
+
+    def _unknown_codecs(self, calls):
+        """Services of ``calls`` whose codecs are not known yet."""
+        if self._codecs is None:
+            return []
+        return list({(service, identification)
+                     for service, identification, _, _ in calls
+                     if self._codecs.get(service, identification) is None})
+
+    @staticmethod
+    def _help_calls(services):
+        return [(service, identification, 'help_actions', None)
+                for service, identification in services]
+
+    @staticmethod
+    def _expired(calls, timeout):
+        """Results of ``calls`` when the deadline expired before sending."""
+        return [cellaserv.client._request_timeout(timeout) for _ in calls]
+
+    def _learn_codecs(self, services, replies):
+        """Record the codecs of ``services``, from their help_actions."""
+        for (service, identification), reply in zip(services, replies):
+            if not isinstance(reply, Exception):
+                try:
+                    reply = ActionProxy._decode_reply(reply)
+                except ValueError as e:
+                    reply = e
+            self._codecs.learn(service, identification, reply)
+
+    def _call_codecs(self, calls):
+        """Codecs of the actions of ``calls``."""
+        if self._codecs is None:
+            return [payload.JSON] * len(calls)
+        return [(self._codecs.get(service, identification) or {}).get(
+                    action, payload.JSON)
+                for service, identification, action, _ in calls]
+
+    @staticmethod
+    def _encode_calls(calls, codecs):
+        return [(service, identification, action, _encode_call(codec, args))
+                for (service, identification, action, args), codec
+                in zip(calls, codecs)]
+
+    @staticmethod
+    def _decode_replies(replies, codecs):
+        results = []
+        for raw_data, codec in zip(replies, codecs):
+            if isinstance(raw_data, Exception):
+                results.append(raw_data)
+                continue
+            try:
+                results.append(ActionProxy._decode_reply(raw_data, codec))
+            except ValueError as e:
+                results.append(e)
+        return results
 
     def __del__(self):
         if self.socket:
             self.socket.close()
+        if self.pool:
+            self.pool.close()
+        if self._invalidator:
+            self._invalidator.close()
 
     def __call__(self, event, **kwargs):
         """Send a publish message.
@@ -114,6 +727,66 @@ class CellaservProxy:
         """
         try:
             self.client.publish(event=event,
-                                data=json.dumps(kwargs).encode())
+                                data=payload.JSON.encode(kwargs))
         except:
             traceback.print_exc()
+
+
+class AsyncServiceProxy(ServiceProxy):
+    """Service proxy for cellaserv, whose calls are coroutines."""
+
+    action_proxy = AsyncActionProxy
+
+
+class AsyncCellaservProxy(CellaservProxy):
+    """
+    Proxy class for cellaserv, for asyncio code: requests are coroutines,
+    that must run in the event loop of the client.
+
+    The client is an ``AsyncioClient``. In a coroutine action of a service,
+    use the service itself with ``AsyncCellaservProxy(client=self)``.
+    """
+
+    service_proxy = AsyncServiceProxy
+
+    def __init__(self, client=None, loop=None, cache=None,
+                 negotiate_codecs=False):
+        """
+        :param AsyncioClient client: The client sending the requests, a new
+            connection by default.
+        :param loop: Event loop of the new connection, defaults to the loop of
+            this thread.
+        :param dict cache: Reply caches, see ``CellaservProxy``.
+        :param bool negotiate_codecs: See ``CellaservProxy``.
+        """
+        self.socket = None
+        self.pool = None
+        self._invalidator = None
+        self._single_flight = None
+        self._codecs = _ActionCodecs() if negotiate_codecs else None
+        self.timeout = None
+        self._setup_caches(cache, cellaserv.settings.get_socket)
+
+        if client:
+            self.client = client
+        else:
+            self.client = cellaserv.client.AsyncioClient(loop=loop)
+            self.socket = self.client._socket
+
+    async def request_many(self, calls, timeout=None):
+        """Coroutine version of ``CellaservProxy.request_many()``."""
+        deadline = _deadline(timeout)
+
+        unknown = self._unknown_codecs(calls)
+        if unknown:
+            self._learn_codecs(unknown, await self.client.request_many(
+                self._help_calls(unknown), timeout=timeout))
+            left = _time_left(deadline)
+            if left == 0:
+                return self._expired(calls, timeout)
+        else:
+            left = timeout
+
+        codecs = self._call_codecs(calls)
+        return self._decode_replies(await self.client.request_many(
+            self._encode_calls(calls, codecs), timeout=left), codecs)
@@ -7,9 +7,9 @@ Service.action and Service.event.
 
 The @Service.action make a method exported to cellaserv. When matching request
 is received, the method is called. The return value of the method is sent in
-the reply. The return value must be json-encodable. The method must not take
-too long to execute or it will cause cellaserv to send a RequestTimeout error
-instead of your reply.
+the reply. The return value must be json-encodable, see below for other
+codecs. The method must not take too long to execute or it will cause
+cellaserv to send a RequestTimeout error instead of your reply.
 
 The @Service.event make the service listen for an event from cellaserv.
 
@@ -17,6 +17,75 @@ Only one @Service.action or @Service.event method can run at the same time
 because there is only one service thread. If you want to have a background job,
 use the @Service.thread decorator.
 
+If ``max_workers`` is set, actions run in a pool of ``max_workers`` threads
+instead, so that a slow action does not delay the other requests. Replies are
+still sent from the service thread, and events are still handled there.
+Actions declared with ``@Service.action(serialized=True)`` keep running in the
+service thread, and ``@Service.action(concurrency=n)`` limits the number of
+concurrent calls of an action, the other calls wait for their turn::
+
+    >>> class Slow(Service):
+    ...     max_workers = 8
+    ...
+    ...     @Service.action(concurrency=2)
+    ...     def compute(self, n):
+    ...         ...
+    ...
+    ...     @Service.action(serialized=True)
+    ...     def reset(self):
+    ...         ...
+
+Actions and events can also be coroutine functions (``async def``). They run
+as tasks in the event loop of the service, and the reply is sent when the
+coroutine returns, so they can wait for other services without blocking the
+service. Use ``cellaserv.proxy.AsyncCellaservProxy(client=self)`` to send
+requests from a coroutine::
+
+    >>> class Async(Service):
+    ...     @Service.action
+    ...     async def time_plus(self, delta):
+    ...         cs = AsyncCellaservProxy(client=self)
+    ...         return await cs.date.time() + delta
+
+CPU-bound actions can run in a pool of ``process_workers`` processes with
+``@Service.action(executor='process')``, so that they do not hold the GIL of
+the service. They must be static methods, the service cannot be sent to
+another process: they receive the decoded arguments of the request, and
+their return value is encoded in the process. The processes are started with
+the service::
+
+    >>> class Planner(Service):
+    ...     @staticmethod
+    ...     @Service.action(executor='process')
+    ...     def path(start, goal):
+    ...         ...
+
+The replies of actions that only depend on their arguments can be cached,
+with ``cache_ttl`` (time to live in seconds) and/or ``cache_size`` (number of
+replies kept, 128 by default). The cache is invalidated when one of the
+events of ``cache_invalidate_on`` is received, or by
+``self.invalidate_cache()``::
+
+    >>> class Map(Service):
+    ...     @Service.action(cache_ttl=10, cache_invalidate_on='map.updated')
+    ...     def query(self, x, y):
+    ...         ...
+
+The arguments and replies of actions are encoded in JSON. A service can use
+another codec of ``cellaserv.payload`` for all its actions with the ``codec``
+class attribute, or for one action with ``@Service.action(codec=...)``:
+``'binary'``, a compact binary format that can carry bytes, or ``'raw'``, for
+actions taking and returning bytes. The codec of each action is listed by
+``help_actions``, ``CellaservProxy(negotiate_codecs=True)`` uses it to call
+the action::
+
+    >>> class Camera(Service):
+    ...     @Service.action(codec='raw')
+    ...     def frame(self, settings):
+    ...         return b'...'
+    >>> CellaservProxy(negotiate_codecs=True).camera.frame(b'...')
+    b'...'
+
 If you want to send requests to cellaserv, you should use a CellaservProxy
 object, see ``cellaserv.proxy.CellaservProxy``.
 
@@ -79,6 +148,29 @@ You can specify that your service depends on another service using the
 When the service is instanciated, it will wait for all the dependencies to be
 registered on cellaserv.
 
+Metrics
+-------
+
+Each service counts the calls and errors of its actions and events, and
+records their latencies. The default action ``stats`` returns them, call
+``stats(reset=True)`` to reset them at the same time.
+
+If ``stats_interval`` is set (``CS_STATS_INTERVAL`` in the environment, or
+``stats_interval`` in the ``service`` section of the configuration), the
+service publishes every ``stats_interval`` seconds a report of the requests
+it received since the previous one on ``stats.<service_name>`` (followed by
+``.<identification>`` if any): request rate, latency percentiles of each
+action and event, size of the outgoing queue and lag of the event loop.
+Subscribe to ``stats.*`` to monitor all the services.
+
+Local dispatch
+--------------
+
+If ``local_dispatch`` is set (``CS_LOCAL_DISPATCH`` in the environment), the
+requests and events sent by clients of the same process are dispatched
+directly to the service, without going through cellaserv. See
+``cellaserv.local``.
+
 Threads
 -------
 
@@ -101,8 +193,9 @@ are pretty useful and simplify writing of services for the user.
 
 """
 
-from collections import defaultdict
-import asyncore
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
 import inspect
 import io
 import json
@@ -110,7 +203,9 @@ import logging
 import os
 import sys
 import threading
+import time
 import traceback
+import weakref
 
 from google.protobuf.text_format import MessageToString
 
@@ -120,7 +215,10 @@ from cellaserv.protobuf.cellaserv_pb2 import (
 )
 
 import cellaserv.settings
-from cellaserv.client import AsynClient, SynClient
+from cellaserv import local, payload
+from cellaserv.cache import TTLCache
+from cellaserv.client import AsyncioClient, SynClient, get_event_loop
+from cellaserv.metrics import MetricsReporter, ServiceMetrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG if cellaserv.settings.DEBUG >= 1
@@ -133,6 +231,147 @@ def _request_to_string(req):
     return strfmt.format(r=req, data=req.data if req.data != b"" else "")
 
 
+def _cache_key(req, data, codec):
+    """
+    Key of the arguments of ``req`` in the cache of an action, ``data`` are
+    the arguments decoded with ``codec``.
+    """
+    if codec is not payload.JSON:
+        return req.data
+    # Values that are equal in python but not in json, like 1 and true, get
+    # different keys
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+class _CachingReply:
+    """Store the reply of an action in its cache, then send it."""
+
+    def __init__(self, client, cache, key):
+        self._client = client
+        self._cache = cache
+        self._key = key
+        self._generation = cache.generation
+
+    def reply_to(self, req, data=None):
+        self._cache.put(self._key, data, self._generation)
+        self._client.reply_to(req, data)
+
+    def reply_error_to(self, req, error_type, what=None):
+        self._client.reply_error_to(req, error_type, what)
+
+
+def _clear_cache(cache, *args, **kwargs):
+    """Subscription callback invalidating ``cache``."""
+    cache.clear()
+
+
+def _call_arguments(data):
+    """Return the arguments of an action called with the decoded ``data``."""
+    # Guess type of arguments passing
+    if type(data) is list:
+        return data, {}
+    elif type(data) is dict:
+        return [], data
+    else:
+        return [data], {}
+
+
+def _action_signature(function, bound):
+    """
+    Return the signature of an action or event as seen by its callers, or
+    None if it cannot be computed.
+
+    :param bool bound: The function is called as a method of the service, its
+        first parameter is removed.
+    """
+    try:
+        signature = inspect.signature(function)
+    except (TypeError, ValueError):
+        return None
+
+    if bound:
+        parameters = list(signature.parameters.values())[1:]
+        signature = signature.replace(parameters=parameters)
+    return signature
+
+
+def _make_binder(signature):
+    """
+    Return a function ``binder(args, kwargs)`` raising TypeError if an action
+    of ``signature`` cannot be called with ``args`` and ``kwargs``, or None if
+    the signature is unknown.
+
+    The common signatures, without positional-only and keyword-only
+    parameters, are checked without ``Signature.bind()``.
+    """
+    if signature is None:
+        return None
+
+    parameters = list(signature.parameters.values())
+    kinds = {parameter.kind for parameter in parameters}
+    if kinds - {inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                inspect.Parameter.VAR_POSITIONAL,
+                inspect.Parameter.VAR_KEYWORD}:
+        def _bind_signature(args, kwargs):
+            signature.bind(*args, **kwargs)
+        return _bind_signature
+
+    names = [parameter.name for parameter in parameters
+             if parameter.kind == inspect.Parameter.POSITIONAL_OR_KEYWORD]
+    known_names = frozenset(names)
+    var_args = inspect.Parameter.VAR_POSITIONAL in kinds
+    var_kwargs = inspect.Parameter.VAR_KEYWORD in kinds
+    # Required parameters not given by the first i positional arguments, for
+    # each i
+    required = [frozenset(parameter.name for parameter in parameters[i:]
+                          if parameter.kind
+                          == inspect.Parameter.POSITIONAL_OR_KEYWORD
+                          and parameter.default is inspect.Parameter.empty)
+                for i in range(len(names) + 1)]
+
+    def _bind(args, kwargs):
+        count = len(args)
+        if count > len(names):
+            if not var_args:
+                raise TypeError("too many positional arguments")
+            count = len(names)
+
+        if kwargs:
+            if not var_kwargs and not known_names.issuperset(kwargs):
+                unexpected = next(name for name in kwargs
+                                  if name not in known_names)
+                raise TypeError(
+                    "got an unexpected keyword argument {0!r}".format(
+                        unexpected))
+            for name in names[:count]:
+                if name in kwargs:
+                    raise TypeError(
+                        "multiple values for argument {0!r}".format(name))
+
+        missing = required[count]
+        if missing and not missing.issubset(kwargs):
+            name = next(name for name in names[count:]
+                        if name in missing and name not in kwargs)
+            raise TypeError("missing a required argument: {0!r}".format(name))
+
+    return _bind
+
+
+def _help_entry(name, function, signature, codec=None):
+    """
+    Return the documentation and signature of an action or event, and the
+    name of the codec of an action.
+    """
+    if signature is None:
+        sig = name + '(...)'
+    else:
+        sig = name + str(signature)
+    entry = {'doc': inspect.getdoc(function) or "", 'sig': sig}
+    if codec is not None:
+        entry['codec'] = codec.name
+    return entry
+
+
 # Keeping the script compatible between python 3.1 and above
 Event = None
 if sys.version_info[1] < 2:
@@ -270,6 +509,46 @@ class ConfigVariable:
         return self.value
 
 
+# Services connected to cellaserv, by event loop
+_connected_services = defaultdict(weakref.WeakSet)
+
+# Marks a miss in the caches of the actions
+_MISSING = object()
+
+# Options of the actions declared without Service.action
+_DEFAULT_ACTION_OPTIONS = {
+    'serialized': False,
+    'concurrency': None,
+    'executor': None,
+    'cache_ttl': None,
+    'cache_size': None,
+    'cache_invalidate_on': (),
+    # The default actions are always called in JSON, so that clients can
+    # read help_actions before knowing the codecs of the service
+    'codec': 'json',
+}
+
+
+def _call_in_process(function, data, codec):
+    """
+    Call the action ``function`` with the decoded ``data``, in a process of
+    the pool.
+
+    :return: The reply data, encoded with ``codec``.
+    """
+    args, kwargs = _call_arguments(data)
+    reply_data = function(*args, **kwargs)
+    if reply_data is not None:
+        reply_data = codec.encode(reply_data)
+    return reply_data
+
+
+def _warm_up(functions):
+    """Run in each process of the pool when the service starts."""
+    # Unpickling the functions imported their modules
+    return len(functions)
+
+
 class ServiceMeta(type):
 
     def __init__(cls, name, bases, nmspc):
@@ -277,7 +556,9 @@ class ServiceMeta(type):
         ``__init__()`` is called when a new type of Service is needed.
 
         This method setups the list of actions (cls._actions) and subscribed
-        events (cls._event) in the new class.
+        events (cls._event) in the new class. The signatures and help of the
+        actions and events are computed here once, see
+        ``Service._handle_request()`` and ``Service.help()``.
 
         Basic level of metaprogramming magic.
         """
@@ -303,16 +584,44 @@ class ServiceMeta(type):
             return _variable_update
 
         _actions = {}
+        _action_options = {}
+        _coroutine_actions = set()
+        # Actions that are static or class methods, not bound to the service
+        _static_actions = set()
+        _action_binders = {}
+        _action_codecs = {}
+        _help_actions = {}
         _config_variables = []
         _events = {}
+        _help_events = {}
         _threads = []
 
         # Go through all the members of the class, check if they are tagged as
         # action, events, etc. Wrap them if necessary then store them in lists.
         for name, member in inspect.getmembers(cls):
+            static = isinstance(inspect.getattr_static(cls, name, None),
+                                (staticmethod, classmethod))
             if hasattr(member, "_actions"):
+                signature = _action_signature(member, bound=not static)
                 for action in member._actions:
                     _actions[action] = member
+                    _action_options[action] = getattr(
+                        member, '_action_options', _DEFAULT_ACTION_OPTIONS)
+                    if inspect.iscoroutinefunction(member):
+                        _coroutine_actions.add(action)
+                    if static:
+                        _static_actions.add(action)
+                    _action_binders[action] = _make_binder(signature)
+                    _action_codecs[action] = payload.get_codec(
+                        _action_options[action].get('codec') or cls.codec)
+                    _help_actions[action] = _help_entry(
+                        action, member, signature, _action_codecs[action])
+                if (_action_options[action]['executor'] == 'process'
+                        and not isinstance(inspect.getattr_static(cls, name),
+                                           staticmethod)):
+                    raise TypeError(
+                        "{0}.{1}: actions running in a process must be "
+                        "static methods".format(cls.__name__, name))
             if hasattr(member, "_events"):
                 for event in member._events:
                     _events[event] = member
@@ -332,45 +641,69 @@ class ServiceMeta(type):
                 _events[event_set] = _event_wrap_set(member)
                 _events[event_clear] = _event_wrap_clear(member)
 
+        for event, member in _events.items():
+            _help_events[event] = _help_entry(
+                event, member, _action_signature(member, bound=True))
+
         cls._actions = _actions
+        cls._action_options = _action_options
+        cls._coroutine_actions = _coroutine_actions
+        cls._static_actions = _static_actions
+        cls._action_binders = _action_binders
+        cls._action_codecs = _action_codecs
         cls._config_variables = _config_variables
         cls._events = _events
         cls._threads = _threads
 
+        cls._help_doc = inspect.getdoc(cls)
+        cls._help_actions = _help_actions
+        cls._help_events = _help_events
+
         cls._service_dependencies = defaultdict(list)
 
         return super().__init__(cls)
 
 
-class Service(AsynClient, metaclass=ServiceMeta):
+class Service(AsyncioClient, metaclass=ServiceMeta):
 
     # Mandatory name of the service as it will appeared for cellaserv.
     service_name = None
     # Optional identification string used to register multiple instances of the
     # same service.
     identification = None
+    # Publish a report of the metrics on stats.<service_name> every
+    # stats_interval seconds, if set.
+    stats_interval = cellaserv.settings.STATS_INTERVAL or None
+    # Run the actions in a pool of max_workers threads, if set.
+    max_workers = None
+    # Number of processes running the actions declared with
+    # executor='process', defaults to the number of CPUs.
+    process_workers = None
+    # Name of the codec of the arguments and replies of the actions, see
+    # cellaserv.payload.
+    codec = 'json'
+    # Seconds cellaserv has to send back an event dispatched by
+    # cellaserv.local. A copy that is not back in time is considered lost,
+    # so that it does not hide a later event with the same data.
+    local_echo_timeout = 5.
 
     # Protocol helpers
 
     @staticmethod
-    def _decode_msg_data(msg):
-        """Returns the data contained in a message."""
-        if msg.HasField('data'):
-            return Service._decode_data(msg.data)
+    def _decode_msg_data(msg, codec):
+        """Returns the data contained in a message, decoded with codec."""
+        if msg.data:
+            return codec.decode(msg.data)
         else:
             return {}
 
     @staticmethod
-    def _decode_data(data):
-        """Returns the data contained in a message."""
-        try:
-            obj = data.decode()
-            return json.loads(obj)
-        except (UnicodeDecodeError, ValueError):
-            # In case the data cannot be decoded, return raw data.
-            # This "feature" can be used to communicate with services that
-            # don't handle json data, but only raw bytes.
-            return data
+    def _decode_event_data(data):
+        """Returns the keyword arguments contained in event data."""
+        if data:
+            return payload.JSON.decode(data)
+        else:
+            return {}
 
     # Class decorators
 
@@ -403,14 +736,33 @@ class Service(AsynClient, metaclass=ServiceMeta):
     # Methods decorators
 
     @staticmethod
-    def action(method_or_name):
+    def action(method_or_name=None, *, serialized=False, concurrency=None,
+               executor=None, cache_ttl=None, cache_size=None,
+               cache_invalidate_on=(), codec=None):
         """
         Use the ``Service.action`` decorator on a method to declare it as
         exported to cellaserv. If a parameter is given, change the name of the
         method to that name.
 
         :param name str: Change the name of that metod to ``name``.
+        :param bool serialized: If the service has ``max_workers``, run the
+            action in the service thread instead of the pool.
+        :param int concurrency: If the service has ``max_workers``, maximum
+            number of calls of the action running at the same time.
+        :param str executor: ``'process'`` to run the action in a pool of
+            processes. The action must be a static method.
+        :param float cache_ttl: Cache the replies of the action for this
+            number of seconds.
+        :param int cache_size: Cache this number of replies of the action, 128
+            by default if ``cache_ttl`` is set.
+        :param cache_invalidate_on: Name of an event, or list of names, that
+            invalidate the cache of the action.
+        :param str codec: Name of the codec of the arguments and reply of the
+            action, defaults to the ``codec`` of the service. See
+            ``cellaserv.payload``.
         """
+        if executor not in (None, 'process'):
+            raise ValueError("Unknown executor: {0}".format(executor))
 
         def _set_action(method, action):
             try:
@@ -418,10 +770,19 @@ class Service(AsynClient, metaclass=ServiceMeta):
             except AttributeError:
                 method._actions = [action]
 
+            method._action_options = {
+                'serialized': serialized,
+                'concurrency': concurrency,
+                'executor': executor,
+                'cache_ttl': cache_ttl,
+                'cache_size': cache_size,
+                'cache_invalidate_on': cache_invalidate_on,
+                'codec': codec,
+            }
             return method
 
         def _wrapper(method):
-            return _set_action(method, method_or_name)
+            return _set_action(method, method_or_name or method.__name__)
 
         if callable(method_or_name):
             return _set_action(method_or_name, method_or_name.__name__)
@@ -477,6 +838,37 @@ class Service(AsynClient, metaclass=ServiceMeta):
 
     def __init__(self, identification=None, sock=None):
         self._reply_cb = {}
+        self._metrics = ServiceMetrics()
+        self._stats_reporter = MetricsReporter(self._metrics)
+        self._stats_handle = None
+        # Deadlines of the copies of events dispatched by cellaserv.local
+        # that cellaserv has not sent back yet, by (event, data)
+        self._local_echoes = {}
+        self._local_echoes_expired_at = time.monotonic()
+        # Calls running in the pool and calls waiting for their turn, by
+        # action
+        self._running_actions = defaultdict(int)
+        self._waiting_actions = defaultdict(deque)
+        # Running coroutines of actions and events, the event loop only keeps
+        # weak references to them
+        self._tasks = set()
+        # Caches of the replies, by action
+        self._action_caches = {
+            action: TTLCache(options['cache_size'] or 128,
+                             options['cache_ttl'])
+            for action, options in self._action_options.items()
+            if options['cache_ttl'] or options['cache_size']}
+        # Callables of the actions, bound to the service
+        self._dispatch = {
+            action: (function if action in self._static_actions
+                     else function.__get__(self, type(self)))
+            for action, function in self._actions.items()}
+        self._process_executor = None
+        self._executor = None
+        if self.max_workers:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers,
+                thread_name_prefix=self.__class__.__name__ + '-action')
 
         if not self.service_name:
             # service name is class name in lower case
@@ -491,70 +883,293 @@ class Service(AsynClient, metaclass=ServiceMeta):
 
         self._setup()
 
-    # Override methods of cellaserv.client.AsynClient
+    # Override methods of cellaserv.client.AsyncioClient
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        _connected_services[self._loop].add(self)
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        local.unregister(self)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self._process_executor is not None:
+            self._process_executor.shutdown(wait=False)
+        for task in list(self._tasks):
+            task.cancel()
+
+        if self._stats_handle is not None:
+            self._stats_handle.cancel()
+            self._stats_handle = None
+
+        services = _connected_services[self._loop]
+        services.discard(self)
+        if not services:
+            # Like asyncore.loop(), Service.loop() returns when there is no
+            # more connection to serve.
+            self._loop.stop()
 
     def on_request(self, req):
         """
         on_request(req) is called when a request is received by the service.
         """
+        self._handle_request(req, self)
+
+    def _handle_request(self, req, client):
+        """
+        Call the action requested by ``req``, and send the reply with
+        ``client``: the service itself, or the object receiving the reply of
+        a local request.
+        """
         if (req.HasField('service_identification')
                 and req.service_identification != self.identification):
             logger.error("Dropping request for wrong identification")
+            self._metrics.record_dropped('InvalidIdentification')
             return
 
         method = req.method
 
         try:
-            callback = self._actions[method]
+            callback = self._dispatch[method]
         except KeyError:
             logger.error("No such method: %s.%s", self, method)
-            self.reply_error_to(req, cellaserv.client.Reply.Error.NoSuchMethod,
-                                method)
+            self._metrics.record_dropped('NoSuchMethod')
+            client.reply_error_to(req,
+                                  cellaserv.client.Reply.Error.NoSuchMethod,
+                                  method)
             return
 
+        begin = time.perf_counter()
+        codec = self._action_codecs[method]
+
         try:
-            data = self._decode_msg_data(req)
+            data = self._decode_msg_data(req, codec)
         except Exception as e:
             logger.error("Bad arguments formatting: %s",
                          _request_to_string(req), exc_info=True)
-            self.reply_error_to(req, cellaserv.client.Reply.Error.BadArguments,
-                                req.data)
+            self._metrics.record_action(method, time.perf_counter() - begin,
+                                        error=True)
+            client.reply_error_to(
+                req, cellaserv.client.Reply.Error.BadArguments,
+                "{0}: invalid {1} data: {2}".format(method, codec.name, e))
+            return
+
+        binder = self._action_binders[method]
+        if binder is not None:
+            try:
+                binder(*_call_arguments(data))
+            except TypeError as e:
+                logger.error("Bad arguments: %s: %s",
+                             _request_to_string(req), e)
+                self._metrics.record_action(
+                    method, time.perf_counter() - begin, error=True)
+                client.reply_error_to(
+                    req, cellaserv.client.Reply.Error.BadArguments,
+                    "{0}: {1}".format(method, e))
+                return
+
+        cache = self._action_caches.get(method)
+        if cache is not None:
+            key = _cache_key(req, data, codec)
+            reply_data = cache.get(key, _MISSING)
+            if reply_data is not _MISSING:
+                self._metrics.record_action(method,
+                                            time.perf_counter() - begin)
+                client.reply_to(req, reply_data)
+                return
+            client = _CachingReply(client, cache, key)
+
+        if method in self._coroutine_actions:
+            self._start_coroutine_action(req, client, method, callback, data,
+                                         begin)
+            return
+
+        options = self._action_options[method]
+        if (options['executor'] == 'process'
+                or (self._executor is not None
+                    and not options['serialized'])):
+            self._submit_action(req, client, method, callback, data, begin)
             return
 
         try:
-            logger.debug("Calling %s/%s.%s(%s)...",
-                         self.service_name, self.identification, method, data)
-
-            # Guess type of arguments passing
-            if type(data) is list:
-                args = data
-                kwargs = {}
-            elif type(data) is dict:
-                args = []
-                kwargs = data
-            else:
-                args = [data]
-                kwargs = {}
-
-            # We use the desciptor's __get__ because we don't know if the
-            # callback should be bound to this instance.
-            bound_cb = callback.__get__(self, type(self))
-            reply_data = bound_cb(*args, **kwargs)
-            logger.debug("Called  %s/%s.%s(%s) = %s",
-                         self.service_name, self.identification, method, data,
-                         reply_data)
-            # Method may, or may not return something. If it returns some data,
-            # it must be encoded in json.
-            if reply_data is not None:
-                reply_data = json.dumps(reply_data).encode()
+            reply_data = self._call_action(method, callback, data)
+        except Exception as e:
+            self._reply_action(req, client, method, begin, error=e)
+            return
+
+        self._reply_action(req, client, method, begin, reply_data)
+
+    def _call_action(self, method, callback, data):
+        """
+        Call the action ``callback`` with the decoded ``data``.
+
+        :return: The reply data, encoded with the codec of the action.
+        """
+        logger.debug("Calling %s/%s.%s(%s)...",
+                     self.service_name, self.identification, method, data)
+
+        args, kwargs = _call_arguments(data)
+        reply_data = callback(*args, **kwargs)
+        logger.debug("Called  %s/%s.%s(%s) = %s",
+                     self.service_name, self.identification, method, data,
+                     reply_data)
+        # Method may, or may not return something. If it returns some data,
+        # it must be encoded.
+        if reply_data is not None:
+            reply_data = self._action_codecs[method].encode(reply_data)
+        return reply_data
+
+    def _start_coroutine_action(self, req, client, method, callback, data,
+                                begin):
+        """Run a coroutine action as a task, reply when it returns."""
+        logger.debug("Starting %s/%s.%s(%s)...",
+                     self.service_name, self.identification, method, data)
+        args, kwargs = _call_arguments(data)
+        try:
+            coroutine = callback(*args, **kwargs)
         except Exception as e:
+            # Bad arguments
+            self._reply_action(req, client, method, begin, error=e)
+            return
+
+        task = self._loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(partial(self._on_coroutine_action_done, req,
+                                       client, method, begin))
+
+    def _on_coroutine_action_done(self, req, client, method, begin, task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+
+        error = task.exception()
+        reply_data = None
+        if error is None:
+            try:
+                reply_data = task.result()
+                if reply_data is not None:
+                    reply_data = self._action_codecs[method].encode(
+                        reply_data)
+            except Exception as e:
+                error = e
+        self._reply_action(req, client, method, begin, reply_data, error)
+
+    def _reply_action(self, req, client, method, begin, reply_data=None,
+                      error=None):
+        """Record the call to an action, and reply with its result."""
+        if error is not None:
             logger.error("Exception during %s", _request_to_string(req),
-                         exc_info=True)
-            self.reply_error_to(req, cellaserv.client.Reply.Error.Custom,
-                                str(e))
+                         exc_info=error)
+            self._metrics.record_action(method, time.perf_counter() - begin,
+                                        error=True)
+            client.reply_error_to(req, cellaserv.client.Reply.Error.Custom,
+                                  str(error))
+            return
+
+        self._metrics.record_action(method, time.perf_counter() - begin)
+        client.reply_to(req, reply_data)
+
+    def _submit_action(self, req, client, method, callback, data, begin):
+        """
+        Call an action in the pool of threads or of processes, or queue the
+        call if the action already runs ``concurrency`` times. Called in the
+        service thread.
+        """
+        concurrency = self._action_options[method]['concurrency']
+        if concurrency and self._running_actions[method] >= concurrency:
+            self._waiting_actions[method].append(
+                (req, client, method, callback, data, begin))
             return
 
-        self.reply_to(req, reply_data)
+        self._running_actions[method] += 1
+        if self._action_options[method]['executor'] == 'process':
+            future = self._process_executor.submit(
+                _call_in_process, callback, data,
+                self._action_codecs[method])
+        else:
+            future = self._executor.submit(self._call_action, method,
+                                           callback, data)
+        future.add_done_callback(partial(self._on_action_done, req, client,
+                                         method, begin))
+
+    def _on_action_done(self, req, client, method, begin, future):
+        """Called when an action running in a pool returns."""
+        error = future.exception()
+        reply_data = None if error is not None else future.result()
+        self._loop.call_soon_threadsafe(self._finish_action, req, client,
+                                        method, begin, reply_data, error)
+
+    def _finish_action(self, req, client, method, begin, reply_data, error):
+        """Reply to an action called in the pool, in the service thread."""
+        self._running_actions[method] -= 1
+        self._reply_action(req, client, method, begin, reply_data, error)
+
+        waiting = self._waiting_actions.get(method)
+        if waiting:
+            self._submit_action(*waiting.popleft())
+
+    def _dispatch_publish(self, event, data):
+        if self._local_echoes:
+            key = (event, data)
+            deadlines = self._local_echoes.get(key)
+            if deadlines:
+                now = time.monotonic()
+                while deadlines and deadlines[0] <= now:
+                    # Lost copy
+                    deadlines.popleft()
+                if deadlines:
+                    # Sent back by cellaserv, already dispatched by
+                    # _on_local_publish()
+                    deadlines.popleft()
+                    if not deadlines:
+                        del self._local_echoes[key]
+                    return
+                del self._local_echoes[key]
+
+        super()._dispatch_publish(event, data)
+
+    def _expire_local_echoes(self, now):
+        """Forget the copies cellaserv did not send back in time."""
+        for key, deadlines in list(self._local_echoes.items()):
+            while deadlines and deadlines[0] <= now:
+                deadlines.popleft()
+            if not deadlines:
+                del self._local_echoes[key]
+        self._local_echoes_expired_at = now
+
+    def _on_local_publish(self, event, data, copies):
+        """
+        Dispatch an event published in this process, called by
+        ``cellaserv.local`` once for each of the ``copies`` cellaserv will
+        send.
+        """
+        now = time.monotonic()
+        if now - self._local_echoes_expired_at >= self.local_echo_timeout:
+            # Also forget the lost copies of events that are not published
+            # anymore
+            self._expire_local_echoes(now)
+        key = (event, data)
+        deadline = now + self.local_echo_timeout
+        self._local_echoes.setdefault(key, deque()).extend([deadline] * copies)
+        for _ in range(copies):
+            super()._dispatch_publish(event, data)
+
+    def _register_local(self):
+        """
+        Add the service to the registry of ``cellaserv.local``, once
+        cellaserv has processed the messages it sent so far.
+        """
+        def _on_reply(future):
+            if future.cancelled() or isinstance(future.exception(),
+                                                ConnectionError):
+                return
+            local.register(self)
+
+        # Any reply will do, it means the subscriptions and the registration
+        # of the service were processed before.
+        self.request('list-services', 'cellaserv').add_done_callback(
+            _on_reply)
 
     # Default actions
 
@@ -562,48 +1177,26 @@ class Service(AsynClient, metaclass=ServiceMeta):
         """
         Help about this service.
 
-        TODO: refactor all help functions, compute help dicts when creating the
-        class using metaprogramming.
+        The help of the actions and events is computed with the class, by
+        ``ServiceMeta``.
         """
         docs = {}
-        docs["doc"] = inspect.getdoc(self)
+        docs["doc"] = self._help_doc
         docs["actions"] = self.help_actions()
         docs["events"] = self.help_events()
         return docs
 
     help._actions = ['help']
 
-    def _get_help(self, methods) -> dict:
-        """
-        Helper function that create a dict with the signature and the
-        documentation of a mapping of methods.
-        """
-        docs = {}
-        for name, unbound_f in methods.items():
-            # Get the function from self to get a bound method in order to
-            # remove the first parameter (class name).
-            bound_f = unbound_f.__get__(self, type(self))
-            doc = inspect.getdoc(bound_f) or ""
-
-            # Get signature of this method, ie. how the use must call it
-            if sys.version_info.minor < 3:
-                sig = (name +
-                       inspect.formatargspec(*inspect.getfullargspec(bound_f)))
-            else:
-                sig = name + str(inspect.signature(bound_f))
-
-            docs[name] = {'doc': doc, 'sig': sig}
-        return docs
-
     def help_actions(self) -> dict:
         """List available actions for this service."""
-        return self._get_help(self._actions)
+        return self._help_actions
 
     help_actions._actions = ['help_actions']
 
     def help_events(self) -> dict:
         """List subscribed events of this service."""
-        return self._get_help(self._events)
+        return self._help_events
 
     help_events._actions = ['help_events']
 
@@ -624,6 +1217,61 @@ class Service(AsynClient, metaclass=ServiceMeta):
 
     stacktraces._actions = ['stacktraces']
 
+    def stats(self, reset=False) -> dict:
+        """
+        Return the calls, errors and latencies (in seconds) of the actions and
+        events of this service. If ``reset`` is true, reset them.
+        """
+        stats = self._metrics.snapshot()
+        stats['caches'] = {action: cache.stats()
+                           for action, cache in self._action_caches.items()}
+        if reset:
+            self._metrics.reset()
+        return stats
+
+    stats._actions = ['stats']
+
+    def invalidate_cache(self, action=None):
+        """
+        Invalidate the cached replies of ``action``, or of all the actions.
+
+        :raise ValueError: If ``action`` does not cache its replies.
+        """
+        if action is not None:
+            try:
+                cache = self._action_caches[action]
+            except KeyError:
+                raise ValueError(
+                    "action {0!r} has no cache".format(action)) from None
+            cache.clear()
+            return
+        for cache in self._action_caches.values():
+            cache.clear()
+
+    def _schedule_stats(self):
+        """Publish the next metrics report in ``stats_interval`` seconds."""
+        self._stats_deadline = self._loop.time() + self.stats_interval
+        self._stats_handle = self._loop.call_at(self._stats_deadline,
+                                                self._publish_stats)
+
+    def _publish_stats(self):
+        """Publish a report of the metrics on ``stats.<service_name>``."""
+        # The report is late by the time the loop spent on other callbacks
+        loop_lag = self._loop.time() - self._stats_deadline
+
+        report = self._stats_reporter.report()
+        report['service'] = self.service_name
+        report['identification'] = self.identification
+        report['queue_depth'] = self.write_queue_size()
+        report['loop_lag'] = loop_lag
+
+        event = 'stats.' + self.service_name
+        if self.identification:
+            event += '.' + self.identification
+        self.publish(event, **report)
+
+        self._schedule_stats()
+
     # Convenience methods
 
     def publish(self, event, *args, **kwargs):
@@ -647,12 +1295,11 @@ class Service(AsynClient, metaclass=ServiceMeta):
 
         if pub_data:
             try:
-                data = json.dumps(pub_data)
+                data = payload.JSON.encode(pub_data)
             except:
                 self.log_exc()
                 logging.error("Could not serialize publish data: %s", pub_data)
-                data = repr(pub_data)
-            data = data.encode()
+                data = repr(pub_data).encode()
         else:
             data = None
 
@@ -685,10 +1332,14 @@ class Service(AsynClient, metaclass=ServiceMeta):
         # Publish log message to cellaserv
         self.publish(event=log_name, **log_data)
 
-    def log_exc(self):
-        """Log the current exception."""
+    def log_exc(self, exc=None):
+        """Log the current exception, or the exception ``exc``."""
 
-        str_stack = ''.join(traceback.format_exc())
+        if exc is not None:
+            str_stack = ''.join(traceback.format_exception(
+                type(exc), exc, exc.__traceback__))
+        else:
+            str_stack = ''.join(traceback.format_exc())
         super().publish(event='log.coding-error', data=str_stack.encode())
 
     # Main setup of the service
@@ -700,10 +1351,30 @@ class Service(AsynClient, metaclass=ServiceMeta):
         """
 
         self._setup_synchronous()
+        self._setup_process_pool()
         self._setup_asynchronous()
 
         logger.info("[Dependencies] Service ready!")
 
+    def _setup_process_pool(self):
+        """
+        Start the processes running the actions declared with
+        ``executor='process'``, before the service registers, so that the
+        first calls do not wait for them.
+        """
+        functions = [self._actions[action]
+                     for action, options in self._action_options.items()
+                     if options['executor'] == 'process']
+        if not functions:
+            return
+
+        workers = self.process_workers or os.cpu_count() or 1
+        self._process_executor = ProcessPoolExecutor(workers)
+        # The pool starts a process for each task submitted while the others
+        # are busy
+        wait([self._process_executor.submit(_warm_up, functions)
+              for _ in range(workers)])
+
     def _setup_synchronous(self):
         """
         setup_synchronous manages the static initialization of the service.
@@ -715,7 +1386,10 @@ class Service(AsynClient, metaclass=ServiceMeta):
         - configuration variables should have the default value.
         """
 
-        # Reuse our socket to create a synchronous client
+        if not self._service_dependencies and not self._config_variables:
+            # Nothing to wait for, do not open a connection for nothing
+            return
+
         syn_client = SynClient()
 
         # Setup for ConfigVariable, get base value using the synchronous client
@@ -736,7 +1410,7 @@ class Service(AsynClient, metaclass=ServiceMeta):
                 # Send the request
                 data = syn_client.request('get', 'config', data=req_data_bytes)
                 # Data is json encoded
-                args = self._decode_data(data)
+                args = payload.JSON.decode(data)
                 logger.info("[ConfigVariable] %s.%s is %s", variable.section,
                             variable.option, args)
                 # we don't use update() because the context of the service is
@@ -788,7 +1462,7 @@ class Service(AsynClient, metaclass=ServiceMeta):
 
         # Get the list of already registered service.
         data = syn_client.request('list-services', 'cellaserv')
-        services_registered = self._decode_data(data)
+        services_registered = payload.JSON.decode(data)
 
         for service in services_registered:
             service_ident = (service['Name'], service['Identification'])
@@ -838,33 +1512,85 @@ class Service(AsynClient, metaclass=ServiceMeta):
         event loop, and have requests, events, etc. dispatched to it.
         """
 
-        def _event_wrap(fun):
-            """Convert event data (raw bytes) to arguments for methods."""
-            def _wrap(data=None):
-                """called by cellaserv.client.AsynClient"""
-                if data:
-                    kwargs = json.loads(data.decode())
-                else:
-                    kwargs = {}
+        def _event_wrap(event_name, fun):
+            """Call methods with the decoded event data as arguments."""
+            def _wrap(kwargs):
+                """called by cellaserv.client.AsyncioClient"""
                 logger.debug("Publish callback: %s(%s)", fun.__name__, kwargs)
 
+                begin = time.perf_counter()
                 try:
                     fun(**kwargs)
                 except:
+                    self._metrics.record_event(
+                        event_name, time.perf_counter() - begin, error=True)
                     self.log_exc()
+                else:
+                    self._metrics.record_event(
+                        event_name, time.perf_counter() - begin)
 
+            def _wrap_coroutine(kwargs):
+                """Run the coroutine method as a task."""
+                logger.debug("Publish callback: %s(%s)", fun.__name__, kwargs)
+
+                begin = time.perf_counter()
+                try:
+                    coroutine = fun(**kwargs)
+                except:
+                    self._metrics.record_event(
+                        event_name, time.perf_counter() - begin, error=True)
+                    self.log_exc()
+                    return
+
+                task = self._loop.create_task(coroutine)
+                self._tasks.add(task)
+                task.add_done_callback(
+                    partial(_on_coroutine_done, begin))
+
+            def _on_coroutine_done(begin, task):
+                self._tasks.discard(task)
+                if task.cancelled():
+                    return
+
+                elapsed = time.perf_counter() - begin
+                error = task.exception()
+                self._metrics.record_event(event_name, elapsed,
+                                           error=error is not None)
+                if error is not None:
+                    self.log_exc(error)
+
+            if inspect.iscoroutinefunction(fun):
+                return _wrap_coroutine
             return _wrap
 
         super().__init__(self._socket)
 
-        # Subsribe to all events
+        # Subsribe to all events, the data of an event is decoded once for all
+        # its callbacks.
         for event_name, callback in self._events.items():
             callback_bound = callback.__get__(self, type(self))
-            self.add_subscribe_cb(event_name, _event_wrap(callback_bound))
+            self.add_subscribe_cb(event_name,
+                                  _event_wrap(event_name, callback_bound),
+                                  decode=self._decode_event_data)
+
+        # Invalidate the caches of the actions on events
+        for action, cache in self._action_caches.items():
+            events = self._action_options[action]['cache_invalidate_on']
+            if isinstance(events, str):
+                events = [events]
+            for event_name in events:
+                self.add_subscribe_cb(event_name,
+                                      partial(_clear_cache, cache))
 
         # Register the service last
         self.register(self.service_name, self.identification)
 
+        if self.stats_interval:
+            self._loop.call_soon_threadsafe(self._schedule_stats)
+
+        if self.local_dispatch:
+            self._loop.call_soon_threadsafe(self._register_local)
+
         # Start threads
         for method in self._threads:
             method_bound = method.__get__(self, type(self))
@@ -881,8 +1607,11 @@ class Service(AsynClient, metaclass=ServiceMeta):
     @staticmethod
     def loop():
         """
-        loop() will start the asyncore engine therefore, if you have not
+        loop() will start the asyncio event loop therefore, if you have not
         started another thread, only callbacks (eg. actions, events) will be
-        called.
+        called. It returns when all the services have been disconnected from
+        cellaserv.
         """
-        asyncore.loop()
+        loop = get_event_loop()
+        if _connected_services[loop]:
+            loop.run_forever()
@@ -28,14 +28,39 @@ def make_logger(name):
 
 make_setting('HOST', 'evolutek.org', 'client', 'host', 'CS_HOST')
 make_setting('PORT', 4200, 'client', 'port', 'CS_PORT', int)
+make_setting('SOCKET', '', 'client', 'socket', 'CS_SOCKET')
 make_setting('DEBUG', 0, 'client', 'debug', 'CS_DEBUG', int)
+make_setting('FAST_CODEC', 0, 'client', 'fast_codec', 'CS_FAST_CODEC', int)
+make_setting('LOCAL_DISPATCH', 0, 'client', 'local_dispatch',
+             'CS_LOCAL_DISPATCH', int)
+make_setting('STATS_INTERVAL', 0, 'service', 'stats_interval',
+             'CS_STATS_INTERVAL', float)
 
 
 def get_socket():
-    """Open a socket to cellaserv using user configuration."""
+    """
+    Open a socket to cellaserv using user configuration.
+
+    If ``SOCKET`` is set, connect to this unix domain socket, which is faster
+    than TCP when cellaserv runs on the same machine. If that fails, connect
+    to ``HOST:PORT``.
+    """
+    if SOCKET and hasattr(socket, 'AF_UNIX'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(SOCKET)
+            return sock
+        except OSError as e:
+            sock.close()
+            logger.warning("Could not connect to %s (%s), using %s:%s",
+                           SOCKET, e, HOST, PORT)
+
     return socket.create_connection((HOST, PORT))
 
 logger = make_logger(__name__)
 logger.debug("DEBUG: %s", DEBUG)
 logger.debug("HOST: %s", HOST)
 logger.debug("PORT: %s", PORT)
+logger.debug("SOCKET: %s", SOCKET)
+logger.debug("FAST_CODEC: %s", FAST_CODEC)
+logger.debug("LOCAL_DISPATCH: %s", LOCAL_DISPATCH)
@@ -0,0 +1,428 @@
+"""
+Fake cellaserv broker, for tests and benchmarks that must run without the
+real cellaserv.
+
+``FakeBroker`` speaks the cellaserv protocol on localhost, and optionally on
+a unix domain socket. It runs its own asyncio event loop in a thread. It
+supports:
+
+- registering services, with identifications,
+- routing requests to services and forwarding their replies, with a
+  ``Timeout`` error if a service does not reply in time,
+- subscribing to events and to patterns of events, publishing events,
+- the ``list-services``, ``list-clients`` and ``list-events`` actions of the
+  ``cellaserv`` service, and the ``log.cellaserv.new-service`` event that
+  ``Service.require()`` relies on.
+
+Example::
+
+    >>> from cellaserv.testing import FakeBroker
+    >>> with FakeBroker() as broker, broker.settings():
+    ...     # Clients and services created here connect to the broker
+    ...     broker.serve(MyService)
+    ...     CellaservProxy().myservice.action()
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import count
+
+from cellaserv.protobuf.cellaserv_pb2 import (
+    Message,
+    Register,
+    Request,
+    Reply,
+    Publish,
+    Subscribe
+)
+
+import cellaserv.settings
+from cellaserv.framing import HEADER, FrameDecoder
+from cellaserv.patterns import PatternIndex, is_pattern
+
+logger = logging.getLogger(__name__)
+
+
+def _frame(msg_type, content):
+    """Serialize ``content`` in an envelope of type ``msg_type``."""
+    msg = Message(type=msg_type,
+                  content=content.SerializeToString()).SerializeToString()
+    return HEADER.pack(len(msg)) + msg
+
+
+class _Connection(asyncio.BufferedProtocol):
+    """Connection of a client to the broker."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.transport = None
+        self.name = None
+        self._decoder = FrameDecoder()
+
+    def __str__(self):
+        return self.name or '<not connected>'
+
+    def send(self, frame):
+        if self.transport is not None:
+            self.transport.write(frame)
+
+    # asyncio.Protocol methods
+
+    def connection_made(self, transport):
+        self.transport = transport
+        peer = transport.get_extra_info('peername')
+        if isinstance(peer, tuple):
+            self.name = '{0}:{1}'.format(*peer[:2])
+        else:
+            # Peers of unix sockets have no name
+            self.name = 'unix:{0}'.format(id(self))
+        self.broker._connections.add(self)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.broker._on_connection_lost(self)
+
+    def get_buffer(self, sizehint):
+        return self._decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self._decoder.buffer_updated(nbytes)
+        for frame in self._decoder.frames():
+            with frame:
+                msg = Message()
+                msg.ParseFromString(frame)
+            try:
+                self.broker._on_message(self, msg)
+            except Exception:
+                logger.error("[Broker] Error handling message from %s", self,
+                             exc_info=True)
+
+
+class FakeBroker:
+    """
+    Fake cellaserv broker, listening on localhost.
+
+    The broker can be used as a context manager, it is started when entering
+    the ``with`` block and stopped when leaving it.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, request_timeout=5.,
+                 path=None):
+        """
+        :param str host: Address to listen on.
+        :param int port: Port to listen on, 0 to pick a free port.
+        :param str path: If set, also listen on the unix socket ``path``.
+        :param float request_timeout: Seconds before the broker replies with
+            a ``Timeout`` error to requests the service did not answer.
+        """
+        self.host = host
+        self.port = port
+        self.request_timeout = request_timeout
+        self.path = path
+
+        self._loop = None
+        self._thread = None
+        self._servers = []
+        self._connections = set()
+
+        # map (name, identification) to the connection of the service
+        self._services = {}
+        # map event names to the connections subscribed to them
+        self._subscribers = defaultdict(list)
+        self._pattern_subscribers = PatternIndex()
+        # map the id of forwarded requests to (requester, original id,
+        # timeout handle)
+        self._pending = {}
+        self._request_ids = count(1)
+        # Notified when a service registers
+        self._registered = threading.Condition()
+
+    # Control
+
+    def start(self):
+        """Start the broker in a new thread, return when it is listening."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name='FakeBroker', daemon=True)
+        self._thread.start()
+
+        future = asyncio.run_coroutine_threadsafe(self._listen(), self._loop)
+        future.result()
+        return self
+
+    async def _listen(self):
+        server = await self._loop.create_server(
+            lambda: _Connection(self), self.host, self.port)
+        self.host, self.port = server.sockets[0].getsockname()[:2]
+        self._servers.append(server)
+
+        if self.path is not None:
+            self._servers.append(await self._loop.create_unix_server(
+                lambda: _Connection(self), self.path))
+
+    def stop(self):
+        """Close all the connections and stop the broker."""
+        if self._loop is None:
+            return
+
+        def _close():
+            for server in self._servers:
+                server.close()
+            for connection in list(self._connections):
+                if connection.transport is not None:
+                    connection.transport.close()
+
+        self._loop.call_soon_threadsafe(_close)
+        # Let the transports close before stopping the loop
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01),
+                                         self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._servers = []
+
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def address(self):
+        """``(host, port)`` of the broker."""
+        return (self.host, self.port)
+
+    @contextmanager
+    def settings(self):
+        """
+        Point ``cellaserv.settings`` to the broker in the ``with`` block, so
+        that clients and services connect to it by default, over its unix
+        socket if it has one.
+        """
+        settings = cellaserv.settings
+        previous = (settings.HOST, settings.PORT, settings.SOCKET)
+        settings.HOST, settings.PORT = self.host, self.port
+        settings.SOCKET = self.path or ''
+        try:
+            yield self
+        finally:
+            settings.HOST, settings.PORT, settings.SOCKET = previous
+
+    def services(self):
+        """Return the ``(name, identification)`` of the services."""
+        with self._registered:
+            return list(self._services)
+
+    def wait_for_service(self, name, identification='', timeout=5.):
+        """
+        Wait until the service ``name`` is registered.
+
+        :return: False if it is not registered after ``timeout`` seconds.
+        """
+        with self._registered:
+            return self._registered.wait_for(
+                lambda: (name, identification) in self._services, timeout)
+
+    def serve(self, service_factory, *args, **kwargs):
+        """
+        Create a service in a new thread, run the event loop of that thread,
+        and wait for the service to register.
+
+        :param service_factory: Called with ``args`` and ``kwargs`` to create
+            the service, usually a ``Service`` subclass.
+        :return: The service.
+        """
+        service = serve_in_thread(service_factory, *args, **kwargs)
+        if not self.wait_for_service(service.service_name,
+                                     service.identification or ''):
+            raise RuntimeError("{0} did not register".format(
+                service.service_name))
+        return service
+
+    # Messages
+
+    def _on_message(self, connection, msg):
+        if msg.type == Message.Register:
+            register = Register()
+            register.ParseFromString(msg.content)
+            self._on_register(connection, register)
+        elif msg.type == Message.Request:
+            request = Request()
+            request.ParseFromString(msg.content)
+            self._on_request(connection, request)
+        elif msg.type == Message.Reply:
+            reply = Reply()
+            reply.ParseFromString(msg.content)
+            self._on_reply(reply)
+        elif msg.type == Message.Subscribe:
+            subscribe = Subscribe()
+            subscribe.ParseFromString(msg.content)
+            self._on_subscribe(connection, subscribe)
+        elif msg.type == Message.Publish:
+            publish = Publish()
+            publish.ParseFromString(msg.content)
+            self._publish(publish)
+        else:
+            logger.warning("[Broker] Unknown message type: %s", msg.type)
+
+    def _on_register(self, connection, register):
+        key = (register.name, register.identification)
+        logger.debug("[Broker] New service: %s[%s]", *key)
+        # Like cellaserv, a new service replaces the previous one
+        with self._registered:
+            self._services[key] = connection
+            self._registered.notify_all()
+        self.publish('log.cellaserv.new-service',
+                     self._service_info(key, connection))
+
+    def _on_request(self, connection, request):
+        if request.service_name == 'cellaserv':
+            self._on_cellaserv_request(connection, request)
+            return
+
+        key = (request.service_name, request.service_identification)
+        service = self._services.get(key)
+        if service is None:
+            if any(name == request.service_name
+                   for name, _ in self._services):
+                error = Reply.Error.InvalidIdentification
+            else:
+                error = Reply.Error.NoSuchService
+            self._reply_error(connection, request.id, error)
+            return
+
+        # Give the request an id unique to the broker, the original id is
+        # restored in the reply
+        original_id = request.id
+        request.id = next(self._request_ids)
+        timeout = self._loop.call_later(self.request_timeout,
+                                        self._on_timeout, request.id)
+        self._pending[request.id] = (connection, original_id, timeout)
+        service.send(_frame(Message.Request, request))
+
+    def _on_reply(self, reply):
+        try:
+            requester, original_id, timeout = self._pending.pop(reply.id)
+        except KeyError:
+            logger.warning("[Broker] Dropping reply to unknown request #%s",
+                           reply.id)
+            return
+
+        timeout.cancel()
+        reply.id = original_id
+        requester.send(_frame(Message.Reply, reply))
+
+    def _on_timeout(self, request_id):
+        requester, original_id, _ = self._pending.pop(request_id)
+        self._reply_error(requester, original_id, Reply.Error.Timeout)
+
+    def _on_subscribe(self, connection, subscribe):
+        if is_pattern(subscribe.event):
+            self._pattern_subscribers.add(subscribe.event, connection)
+        else:
+            self._subscribers[subscribe.event].append(connection)
+
+    def _publish(self, publish):
+        frame = _frame(Message.Publish, publish)
+        for connection in self._subscribers.get(publish.event, ()):
+            connection.send(frame)
+        for connection in self._pattern_subscribers.match(publish.event):
+            connection.send(frame)
+
+    def _on_connection_lost(self, connection):
+        self._connections.discard(connection)
+
+        with self._registered:
+            for key, service in list(self._services.items()):
+                if service is connection:
+                    del self._services[key]
+
+        for event, connections in list(self._subscribers.items()):
+            connections[:] = [c for c in connections if c is not connection]
+            if not connections:
+                del self._subscribers[event]
+        for pattern, connections in self._pattern_subscribers.items():
+            for _ in range(connections.count(connection)):
+                self._pattern_subscribers.remove(pattern, connection)
+
+    # Helpers
+
+    def _reply_error(self, connection, request_id, error_type, what=None):
+        error = Reply.Error(type=error_type)
+        if what is not None:
+            error.what = what
+        connection.send(_frame(Message.Reply,
+                               Reply(id=request_id, error=error)))
+
+    @staticmethod
+    def _service_info(key, connection):
+        return {'Name': key[0], 'Identification': key[1],
+                'Client': str(connection)}
+
+    def publish(self, event, data):
+        """Publish ``event`` with ``data`` encoded in JSON, from the broker."""
+        self._publish(Publish(event=event, data=json.dumps(data).encode()))
+
+    # The cellaserv service
+
+    def _on_cellaserv_request(self, connection, request):
+        if request.method == 'list-services':
+            data = [self._service_info(key, service)
+                    for key, service in self._services.items()]
+        elif request.method == 'list-clients':
+            data = [{'Id': str(c), 'Name': str(c)} for c in self._connections]
+        elif request.method == 'list-events':
+            data = {event: [str(c) for c in connections]
+                    for event, connections in self._subscribers.items()}
+            for pattern, connections in self._pattern_subscribers.items():
+                data[pattern] = [str(c) for c in connections]
+        else:
+            self._reply_error(connection, request.id,
+                              Reply.Error.NoSuchMethod)
+            return
+
+        reply = Reply(id=request.id, data=json.dumps(data).encode())
+        connection.send(_frame(Message.Reply, reply))
+
+
+def serve_in_thread(service_factory, *args, **kwargs):
+    """
+    Create a service in a new thread, and run the event loop of that thread.
+
+    :param service_factory: Called with ``args`` and ``kwargs`` to create the
+        service, usually a ``Service`` subclass.
+    :return: The service. It may not be registered yet, see
+        ``FakeBroker.serve()``.
+    """
+    # Imported here, cellaserv.service is not needed by the broker
+    from cellaserv.service import Service
+
+    created = threading.Event()
+    result = {}
+
+    def _run():
+        try:
+            result['service'] = service_factory(*args, **kwargs)
+        except BaseException as e:
+            result['error'] = e
+            raise
+        finally:
+            created.set()
+        Service.loop()
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    created.wait()
+
+    if 'error' in result:
+        raise result['error']
+    return result['service']
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Compare the messages/s of the asyncore based AsynClient and the AsyncioClient.
+
+A thread feeds framed publish messages to the client through a socketpair, no
+cellaserv is needed. Inbound measures the dispatch of publishes to a
+subscriber, outbound measures the publishes sent by the client.
+"""
+
+import asyncio
+import socket
+import struct
+import sys
+import threading
+import time
+
+from cellaserv.client import AsyncioClient, get_event_loop
+from cellaserv.protobuf.cellaserv_pb2 import Message, Publish
+
+try:
+    import asyncore
+    from cellaserv.client import AsynClient
+except ImportError:
+    asyncore = None
+
+N = 100000
+
+
+def publish_frame(event, data):
+    content = Publish(event=event, data=data).SerializeToString()
+    msg = Message(type=Message.Publish, content=content).SerializeToString()
+    return struct.pack("!I", len(msg)) + msg
+
+
+def feed(sock, n):
+    """Send ``n`` publish messages on ``sock``."""
+    frame = publish_frame('bench', b'{"i": 42}')
+    sock.sendall(frame * n)
+
+
+def drain(sock, n):
+    """Read the ``n`` publish messages sent by the client."""
+    frame_len = len(publish_frame('bench', b'{"i": 42}'))
+    remaining = frame_len * n
+    while remaining > 0:
+        remaining -= len(sock.recv(1 << 16))
+
+
+def bench_asyncore_inbound(n):
+    client_sock, feeder_sock = socket.socketpair()
+    count = 0
+
+    def on_event(data):
+        nonlocal count
+        count += 1
+        if count == n:
+            client.close()
+
+    client = AsynClient(client_sock)
+    client.add_subscribe_cb('bench', on_event)
+
+    feeder = threading.Thread(target=feed, args=(feeder_sock, n))
+    begin = time.perf_counter()
+    feeder.start()
+    asyncore.loop(timeout=1)
+    end = time.perf_counter()
+    feeder.join()
+    feeder_sock.close()
+    return end - begin
+
+
+def bench_asyncio_inbound(n):
+    client_sock, feeder_sock = socket.socketpair()
+    loop = get_event_loop()
+    done = loop.create_future()
+    count = 0
+
+    def on_event(data):
+        nonlocal count
+        count += 1
+        if count == n:
+            done.set_result(None)
+
+    client = AsyncioClient(client_sock)
+    client.add_subscribe_cb('bench', on_event)
+
+    feeder = threading.Thread(target=feed, args=(feeder_sock, n))
+    begin = time.perf_counter()
+    feeder.start()
+    loop.run_until_complete(done)
+    end = time.perf_counter()
+    feeder.join()
+    client.close()
+    feeder_sock.close()
+    return end - begin
+
+
+def bench_asyncore_outbound(n):
+    client_sock, drain_sock = socket.socketpair()
+    client = AsynClient(client_sock)
+
+    drainer = threading.Thread(target=drain, args=(drain_sock, n))
+    drainer.start()
+    begin = time.perf_counter()
+    for _ in range(n):
+        client.publish('bench', b'{"i": 42}')
+    while client.producer_fifo:
+        asyncore.loop(timeout=1, count=1)
+    drainer.join()
+    end = time.perf_counter()
+    client.close()
+    drain_sock.close()
+    return end - begin
+
+
+def bench_asyncio_outbound(n):
+    client_sock, drain_sock = socket.socketpair()
+    loop = get_event_loop()
+    client = AsyncioClient(client_sock)
+
+    drainer = threading.Thread(target=drain, args=(drain_sock, n))
+    drainer.start()
+    begin = time.perf_counter()
+    for _ in range(n):
+        client.publish('bench', b'{"i": 42}')
+    loop.run_until_complete(loop.run_in_executor(None, drainer.join))
+    end = time.perf_counter()
+    client.close()
+    drain_sock.close()
+    return end - begin
+
+
+def report(name, n, elapsed):
+    print("{:<20} {:>10.0f} msg/s".format(name, n / elapsed))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+
+    if asyncore is not None:
+        report("asyncore inbound", n, bench_asyncore_inbound(n))
+    report("asyncio inbound", n, bench_asyncio_inbound(n))
+    if asyncore is not None:
+        report("asyncore outbound", n, bench_asyncore_outbound(n))
+    report("asyncio outbound", n, bench_asyncio_outbound(n))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Compare sending bursts of publishes one by one and in a batch.
+
+The publishes are sent by a SynClient through a socketpair, a thread reads
+them on the other side.
+"""
+
+import socket
+import sys
+import threading
+import time
+
+from cellaserv.client import SynClient
+
+N = 100000
+
+
+def drain(sock):
+    while sock.recv(1 << 16):
+        pass
+
+
+def send(n, batch_delay=None, batched=False):
+    client_sock, drain_sock = socket.socketpair()
+    drainer = threading.Thread(target=drain, args=(drain_sock,))
+    drainer.start()
+
+    client = SynClient(client_sock)
+    client.batch_delay = batch_delay
+
+    begin = time.perf_counter()
+    if batched:
+        with client.batch():
+            for _ in range(n):
+                client.publish('bench', b'{"i": 42}')
+    else:
+        for _ in range(n):
+            client.publish('bench', b'{"i": 42}')
+        client.flush()
+    end = time.perf_counter()
+
+    client_sock.close()
+    drainer.join()
+    drain_sock.close()
+    return end - begin
+
+
+def report(name, n, elapsed):
+    print("{:<20} {:>10.0f} msg/s".format(name, n / elapsed))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+
+    report("unbatched", n, send(n))
+    report("batch_delay=1ms", n, send(n, batch_delay=.001))
+    report("batch()", n, send(n, batched=True))
+
+if __name__ == "__main__":
+    main()
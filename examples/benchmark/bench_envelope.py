@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare encoding and decoding the cellaserv messages with the protobuf classes
+and with cellaserv.envelope.
+
+The protobuf timings include both the envelope and the inner message, and the
+frame header for encoding, like the clients do.
+"""
+
+import sys
+import timeit
+
+from cellaserv import envelope
+from cellaserv.framing import HEADER
+from cellaserv.protobuf.cellaserv_pb2 import Message, Request, Reply, Publish
+
+N = 100000
+
+
+def pb_request():
+    request = Request(service_name='date', method='time', id=123456789,
+                      data=b'{"tz": "Europe/Paris"}')
+    msg = Message(type=Message.Request,
+                  content=request.SerializeToString()).SerializeToString()
+    return HEADER.pack(len(msg)) + msg
+
+
+def pb_reply():
+    reply = Reply(id=123456789, data=b'{"time": 1234567890}')
+    msg = Message(type=Message.Reply,
+                  content=reply.SerializeToString()).SerializeToString()
+    return HEADER.pack(len(msg)) + msg
+
+
+def pb_publish():
+    publish = Publish(event='log.robot.position', data=b'{"x": 1, "y": 2}')
+    msg = Message(type=Message.Publish,
+                  content=publish.SerializeToString()).SerializeToString()
+    return HEADER.pack(len(msg)) + msg
+
+
+def fast_request():
+    return envelope.encode_request(123456789, 'date', 'time', None,
+                                   b'{"tz": "Europe/Paris"}')
+
+
+def fast_reply():
+    return envelope.encode_reply(123456789, b'{"time": 1234567890}')
+
+
+def fast_publish():
+    return envelope.encode_publish('log.robot.position', b'{"x": 1, "y": 2}')
+
+
+PB_CLASSES = {
+    Message.Request: Request,
+    Message.Reply: Reply,
+    Message.Publish: Publish,
+}
+
+
+def pb_decode(frame):
+    msg = Message()
+    msg.ParseFromString(frame)
+    content = PB_CLASSES[msg.type]()
+    content.ParseFromString(msg.content)
+    return content
+
+
+def report(name, n, pb_time, fast_time):
+    print("{:<16} {:>8.2f} us {:>8.2f} us {:>6.2f}x".format(
+        name, pb_time / n * 1e6, fast_time / n * 1e6, pb_time / fast_time))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+
+    print("{:<16} {:>11} {:>11}".format("", "protobuf", "envelope"))
+    for name, pb, fast in [("encode request", pb_request, fast_request),
+                           ("encode reply", pb_reply, fast_reply),
+                           ("encode publish", pb_publish, fast_publish)]:
+        assert pb() == fast(), name
+        report(name, n, timeit.timeit(pb, number=n),
+               timeit.timeit(fast, number=n))
+
+    for name, encode in [("decode request", fast_request),
+                         ("decode reply", fast_reply),
+                         ("decode publish", fast_publish)]:
+        frame = memoryview(encode())[HEADER.size:]
+        report(name, n,
+               timeit.timeit(lambda: pb_decode(frame), number=n),
+               timeit.timeit(lambda: envelope.decode(frame), number=n))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the decoding of length-prefixed frames.
+
+Compare the read loop SynClient used before FrameDecoder (recv of the header,
+then concatenation of the body) with cellaserv.framing.FrameDecoder, for
+frames of 100 B, 64 KiB and 4 MiB sent through a socketpair.
+"""
+
+import socket
+import struct
+import threading
+import time
+
+from cellaserv.framing import FrameDecoder
+
+# (frame size, number of frames)
+CASES = [
+    (100, 200000),
+    (64 * 1024, 2000),
+    (4 * 1024 * 1024, 50),
+]
+
+
+def feed(sock, size, count):
+    frame = struct.pack("!I", size) + b"x" * size
+    for _ in range(count):
+        sock.sendall(frame)
+
+
+def read_legacy(sock, count):
+    for _ in range(count):
+        hdr = sock.recv(4)
+        msg_len = struct.unpack("!I", hdr)[0]
+        msg = b""
+        while msg_len != 0:
+            buf = sock.recv(msg_len)
+            msg_len -= len(buf)
+            msg += buf
+
+
+def read_decoder(sock, count):
+    decoder = FrameDecoder()
+    while count:
+        decoder.recv_into(sock)
+        for frame in decoder.frames():
+            count -= 1
+
+
+def run(reader, size, count):
+    reader_sock, feeder_sock = socket.socketpair()
+    feeder = threading.Thread(target=feed, args=(feeder_sock, size, count))
+    begin = time.perf_counter()
+    feeder.start()
+    reader(reader_sock, count)
+    end = time.perf_counter()
+    feeder.join()
+    reader_sock.close()
+    feeder_sock.close()
+    return end - begin
+
+
+def main():
+    for size, count in CASES:
+        for name, reader in [("legacy", read_legacy),
+                             ("decoder", read_decoder)]:
+            elapsed = run(reader, size, count)
+            print("{:>8} B {:<8} {:>10.0f} frames/s {:>8.0f} MiB/s".format(
+                size, name, count / elapsed,
+                size * count / elapsed / (1 << 20)))
+
+if __name__ == "__main__":
+    main()
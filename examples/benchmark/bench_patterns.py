@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare the dispatch of events to pattern subscriptions with fnmatch over all
+the patterns and with cellaserv.patterns.PatternIndex.
+
+1000 patterns, 100000 events drawn from 5000 event names.
+"""
+
+import fnmatch
+import random
+import time
+
+from cellaserv.patterns import PatternIndex
+
+PATTERNS = 1000
+EVENTS = 100000
+EVENT_NAMES = 5000
+
+
+def make_patterns():
+    patterns = []
+    for i in range(PATTERNS):
+        kind = i % 4
+        if kind == 0:
+            patterns.append('log.service{}.*'.format(i))
+        elif kind == 1:
+            patterns.append('sensor.{}.?'.format(i))
+        elif kind == 2:
+            patterns.append('config.section{}.option{}'.format(i, i))
+        else:
+            patterns.append('robot{}.*.done'.format(i))
+    return patterns
+
+
+def make_events(rand):
+    names = []
+    for _ in range(EVENT_NAMES):
+        i = rand.randrange(PATTERNS * 2)
+        kind = i % 4
+        if kind == 0:
+            names.append('log.service{}.{}'.format(i, rand.choice('abc')))
+        elif kind == 1:
+            names.append('sensor.{}.{}'.format(i, rand.choice('xyz')))
+        elif kind == 2:
+            names.append('config.section{}.option{}'.format(i, i))
+        else:
+            names.append('robot{}.arm.done'.format(i))
+    return [rand.choice(names) for _ in range(EVENTS)]
+
+
+def dispatch_fnmatch(patterns, events):
+    matched = 0
+    for event in events:
+        for pattern in patterns:
+            if fnmatch.fnmatch(event, pattern):
+                matched += 1
+    return matched
+
+
+def dispatch_index(index, events):
+    matched = 0
+    for event in events:
+        matched += len(index.match(event))
+    return matched
+
+
+def main():
+    rand = random.Random(42)
+    patterns = make_patterns()
+    events = make_events(rand)
+
+    cached = PatternIndex(cache_size=EVENT_NAMES)
+    uncached = PatternIndex(cache_size=0)
+    for pattern in patterns:
+        cached.add(pattern, pattern)
+        uncached.add(pattern, pattern)
+
+    results = []
+    for name, dispatch, arg in [("fnmatch", dispatch_fnmatch, patterns),
+                                ("index, no cache", dispatch_index, uncached),
+                                ("index, cache", dispatch_index, cached)]:
+        begin = time.perf_counter()
+        results.append(dispatch(arg, events))
+        end = time.perf_counter()
+        print("{:<16} {:>10.0f} events/s".format(name,
+                                                   EVENTS / (end - begin)))
+
+    assert len(set(results)) == 1, "Implementations disagree"
+
+if __name__ == "__main__":
+    main()
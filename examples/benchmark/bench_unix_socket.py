@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare the latency of requests over TCP loopback and over a unix domain
+socket.
+
+A fake broker and an echo service run in another process. Requests are sent
+one at a time by a SynClient, the service and the client use the same
+transport.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import cellaserv.settings
+from cellaserv.client import SynClient
+from cellaserv.metrics import Histogram
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+from cellaserv.testing import FakeBroker
+
+N = 20000
+
+
+class Echo(Service):
+
+    @Service.action
+    def echo(self, x):
+        return x
+
+
+def measure(n):
+    client = SynClient(get_socket())
+    latency = Histogram()
+    for _ in range(n):
+        begin = time.perf_counter()
+        client.request('echo', 'echo', data=b'[42]')
+        latency.record(time.perf_counter() - begin)
+    client.close()
+    return latency
+
+
+def serve(path, address, stop):
+    with FakeBroker(path=path) as broker, broker.settings():
+        broker.serve(Echo)
+        address.send(broker.address)
+        stop.recv()
+
+
+def run(name, n, path=None):
+    address, child_address = multiprocessing.Pipe()
+    stop, child_stop = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve,
+                                     args=(path, child_address, child_stop))
+    server.start()
+
+    settings = cellaserv.settings
+    settings.HOST, settings.PORT = address.recv()
+    settings.SOCKET = path or ''
+    # Warm up
+    measure(n // 10)
+    latency = measure(n)
+
+    stop.send(None)
+    server.join()
+
+    print("{:<6} mean {:>7.1f} us  p50 {:>7.1f} us  p99 {:>7.1f} us  "
+          "{:>7.0f} req/s".format(
+              name, latency.total / latency.count * 1e6,
+              latency.percentile(50) * 1e6, latency.percentile(99) * 1e6,
+              latency.count / latency.total))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+
+    run("tcp", n)
+    with tempfile.TemporaryDirectory() as directory:
+        run("unix", n, path=os.path.join(directory, 'cellaserv.sock'))
+
+if __name__ == "__main__":
+    main()
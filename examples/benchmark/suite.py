@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the client hot paths.
+
+The benchmarks run without cellaserv and without network: messages are read
+from and written to memory. Results can be saved as JSON and compared with a
+previous run::
+
+    $ python3 examples/benchmark/suite.py -o before.json
+    $ # ... change the code ...
+    $ python3 examples/benchmark/suite.py -o after.json --compare before.json
+
+Use ``-k`` to only run the benchmarks whose name contains a string.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from cellaserv import envelope
+from cellaserv.client import AsyncioClient, SynClient
+from cellaserv.framing import HEADER, FrameDecoder
+from cellaserv.patterns import PatternIndex
+from cellaserv.protobuf.cellaserv_pb2 import Message, Request, Reply, Publish
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+
+# Benchmarks, by name
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Register a benchmark. The decorated function does the setup, and returns
+    the function to time and the number of operations of each call.
+    """
+    def _register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return _register
+
+
+def frame(msg_type, content):
+    msg = Message(type=msg_type,
+                  content=content.SerializeToString()).SerializeToString()
+    return HEADER.pack(len(msg)) + msg
+
+
+class MemorySocket:
+    """
+    Socket reading from memory. Requests written to it are answered with
+    ``reply_data``, other messages are dropped.
+    """
+
+    def __init__(self, incoming=b'', repeat=False, reply_data=None):
+        self._incoming = bytearray(incoming)
+        self._repeat = incoming if repeat else None
+        self._reply_data = reply_data
+        self._timeout = None
+
+    def recv_into(self, buffer):
+        if not self._incoming and self._repeat:
+            self._incoming += self._repeat
+        size = min(len(buffer), len(self._incoming))
+        buffer[:size] = self._incoming[:size]
+        del self._incoming[:size]
+        return size
+
+    def send(self, data):
+        if self._reply_data is None:
+            return len(data)
+        decoder = FrameDecoder()
+        view = decoder.get_buffer(len(data))
+        view[:len(data)] = data
+        decoder.buffer_updated(len(data))
+        for f in decoder.frames():
+            msg = Message()
+            msg.ParseFromString(f)
+            if msg.type == Message.Request:
+                request = Request()
+                request.ParseFromString(msg.content)
+                self._incoming += frame(
+                    Message.Reply, Reply(id=request.id, data=self._reply_data))
+        return len(data)
+
+    def gettimeout(self):
+        return self._timeout
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def close(self):
+        pass
+
+
+def discard_writes(client):
+    """Make ``client`` drop the messages it sends."""
+    client.batch_delay = None
+    client._write = lambda data: None
+    return client
+
+# Framing
+
+
+@benchmark('framing.decoder')
+def bench_framing_decoder():
+    """Split 64 frames of 100 bytes."""
+    data = frame(Message.Publish, Publish(event='bench', data=b'x' * 80)) * 64
+    decoder = FrameDecoder()
+
+    def run():
+        view = decoder.get_buffer(len(data))
+        view[:len(data)] = data
+        decoder.buffer_updated(len(data))
+        for f in decoder.frames():
+            pass
+    return run, 64
+
+
+@benchmark('framing.synclient_read_message')
+def bench_framing_read_message():
+    """SynClient.read_message() of small publish messages."""
+    data = frame(Message.Publish, Publish(event='bench', data=b'x' * 80))
+    client = SynClient(MemorySocket(data * 64, repeat=True))
+
+    def run():
+        for _ in range(64):
+            client.read_message()
+    return run, 64
+
+
+@benchmark('framing.asyncio_buffer_updated')
+def bench_framing_asyncio():
+    """Read 64 publish messages with AsyncioClient, without callbacks."""
+    data = frame(Message.Publish, Publish(event='bench', data=b'x' * 80)) * 64
+    client = new_asyncio_client()
+
+    def run():
+        view = client.get_buffer(len(data))
+        view[:len(data)] = data
+        client.buffer_updated(len(data))
+    return run, 64
+
+# Envelope
+
+
+def _encode_request_pb():
+    request = Request(service_name='date', method='time', id=123456789,
+                      data=b'{"tz": "Europe/Paris"}')
+    return frame(Message.Request, request)
+
+
+def _encode_request_envelope():
+    return envelope.encode_request(123456789, 'date', 'time', None,
+                                   b'{"tz": "Europe/Paris"}')
+
+
+@benchmark('envelope.encode_request.protobuf')
+def bench_encode_pb():
+    return _encode_request_pb, 1
+
+
+@benchmark('envelope.encode_request.envelope')
+def bench_encode_envelope():
+    return _encode_request_envelope, 1
+
+
+@benchmark('envelope.decode_request.protobuf')
+def bench_decode_pb():
+    data = memoryview(_encode_request_pb())[HEADER.size:]
+
+    def run():
+        msg = Message()
+        msg.ParseFromString(data)
+        request = Request()
+        request.ParseFromString(msg.content)
+    return run, 1
+
+
+@benchmark('envelope.decode_request.envelope')
+def bench_decode_envelope():
+    data = memoryview(_encode_request_pb())[HEADER.size:]
+    return (lambda: envelope.decode(data)), 1
+
+# Service
+
+
+class BenchService(Service):
+
+    def _setup_synchronous(self):
+        # Nothing to wait for, and no cellaserv to connect to
+        pass
+
+    @Service.action
+    def echo(self, x):
+        return x
+
+    @Service.action
+    def add(self, a, b):
+        return a + b
+
+    @Service.action(cache_size=16)
+    def lookup(self, a, b):
+        return {'sum': a + b, 'table': list(range(32))}
+
+
+def new_asyncio_client(cls=AsyncioClient):
+    sock, _ = socket.socketpair()
+    # Keep the other end open as long as the client
+    client = cls(sock=sock)
+    client._bench_peer = _
+    return discard_writes(client)
+
+
+def _request(method, data):
+    return Request(service_name='benchservice', method=method, id=42,
+                   data=data)
+
+
+@benchmark('service.on_request.args')
+def bench_on_request_args():
+    """Dispatch a request with positional arguments."""
+    service = new_asyncio_client(BenchService)
+    request = _request('echo', b'[{"x": 1, "y": [1, 2, 3]}]')
+    return (lambda: service.on_request(request)), 1
+
+
+@benchmark('service.on_request.kwargs')
+def bench_on_request_kwargs():
+    """Dispatch a request with keyword arguments."""
+    service = new_asyncio_client(BenchService)
+    request = _request('add', b'{"a": 1, "b": 2}')
+    return (lambda: service.on_request(request)), 1
+
+
+@benchmark('service.on_request.frame')
+def bench_on_request_frame():
+    """Parse and dispatch a request frame."""
+    service = new_asyncio_client(BenchService)
+    data = memoryview(frame(Message.Request,
+                            _request('add', b'{"a": 1, "b": 2}')))
+    data = data[HEADER.size:]
+    return (lambda: service._on_frame(data)), 1
+
+
+@benchmark('service.on_request.cache_miss')
+def bench_on_request_cache_miss():
+    """Dispatch a request to an action whose cache is always invalidated."""
+    service = new_asyncio_client(BenchService)
+    request = _request('lookup', b'{"a": 1, "b": 2}')
+
+    def run():
+        service.invalidate_cache()
+        service.on_request(request)
+    return run, 1
+
+
+@benchmark('service.on_request.cache_hit')
+def bench_on_request_cache_hit():
+    """Dispatch a request answered from the cache of the action."""
+    service = new_asyncio_client(BenchService)
+    request = _request('lookup', b'{"a": 1, "b": 2}')
+    return (lambda: service.on_request(request)), 1
+
+# Publish
+
+
+def _bench_fan_out(callbacks):
+    client = new_asyncio_client()
+    for _ in range(callbacks):
+        client.add_subscribe_cb('bench', lambda data: None, decode=json.loads)
+    data = memoryview(frame(Message.Publish,
+                            Publish(event='bench', data=b'{"i": 42}')))
+    data = data[HEADER.size:]
+    return (lambda: client._on_frame(data)), 1
+
+
+@benchmark('publish.fan_out.1')
+def bench_fan_out_1():
+    return _bench_fan_out(1)
+
+
+@benchmark('publish.fan_out.10')
+def bench_fan_out_10():
+    return _bench_fan_out(10)
+
+
+@benchmark('publish.fan_out.100')
+def bench_fan_out_100():
+    return _bench_fan_out(100)
+
+# Patterns
+
+
+def _bench_patterns(cache_size):
+    index = PatternIndex(cache_size=cache_size)
+    for i in range(1000):
+        index.add('log.service{}.*'.format(i), i)
+    events = ['log.service{}.info'.format(i) for i in range(0, 2000, 7)]
+
+    def run():
+        for event in events:
+            index.match(event)
+    return run, len(events)
+
+
+@benchmark('patterns.match.1000_patterns')
+def bench_patterns_uncached():
+    return _bench_patterns(0)
+
+
+@benchmark('patterns.match.1000_patterns.cached')
+def bench_patterns_cached():
+    return _bench_patterns(1024)
+
+# Proxy
+
+
+@benchmark('proxy.call')
+def bench_proxy_call():
+    """CellaservProxy call, through a SynClient answering from memory."""
+    client = SynClient(MemorySocket(reply_data=b'{"time": 1234}'))
+    proxy = CellaservProxy(client=client)
+
+    def run():
+        proxy.date.time(tz='Europe/Paris')
+    return run, 1
+
+
+@benchmark('proxy.call.cached')
+def bench_proxy_call_cached():
+    """The same call, answered from the reply cache of the proxy."""
+    client = SynClient(MemorySocket(reply_data=b'{"time": 1234}'))
+    proxy = CellaservProxy(client=client, cache={'date.time': {}})
+
+    def run():
+        proxy.date.time(tz='Europe/Paris')
+    return run, 1
+
+
+@benchmark('proxy.call.synclient_request')
+def bench_synclient_request():
+    """The same request with SynClient.request, without the proxy."""
+    client = SynClient(MemorySocket(reply_data=b'{"time": 1234}'))
+
+    def run():
+        client.request('time', 'date', data=b'{"tz": "Europe/Paris"}')
+    return run, 1
+
+# Runner
+
+
+def measure(run, ops, repeat, min_time):
+    """
+    Time ``run``, return the time of an operation in seconds for each repeat.
+    """
+    # Calibrate the number of calls so that each repeat lasts min_time
+    number = 1
+    while True:
+        begin = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - begin
+        if elapsed >= min_time / 5:
+            break
+        number *= 2
+    number = max(1, int(number * min_time / elapsed))
+
+    results = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        for _ in range(number):
+            run()
+        results.append((time.perf_counter() - begin) / (number * ops))
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    try:
+        from google.protobuf.internal import api_implementation
+        protobuf = api_implementation.Type()
+    except ImportError:
+        protobuf = None
+
+    return {
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'protobuf': protobuf,
+        'commit': commit,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', dest='filter', default='',
+                        help="only run benchmarks whose name contains FILTER")
+    parser.add_argument('-o', '--output', help="save the results as JSON")
+    parser.add_argument('--compare', help="compare with previous results")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=.2,
+                        help="minimum duration of a repeat, in seconds")
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        if name.endswith('.envelope') and not envelope.AVAILABLE:
+            continue
+
+        run, ops = setup()
+        times = measure(run, ops, args.repeat, args.min_time)
+        best = min(times)
+        results[name] = {
+            'best': best,
+            'median': statistics.median(times),
+            'ops_per_sec': 1 / best,
+            'times': times,
+        }
+
+        line = "{:<40} {:>10.3f} us {:>12.0f} ops/s".format(
+            name, best * 1e6, 1 / best)
+        if name in previous:
+            line += "  {:>6.2f}x".format(previous[name]['best'] / best)
+        print(line)
+        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f,
+                      indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Sample client, pipelined time requests to the date service through cellaserv.
+
+Same load as date_benchmark.py, but all the requests share one connection
+with up to ``WINDOW`` requests in flight instead of a pool of processes.
+"""
+
+import time
+from collections import deque
+
+from cellaserv.client import SynClient
+from cellaserv.settings import get_socket
+
+REQUESTS = 500
+WINDOW = 20
+
+
+def main():
+    with get_socket() as sock:
+        client = SynClient(sock, pipelined=True)
+        in_flight = deque()
+        begin = time.perf_counter()
+        for _ in range(REQUESTS):
+            if len(in_flight) == WINDOW:
+                in_flight.popleft().result()
+            in_flight.append(client.request_async('time', 'date'))
+        for future in in_flight:
+            future.result()
+        end = time.perf_counter()
+        print((end - begin) * 1000)
+
+if __name__ == "__main__":
+    main()
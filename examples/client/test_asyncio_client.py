@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.client import AsyncioClient, NoSuchService
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+
+
+class Timer(Service):
+
+    @Service.action
+    def echo(self, x):
+        return x
+
+    @Service.action
+    async def wait(self, duration):
+        await asyncio.sleep(duration)
+
+
+# Timeout of the broker, see examples/conftest.py
+request_timeout = 5
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    broker.serve(Timer)
+    yield
+    # Let the service finish the actions whose requester is gone
+    time.sleep(.3)
+
+
+def setup_function(function):
+    function.loop = asyncio.new_event_loop()
+
+
+def teardown_function(function):
+    function.loop.close()
+
+
+def test_request():
+    loop = test_request.loop
+    client = AsyncioClient(loop=loop)
+
+    async def main():
+        assert await client.request('echo', 'timer', data=b'[1]') == b'1'
+        with raises(NoSuchService):
+            await client.request('echo', 'nothing')
+
+    loop.run_until_complete(main())
+    client.close()
+
+
+def test_writes_before_connect():
+    loop = test_writes_before_connect.loop
+
+    async def main():
+        # Created in the loop, the client connects in a task
+        client = AsyncioClient(loop=loop)
+        future = client.request('echo', 'timer', data=b'[2]')
+        client.flush()
+        assert client._transport is None
+        assert client.write_queue_size() > 0
+
+        # The request is sent once connected
+        assert await future == b'2'
+        assert client.write_queue_size() == 0
+        client.close()
+
+    loop.run_until_complete(main())
+
+
+def test_take_over():
+    loop = test_take_over.loop
+    sock = get_socket()
+    first = AsyncioClient(sock=sock, loop=loop)
+    pending = first.request('wait', 'timer', data=b'[0.2]')
+
+    # A client created on the same socket takes over its transport, the
+    # requests of the previous client are failed
+    second = AsyncioClient(sock=sock, loop=loop)
+    assert second._transport is not None
+    assert first._transport is None
+    with raises(ConnectionError):
+        loop.run_until_complete(pending)
+
+    assert loop.run_until_complete(
+        second.request('echo', 'timer', data=b'[3]')) == b'3'
+    second.close()
+
+
+def test_connection_lost():
+    loop = test_connection_lost.loop
+    client = AsyncioClient(loop=loop)
+    futures = [client.request('wait', 'timer', data=b'[0.2]')
+               for _ in range(3)]
+    client.flush()
+
+    async def close():
+        await asyncio.sleep(.05)
+        client.close()
+
+    loop.run_until_complete(close())
+    for future in futures:
+        with raises(ConnectionError):
+            loop.run_until_complete(future)
+    assert not client._reply_futures
@@ -0,0 +1,101 @@
+import select
+import socket
+import threading
+import time
+
+from cellaserv.client import SynClient
+from cellaserv.framing import FrameDecoder
+from cellaserv.protobuf.cellaserv_pb2 import Message, Publish
+
+
+def setup_function(function):
+    function.sock, function.peer = socket.socketpair()
+    function.client = SynClient(function.sock)
+    function.decoder = FrameDecoder()
+
+
+def teardown_function(function):
+    function.sock.close()
+    function.peer.close()
+
+
+def received(sock):
+    """Return True if there is data to read on ``sock``."""
+    return bool(select.select([sock], [], [], 0)[0])
+
+
+def read_events(sock, decoder, count):
+    """Read ``count`` publish messages, return their events."""
+    sock.settimeout(1)
+    events = []
+    while len(events) < count:
+        frame = decoder.next_frame()
+        if frame is None:
+            assert decoder.recv_into(sock)
+            continue
+        with frame:
+            message = Message()
+            message.ParseFromString(frame)
+        publish = Publish()
+        publish.ParseFromString(message.content)
+        events.append(publish.event)
+    return events
+
+
+def test_mixed():
+    client, peer = test_mixed.client, test_mixed.peer
+    with client.batch():
+        client.publish('a')
+        # Unbatched messages of other threads are sent after the batched ones
+        thread = threading.Thread(target=client.publish, args=('b',))
+        thread.start()
+        thread.join()
+        client.publish('c')
+        assert read_events(peer, test_mixed.decoder, 2) == ['a', 'b']
+        assert not received(peer)
+    assert read_events(peer, test_mixed.decoder, 1) == ['c']
+
+
+def test_batch_size():
+    client, peer = test_batch_size.client, test_batch_size.peer
+    client.batch_size = 100
+    with client.batch():
+        client.publish('a', b'x' * 40)
+        assert not received(peer)
+        client.publish('b', b'x' * 40)
+        # Flushed when the batch reached batch_size
+        assert read_events(peer, test_batch_size.decoder, 2) == ['a', 'b']
+        client.publish('c')
+        assert not received(peer)
+    assert read_events(peer, test_batch_size.decoder, 1) == ['c']
+
+
+def test_batch_delay():
+    client, peer = test_batch_delay.client, test_batch_delay.peer
+    client.batch_delay = .05
+    client.publish('a')
+    client.publish('b')
+    assert not received(peer)
+    time.sleep(.2)
+    assert read_events(peer, test_batch_delay.decoder, 2) == ['a', 'b']
+    assert client._flush_timer is None
+
+
+def test_nested():
+    client, peer = test_nested.client, test_nested.peer
+    with client.batch():
+        with client.batch():
+            client.publish('a')
+        assert not received(peer)
+        client.publish('b')
+    assert read_events(peer, test_nested.decoder, 2) == ['a', 'b']
+
+
+def test_close():
+    client, peer = test_close.client, test_close.peer
+    client.batch_delay = 10
+    client.publish('a')
+    assert not received(peer)
+    client.close()
+    assert read_events(peer, test_close.decoder, 1) == ['a']
+    assert client._flush_timer is None
@@ -0,0 +1,102 @@
+from cellaserv import envelope
+from cellaserv.framing import HEADER
+from cellaserv.protobuf.cellaserv_pb2 import (
+    Message,
+    Register,
+    Request,
+    Reply,
+    Publish,
+    Subscribe
+)
+
+IDS = [0, 1, 127, 128, 4095, 4096, 2**32, 2**64 - 1]
+
+
+def frame(msg_type, content):
+    msg = Message(type=msg_type,
+                  content=content.SerializeToString()).SerializeToString()
+    return HEADER.pack(len(msg)) + msg
+
+
+def test_available():
+    assert envelope.AVAILABLE
+
+
+def test_request():
+    for req_id in IDS:
+        for identification in (None, "", "left"):
+            for data in (None, b"", b"x" * 300):
+                request = Request(service_name="date", method="time",
+                                  id=req_id)
+                if identification:
+                    request.service_identification = identification
+                if data:
+                    request.data = data
+
+                encoded = envelope.encode_request(req_id, "date", "time",
+                                                  identification, data)
+                assert encoded == frame(Message.Request, request)
+
+                msg_type, decoded = envelope.decode(memoryview(encoded)[4:])
+                assert msg_type == Message.Request
+                assert decoded.to_protobuf() == request
+                assert (decoded.HasField('service_identification')
+                        == bool(identification))
+
+
+def test_reply():
+    for req_id in IDS:
+        for data in (None, b"42"):
+            reply = Reply(id=req_id)
+            if data:
+                reply.data = data
+            assert envelope.encode_reply(req_id, data) == frame(Message.Reply,
+                                                                reply)
+
+            reply.error.type = Reply.Error.BadArguments
+            encoded = envelope.encode_reply(req_id, data,
+                                            Reply.Error.BadArguments)
+            assert encoded == frame(Message.Reply, reply)
+
+            reply.error.what = "bad"
+            encoded = envelope.encode_reply(req_id, data,
+                                            Reply.Error.BadArguments, "bad")
+            assert encoded == frame(Message.Reply, reply)
+
+            msg_type, decoded = envelope.decode(encoded[4:])
+            assert msg_type == Message.Reply
+            assert decoded.HasField('error')
+            assert decoded.error.type == Reply.Error.BadArguments
+            assert decoded.error.what == "bad"
+            assert decoded.to_protobuf() == reply
+
+
+def test_publish_subscribe_register():
+    assert (envelope.encode_publish("log.robot", b'{"a": 1}')
+            == frame(Message.Publish, Publish(event="log.robot",
+                                              data=b'{"a": 1}')))
+    assert (envelope.encode_publish("tick")
+            == frame(Message.Publish, Publish(event="tick")))
+    assert (envelope.encode_subscribe("log.*")
+            == frame(Message.Subscribe, Subscribe(event="log.*")))
+    assert (envelope.encode_register("date", "paris")
+            == frame(Message.Register, Register(name="date",
+                                                identification="paris")))
+
+    msg_type, decoded = envelope.decode(
+        frame(Message.Publish, Publish(event="tick"))[4:])
+    assert msg_type == Message.Publish
+    assert decoded.event == "tick"
+    assert not decoded.HasField('data')
+    assert decoded.data == b""
+
+
+def test_decode_view():
+    buffer = bytearray(envelope.encode_publish("tick", b"42"))
+    with memoryview(buffer) as view:
+        msg_type, decoded = envelope.decode(view[4:])
+    # The data does not reference the buffer, that can be reused
+    buffer[:] = bytes(len(buffer))
+    assert decoded.event == "tick"
+    assert decoded.data == b"42"
+    assert type(decoded.data) is bytes
@@ -0,0 +1,65 @@
+import socket
+import struct
+import threading
+
+from cellaserv.framing import FrameDecoder
+
+
+def frame(payload):
+    return struct.pack("!I", len(payload)) + payload
+
+
+def feed(decoder, data):
+    view = decoder.get_buffer(len(data))
+    view[:len(data)] = data
+    decoder.buffer_updated(len(data))
+
+
+def test_multiple_frames_in_one_read():
+    decoder = FrameDecoder()
+    feed(decoder, frame(b"a") + frame(b"") + frame(b"bc"))
+
+    assert [bytes(f) for f in decoder.frames()] == [b"a", b"", b"bc"]
+    assert len(decoder) == 0
+
+
+def test_partial_frame():
+    decoder = FrameDecoder()
+    data = frame(b"hello") + frame(b"world")
+
+    feed(decoder, data[:3])
+    assert decoder.next_frame() is None
+    feed(decoder, data[3:12])
+    assert [bytes(f) for f in decoder.frames()] == [b"hello"]
+    feed(decoder, data[12:])
+    assert [bytes(f) for f in decoder.frames()] == [b"world"]
+
+
+def test_grow():
+    decoder = FrameDecoder(size=16, min_free=4)
+    payload = bytes(range(256)) * 64
+    data = frame(payload) * 3
+
+    for i in range(0, len(data), 1000):
+        feed(decoder, data[i:i + 1000])
+    assert [bytes(f) for f in decoder.frames()] == [payload] * 3
+
+
+def test_recv_into():
+    a, b = socket.socketpair()
+    payloads = [b"x" * size for size in (100, 64 * 1024, 1024 * 1024)]
+    sender = threading.Thread(
+        target=b.sendall, args=(b"".join(frame(p) for p in payloads),))
+    sender.start()
+
+    decoder = FrameDecoder()
+    received = []
+    while len(received) < len(payloads):
+        assert decoder.recv_into(a)
+        received.extend(bytes(f) for f in decoder.frames())
+
+    sender.join()
+    assert received == payloads
+    b.close()
+    assert decoder.recv_into(a) == 0
+    a.close()
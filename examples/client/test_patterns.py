@@ -0,0 +1,58 @@
+import fnmatch
+import random
+
+from cellaserv.patterns import PatternIndex
+
+
+def test_match_like_fnmatch():
+    patterns = ['log.*', 'log.robot.*', 'log.robot', 'log.*.error', '*',
+                'log?robot', 'log.[ab].x', 'config.match.color', 'config.*',
+                'log.robot.*.warn*']
+    events = ['log.robot', 'log.robot.error', 'log.a.x', 'log.c.x', 'logxrobot',
+              'config.match.color', 'config', 'log', 'log.robot.motor.warning',
+              '', 'a.b.c']
+
+    index = PatternIndex()
+    for pattern in patterns:
+        index.add(pattern, pattern)
+
+    for event in events:
+        expected = tuple(p for p in patterns if fnmatch.fnmatchcase(event, p))
+        assert index.match(event) == expected
+        # Cached result
+        assert index.match(event) == expected
+
+
+def test_random_patterns():
+    rand = random.Random(42)
+    words = ['a', 'b', 'ab', 'log', 'robot']
+    patterns = set()
+    while len(patterns) < 200:
+        patterns.add('.'.join(rand.choice(words + ['*', '?', 'a*'])
+                              for _ in range(rand.randint(1, 4))))
+    patterns = sorted(patterns)
+
+    index = PatternIndex(cache_size=10)
+    for pattern in patterns:
+        index.add(pattern, pattern)
+
+    for _ in range(1000):
+        event = '.'.join(rand.choice(words)
+                         for _ in range(rand.randint(1, 5)))
+        expected = tuple(p for p in patterns if fnmatch.fnmatchcase(event, p))
+        assert index.match(event) == expected
+
+
+def test_cache_invalidation():
+    index = PatternIndex()
+    index.add('log.*', 1)
+    assert index.match('log.foo') == (1,)
+
+    index.add('log.foo', 2)
+    index.add('log.*', 3)
+    assert index.match('log.foo') == (1, 3, 2)
+
+    index.remove('log.*', 1)
+    index.remove('log.*', 3)
+    assert index.match('log.foo') == (2,)
+    assert len(index) == 1
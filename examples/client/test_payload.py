@@ -0,0 +1,86 @@
+import pickle
+
+from pytest import raises
+
+from cellaserv.payload import (BINARY, JSON, RAW, Codec, get_codec,
+                               register_codec)
+
+
+VALUES = [
+    None, True, False,
+    0, 1, 127, 128, 255, 256, 2**16, 2**32, 2**64 - 1,
+    -1, -32, -33, -128, -129, -2**15 - 1, -2**31 - 1, -2**63,
+    0.5, -1e300,
+    '', 'a' * 31, 'b' * 32, 'c' * 256, 'é' * 70000,
+    b'', b'\x00' * 300, b'x' * 70000,
+    [], list(range(20)), [[1, [2, [3]]], {'a': None}],
+    {}, {str(i): i for i in range(20)}, {1: 'int key'},
+]
+
+
+def test_binary():
+    for value in VALUES:
+        assert BINARY.decode(BINARY.encode(value)) == value
+    assert BINARY.decode(BINARY.encode((1, 2))) == [1, 2]
+
+
+def test_binary_msgpack_format():
+    # Reference encodings of the MessagePack specification
+    assert BINARY.encode(None) == b'\xc0'
+    assert BINARY.encode(True) == b'\xc3'
+    assert BINARY.encode(5) == b'\x05'
+    assert BINARY.encode(-1) == b'\xff'
+    assert BINARY.encode(200) == b'\xcc\xc8'
+    assert BINARY.encode(-200) == b'\xd1\xff\x38'
+    assert BINARY.encode(1.5) == b'\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00'
+    assert BINARY.encode('abc') == b'\xa3abc'
+    assert BINARY.encode(b'abc') == b'\xc4\x03abc'
+    assert BINARY.encode([1, 2]) == b'\x92\x01\x02'
+    assert BINARY.encode({'a': 1}) == b'\x81\xa1a\x01'
+    assert len(BINARY.encode({'x': 1, 'y': [1, 2, 3]})) == 10
+
+
+def test_binary_errors():
+    for data in [b'', b'\xc1', b'\x92\x01', b'\xa3ab', b'\xc4\x05ab',
+                 b'\x01\x02', b'\xa1\xff', b'\x81\x90\x01']:
+        with raises(ValueError):
+            BINARY.decode(data)
+    with raises(TypeError):
+        BINARY.encode(object())
+    with raises(OverflowError):
+        BINARY.encode(2**64)
+
+
+def test_json_and_raw():
+    assert JSON.encode_arguments([1, 2], {}) == b'[1, 2]'
+    assert JSON.encode_arguments([], {'a': 1}) == b'{"a": 1}'
+    assert JSON.encode_arguments([], {}) is None
+    with raises(ValueError):
+        JSON.decode(b'\xff')
+
+    assert RAW.encode_arguments([b'data'], {}) == b'data'
+    assert RAW.encode_arguments([], {}) is None
+    assert RAW.decode(b'\xff') == b'\xff'
+    with raises(TypeError):
+        RAW.encode_arguments([], {'a': b'1'})
+    with raises(TypeError):
+        RAW.encode('text')
+
+
+def test_registry():
+    assert get_codec('binary') is BINARY
+    assert pickle.loads(pickle.dumps(RAW)) is RAW
+    with raises(ValueError):
+        get_codec('xml')
+
+    class Upper(Codec):
+        name = 'upper'
+
+        def encode(self, obj):
+            return obj.upper().encode()
+
+        def decode(self, data):
+            return data.decode().lower()
+
+    register_codec(Upper())
+    assert get_codec('upper').encode('a') == b'A'
@@ -0,0 +1,99 @@
+import socket
+import threading
+
+from pytest import raises
+
+from cellaserv.client import SynClient
+from cellaserv.framing import HEADER, FrameDecoder
+from cellaserv.protobuf.cellaserv_pb2 import Message, Reply, Request
+
+
+def read_requests(sock, decoder, count):
+    """Read ``count`` requests from ``sock``."""
+    requests = []
+    while len(requests) < count:
+        frame = decoder.next_frame()
+        if frame is None:
+            if decoder.recv_into(sock) == 0:
+                break
+            continue
+        with frame:
+            message = Message()
+            message.ParseFromString(frame)
+        request = Request()
+        request.ParseFromString(message.content)
+        requests.append(request)
+    return requests
+
+
+def reply(sock, request, data):
+    content = Reply(id=request.id, data=data).SerializeToString()
+    msg = Message(type=Message.Reply, content=content).SerializeToString()
+    sock.sendall(HEADER.pack(len(msg)) + msg)
+
+
+def test_out_of_order():
+    a, b = socket.socketpair()
+    client = SynClient(a, pipelined=True)
+    futures = [client.request_async('read', 'sensor', data=str(i).encode())
+               for i in range(3)]
+    client.flush()
+
+    requests = read_requests(b, FrameDecoder(), 3)
+    for request in reversed(requests):
+        reply(b, request, b'reply ' + request.data)
+
+    assert [f.result(1) for f in futures] == [b'reply 0', b'reply 1',
+                                               b'reply 2']
+    assert not client._reply_futures
+    b.close()
+
+
+def test_disconnect():
+    a, b = socket.socketpair()
+    client = SynClient(a, pipelined=True)
+    futures = [client.request_async('read', 'sensor') for _ in range(3)]
+    client.flush()
+
+    read_requests(b, FrameDecoder(), 3)
+    b.close()
+
+    for future in futures:
+        with raises(ConnectionError):
+            future.result(1)
+    assert not client._reply_futures
+
+    with raises(ConnectionError):
+        client.read_message()
+
+
+def test_backpressure():
+    # The peer writes large replies before reading the next request, so the
+    # buffers of the socket fill up in both directions: the reader thread
+    # must keep routing replies while the sender is blocked writing.
+    a, b = socket.socketpair()
+    client = SynClient(a, pipelined=True)
+    payload = b'x' * (1024 * 1024)
+
+    def peer():
+        decoder = FrameDecoder()
+        first, = read_requests(b, decoder, 1)
+        reply(b, first, payload)
+        # Reply to an unknown request, dropped by the reader
+        reply(b, Request(id=first.id - 1), payload)
+        second, = read_requests(b, decoder, 1)
+        reply(b, second, b'done')
+
+    threading.Thread(target=peer, daemon=True).start()
+
+    futures = [client.request_async('read', 'sensor')]
+    sender = threading.Thread(target=lambda: futures.append(
+        client.request_async('write', 'sensor', data=payload * 2)),
+        daemon=True)
+    sender.start()
+    sender.join(5)
+    assert not sender.is_alive()
+
+    assert futures[0].result(5) == payload
+    assert futures[1].result(5) == b'done'
+    b.close()
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from pytest import raises
+
+from cellaserv.client import ClientPool, NoSuchService
+
+
+class Connection:
+    """Stand-in for a SynClient."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.closed = False
+
+    def request(self, method, service, identification=None, data=None,
+                timeout=None):
+        if self.error is not None:
+            raise self.error
+        return data
+
+    def close(self):
+        self.closed = True
+
+
+def test_size():
+    pool = ClientPool(size=2, connect=Connection)
+    first = pool.checkout()
+    second = pool.checkout()
+    assert first is not second
+
+    # The third checkout waits for a connection to be checked in
+    checked_out = []
+    thread = threading.Thread(
+        target=lambda: checked_out.append(pool.checkout()))
+    thread.start()
+    thread.join(.1)
+    assert thread.is_alive()
+
+    pool.checkin(second)
+    thread.join(1)
+    assert checked_out == [second]
+    assert pool._opened == 2
+
+
+def test_reuse():
+    pool = ClientPool(size=2, connect=Connection)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert pool.request('read', 'sensor', data=b'1') == b'1'
+    assert pool._opened == 1
+
+    pool.close()
+    assert first.closed
+    assert pool._opened == 0
+
+
+def test_idle_timeout():
+    pool = ClientPool(size=2, idle_timeout=.05, connect=Connection)
+    with pool.connection() as first:
+        pass
+    time.sleep(.1)
+    with pool.connection() as second:
+        pass
+    assert first.closed
+    assert second is not first
+    assert pool._opened == 1
+
+
+def test_broken_connection():
+    broken = Connection(ConnectionResetError())
+    connections = [Connection(), broken]
+    pool = ClientPool(size=1, connect=connections.pop)
+
+    with raises(ConnectionResetError):
+        pool.request('read', 'sensor')
+    # The connection is closed instead of put back in the pool
+    assert broken.closed
+    assert pool._opened == 0
+    assert pool.request('read', 'sensor', data=b'2') == b'2'
+
+    # Errors of the requests do not break the connection
+    with raises(NoSuchService):
+        with pool.connection() as client:
+            raise NoSuchService('sensor')
+    with pool.connection() as same:
+        assert same is client
+    assert not client.closed
+
+
+def test_connect_error():
+    def connect():
+        raise ConnectionRefusedError()
+
+    pool = ClientPool(size=1, connect=connect)
+    for _ in range(2):
+        with raises(ConnectionRefusedError):
+            pool.checkout()
+    assert pool._opened == 0
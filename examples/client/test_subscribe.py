@@ -0,0 +1,70 @@
+import json
+
+from cellaserv.client import AbstractAsynClient
+
+
+class Client(AbstractAsynClient):
+    """Client dispatching the events given to it, without a connection."""
+
+    def _write(self, data):
+        pass
+
+
+class Decoder:
+    """JSON decoder counting its calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, data):
+        self.calls += 1
+        return json.loads(data.decode())
+
+
+def test_decode_once():
+    client = Client()
+    decode = Decoder()
+    received = []
+    client.add_subscribe_cb('tick', received.append)
+    client.add_subscribe_cb('tick', received.append, decode=decode)
+    client.add_subscribe_cb('tick', received.append, decode=decode)
+    client.add_subscribe_pattern_cb(
+        'ti*', lambda value, event: received.append(value), decode=decode)
+
+    client._dispatch_publish('tick', b'{"i": 1}')
+    assert decode.calls == 1
+    assert received == [b'{"i": 1}'] + [{'i': 1}] * 3
+    # The callbacks share the decoded data
+    assert received[1] is received[2] is received[3]
+
+    # Decoded again for the next event
+    client._dispatch_publish('tick', b'{"i": 2}')
+    assert decode.calls == 2
+
+
+def test_not_decoded():
+    client = Client()
+    decode = Decoder()
+    received = []
+    client.add_subscribe_cb('tick', received.append)
+    client.add_subscribe_cb('tock', received.append, decode=decode)
+
+    client._dispatch_publish('tick', b'{"i": 1}')
+    client._dispatch_publish('other', b'{"i": 1}')
+    assert decode.calls == 0
+    assert received == [b'{"i": 1}']
+
+
+def test_decode_error():
+    client = Client()
+    decode = Decoder()
+    received = []
+    client.add_subscribe_cb('tick', received.append, decode=decode)
+    client.add_subscribe_pattern_cb(
+        '*', lambda value, event: received.append(value), decode=decode)
+    client.add_subscribe_cb('tick', received.append)
+
+    # The error is logged for each callback, the data is decoded once
+    client._dispatch_publish('tick', b'invalid')
+    assert decode.calls == 1
+    assert received == [b'invalid']
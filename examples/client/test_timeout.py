@@ -0,0 +1,109 @@
+import socket
+import threading
+import time
+
+from pytest import raises
+
+from cellaserv.client import RequestTimeout, SynClient
+from cellaserv.framing import HEADER, FrameDecoder
+from cellaserv.protobuf.cellaserv_pb2 import Message, Publish, Reply, Request
+
+
+def read_messages(sock, decoder, count):
+    """Read ``count`` messages from ``sock``."""
+    sock.settimeout(2)
+    messages = []
+    while len(messages) < count:
+        frame = decoder.next_frame()
+        if frame is None:
+            assert decoder.recv_into(sock)
+            continue
+        with frame:
+            message = Message()
+            message.ParseFromString(frame)
+        messages.append(message)
+    return messages
+
+
+def read_request(sock, decoder):
+    request = Request()
+    request.ParseFromString(read_messages(sock, decoder, 1)[0].content)
+    return request
+
+
+def reply(sock, request, data):
+    content = Reply(id=request.id, data=data).SerializeToString()
+    msg = Message(type=Message.Reply, content=content).SerializeToString()
+    sock.sendall(HEADER.pack(len(msg)) + msg)
+
+
+def test_request_timeout():
+    for pipelined in (False, True):
+        a, b = socket.socketpair()
+        decoder = FrameDecoder()
+        client = SynClient(a, pipelined=pipelined, timeout=.1)
+
+        begin = time.monotonic()
+        with raises(RequestTimeout):
+            client.request('read', 'sensor')
+        with raises(RequestTimeout):
+            client.request('read', 'sensor', timeout=.05)
+        assert time.monotonic() - begin < .5
+        late = [read_request(b, decoder), read_request(b, decoder)]
+        assert len(client._expired_requests) == 2
+
+        def peer():
+            request = read_request(b, decoder)
+            # The late replies are dropped, not taken for the reply of the
+            # next request
+            for expired in late:
+                reply(b, expired, b'late')
+            reply(b, request, b'ok')
+
+        thread = threading.Thread(target=peer)
+        thread.start()
+        assert client.request('read', 'sensor', timeout=1) == b'ok'
+        thread.join()
+        assert not client._expired_requests
+
+        # The timeout of the socket is restored
+        assert a.gettimeout() is None
+        a.close()
+        b.close()
+
+
+def test_write_while_waiting():
+    # A message sent by another thread while the client waits for a reply,
+    # with a timeout, must not be cut when the timeout expires
+    a, b = socket.socketpair()
+    decoder = FrameDecoder()
+    client = SynClient(a)
+    data = b'x' * (1024 * 1024)
+
+    def request():
+        with raises(RequestTimeout):
+            client.request('read', 'sensor', timeout=.1)
+
+    threads = [threading.Thread(target=request),
+               threading.Thread(target=client.publish, args=('big', data))]
+    for thread in threads:
+        thread.start()
+    # Only read once the request expired
+    time.sleep(.3)
+    messages = read_messages(b, decoder, 2)
+    for thread in threads:
+        thread.join()
+
+    publish = Publish()
+    publish.ParseFromString(next(
+        m.content for m in messages if m.type == Message.Publish))
+    assert publish.event == 'big'
+    assert publish.data == data
+
+    def peer():
+        reply(b, read_request(b, decoder), b'ok')
+
+    thread = threading.Thread(target=peer)
+    thread.start()
+    assert client.request('read', 'sensor', timeout=1) == b'ok'
+    thread.join()
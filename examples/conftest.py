@@ -0,0 +1,17 @@
+"""Fixtures shared by the examples."""
+
+from pytest import fixture
+
+from cellaserv.testing import FakeBroker
+
+
+@fixture(scope='module')
+def broker(request):
+    """
+    Fake cellaserv broker, used by default by the clients and services of the
+    test module. The ``request_timeout`` of the module sets the timeout of the
+    broker, 2 seconds if it has none.
+    """
+    timeout = getattr(request.module, 'request_timeout', 2)
+    with FakeBroker(request_timeout=timeout) as broker, broker.settings():
+        yield broker
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.client import ReplyError
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+
+
+class Slow(Service):
+
+    def __init__(self):
+        self.calls = 0
+        super().__init__()
+
+    @Service.action
+    def get(self, x):
+        self.calls += 1
+        time.sleep(.2)
+        return {'x': x}
+
+    @Service.action
+    def fail(self):
+        self.calls += 1
+        time.sleep(.2)
+        raise Exception("fail")
+
+    @Service.action
+    def move(self):
+        self.calls += 1
+        time.sleep(.05)
+
+
+# Timeout of the broker, see examples/conftest.py
+request_timeout = 5
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global service
+    service = broker.serve(Slow)
+
+
+def call_concurrently(function, threads=4):
+    """Call ``function`` from multiple threads at the same time."""
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = function()
+        except Exception as e:
+            results[i] = e
+
+    workers = [threading.Thread(target=run, args=(i,))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def test_coalesce():
+    cs = CellaservProxy(pool_size=4, coalesce=['slow.get', 'slow.fail'])
+    calls = service.calls
+    results = call_concurrently(lambda: cs.slow.get(1))
+    assert results == [{'x': 1}] * 4
+    # Callers do not share the decoded replies
+    assert len(set(map(id, results))) == 4
+    assert service.calls == calls + 1
+
+    calls = service.calls
+    results = call_concurrently(lambda: cs.slow.fail())
+    assert all(isinstance(result, ReplyError) for result in results)
+    assert service.calls == calls + 1
+
+    # Not coalesced
+    calls = service.calls
+    call_concurrently(lambda: cs.slow.move())
+    assert service.calls == calls + 4
+
+    # Sequential calls are not coalesced
+    calls = service.calls
+    cs.slow.get(1)
+    cs.slow.get(1)
+    with raises(ReplyError):
+        cs.slow.fail()
+    assert service.calls == calls + 3
+
+
+def test_coalesce_all():
+    cs = CellaservProxy(pool_size=4, coalesce=True)
+    calls = service.calls
+    results = call_concurrently(lambda: cs.slow.get(2))
+    assert results == [{'x': 2}] * 4
+    assert service.calls == calls + 1
+
+    # Different arguments are different requests
+    calls = service.calls
+    results = call_concurrently(lambda: cs.slow.get(threading.get_ident()),
+                                threads=2)
+    assert results[0] != results[1]
+    assert service.calls == calls + 2
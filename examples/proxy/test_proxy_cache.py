@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.client import ReplyError
+from cellaserv.proxy import AsyncCellaservProxy, CellaservProxy
+from cellaserv.service import Service
+
+
+class Config(Service):
+
+    def __init__(self):
+        self.calls = 0
+        super().__init__()
+
+    @Service.action
+    def get(self, key=None):
+        self.calls += 1
+        return {'key': key, 'calls': self.calls}
+
+    @Service.action
+    def fail(self):
+        self.calls += 1
+        raise Exception("fail")
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global service
+    service = broker.serve(Config)
+
+
+def test_cache():
+    cs = CellaservProxy(cache={'config.get': {'size': 2}, 'config.fail': {}})
+    first = cs.config.get('a')
+    assert cs.config.get('a') == first
+    # The caller cannot modify the cached reply
+    first['calls'] = None
+    assert cs.config.get('a')['calls'] is not None
+
+    assert cs.config.get('b') != first
+
+    # Not cached
+    assert CellaservProxy().config.get('a') != first
+
+    calls = service.calls
+    for _ in range(2):
+        with raises(ReplyError):
+            cs.config.fail()
+    assert service.calls == calls + 2
+
+
+def test_ttl():
+    cs = CellaservProxy(cache={'config.get': {'ttl': .1}})
+    first = cs.config.get()
+    assert cs.config.get() == first
+    time.sleep(.15)
+    assert cs.config.get() != first
+
+
+def test_invalidate_on():
+    cs = CellaservProxy(cache={
+        'config.get': {'invalidate_on': ['config.updated', 'reset']}})
+    first = cs.config.get()
+    assert cs.config.get() == first
+    cs('config.updated')
+
+    cache = cs._caches['config']['get']
+    deadline = time.monotonic() + 2
+    while len(cache):
+        assert time.monotonic() < deadline
+        time.sleep(.01)
+    assert cs.config.get() != first
+    cs._invalidator.close()
+
+
+def test_bad_cache():
+    with raises(ValueError):
+        CellaservProxy(cache={'get': {}})
+    with raises(TypeError):
+        CellaservProxy(cache={'config.get': {'expire': 1}})
+
+
+def test_async_cache():
+    loop = asyncio.new_event_loop()
+    cs = AsyncCellaservProxy(loop=loop, cache={'config.get': {}})
+    first = loop.run_until_complete(cs.config.get())
+    assert loop.run_until_complete(cs.config.get()) == first
+    loop.close()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+
+from pytest import fixture
+
+from cellaserv.client import (ClientPool, NoSuchIdentification, NoSuchMethod,
+                              NoSuchService, ReplyError, RequestTimeout,
+                              SynClient)
+from cellaserv.proxy import AsyncCellaservProxy, CellaservProxy
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+
+
+class Sensor(Service):
+
+    def __init__(self, identification, value):
+        self.value = value
+        super().__init__(identification=identification)
+
+    @Service.action
+    def read(self, offset=0):
+        return self.value + offset
+
+    @Service.action
+    async def slow(self):
+        await asyncio.sleep(1)
+
+    @Service.action
+    def fail(self):
+        raise Exception("fail")
+
+
+# Timeout of the broker, see examples/conftest.py
+request_timeout = 5
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    broker.serve(Sensor, 'left', 12)
+    broker.serve(Sensor, 'right', 14)
+
+
+REQUESTS = [
+    ('sensor', 'left', 'read', None),
+    ('sensor', 'right', 'read', b'[1]'),
+    ('sensor', 'front', 'read', None),
+    ('nothing', None, 'read', None),
+    ('sensor', 'left', 'nothing', None),
+    ('sensor', 'right', 'fail', None),
+]
+
+
+def check_results(results):
+    assert [json.loads(r.decode()) for r in results[:2]] == [12, 15]
+    assert isinstance(results[2], NoSuchIdentification)
+    assert isinstance(results[3], NoSuchService)
+    assert isinstance(results[4], NoSuchMethod)
+    assert isinstance(results[5], ReplyError)
+
+
+def test_request_many():
+    for pipelined in (False, True):
+        client = SynClient(get_socket(), pipelined=pipelined)
+        check_results(client.request_many(REQUESTS))
+        assert client.request_many([]) == []
+
+        # The client can still be used
+        assert client.request('read', 'sensor', 'left') == b'12'
+
+    pool = ClientPool(size=1)
+    check_results(pool.request_many(REQUESTS))
+    pool.close()
+
+
+def test_proxy():
+    cs = CellaservProxy()
+    results = cs.request_many([
+        ('sensor', 'left', 'read', None),
+        ('sensor', 'right', 'read', {'offset': 2}),
+        ('sensor', 'left', 'read', [3]),
+        ('nothing', None, 'read', None),
+    ])
+    assert results[:3] == [12, 16, 15]
+    assert isinstance(results[3], NoSuchService)
+
+
+def test_async_proxy():
+    loop = asyncio.new_event_loop()
+    cs = AsyncCellaservProxy(loop=loop)
+    results = loop.run_until_complete(cs.request_many([
+        ('sensor', 'left', 'read', None),
+        ('sensor', 'right', 'slow', None),
+        ('nothing', None, 'read', None),
+    ], timeout=.2))
+    assert results[0] == 12
+    assert isinstance(results[1], RequestTimeout)
+    assert isinstance(results[2], NoSuchService)
+    loop.close()
+
+
+def test_deadline():
+    for pipelined in (False, True):
+        client = SynClient(get_socket(), pipelined=pipelined)
+        begin = time.monotonic()
+        results = client.request_many([
+            ('sensor', 'left', 'slow', None),
+            ('sensor', 'right', 'read', None),
+            ('sensor', 'right', 'slow', None),
+        ], timeout=.2)
+        assert time.monotonic() - begin < .5
+        assert isinstance(results[0], RequestTimeout)
+        assert results[1] == b'14'
+        assert isinstance(results[2], RequestTimeout)
+
+        # Late replies are dropped
+        time.sleep(1)
+        assert client.request('read', 'sensor', 'left') == b'12'
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.client import ReplyError, SynClient
+from cellaserv.proxy import AsyncCellaservProxy, CellaservProxy
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+
+
+class Echo(Service):
+
+    @Service.action
+    def echo(self, x):
+        return x
+
+
+class Tasks(Service):
+
+    def __init__(self):
+        self.ticks = []
+        self.got_tick = threading.Event()
+        super().__init__()
+
+    @Service.action
+    async def sleep(self, duration):
+        await asyncio.sleep(duration)
+        return duration
+
+    @Service.action
+    async def forward(self, x):
+        cs = AsyncCellaservProxy(client=self)
+        return await cs.echo.echo(x)
+
+    @Service.action
+    async def fail(self):
+        await asyncio.sleep(0)
+        raise Exception("fail")
+
+    @Service.event
+    async def tick(self, i):
+        await asyncio.sleep(0)
+        self.ticks.append(i)
+        self.got_tick.set()
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global service
+    broker.serve(Echo)
+    service = broker.serve(Tasks)
+
+
+def test_action():
+    client = SynClient(get_socket(), pipelined=True)
+    begin = time.monotonic()
+    futures = [client.request_async('sleep', 'tasks', data=b'[0.2]')
+               for _ in range(5)]
+    for future in futures:
+        assert json.loads(future.result(timeout=2).decode()) == 0.2
+    # The coroutines ran concurrently
+    assert time.monotonic() - begin < 0.5
+
+
+def test_forward():
+    cs = CellaservProxy()
+    assert cs.tasks.forward([1, 2]) == [1, 2]
+    with raises(ReplyError):
+        cs.tasks.fail()
+
+
+def test_event():
+    cs = CellaservProxy()
+    cs('tick', i=42)
+    assert service.got_tick.wait(2)
+    assert service.ticks == [42]
+    assert cs.tasks.stats()['events']['tick']['calls'] == 1
+
+
+def test_async_proxy():
+    loop = asyncio.new_event_loop()
+    cs = AsyncCellaservProxy(loop=loop)
+    result = loop.run_until_complete(cs.echo.echo('hello'))
+    assert result == 'hello'
+    loop.close()
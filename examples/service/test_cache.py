@@ -0,0 +1,112 @@
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.cache import TTLCache
+from cellaserv.client import ReplyError
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+
+
+class Lookup(Service):
+
+    def __init__(self):
+        self.calls = 0
+        super().__init__()
+
+    @Service.action(cache_size=2, cache_invalidate_on='table.updated')
+    def table(self, x):
+        self.calls += 1
+        return {'x': x, 'calls': self.calls}
+
+    @Service.action(cache_ttl=.1)
+    def short(self):
+        self.calls += 1
+        return self.calls
+
+    @Service.action(cache_size=8)
+    def fail(self):
+        self.calls += 1
+        raise Exception("fail")
+
+    @Service.action
+    def reset(self):
+        self.invalidate_cache('table')
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global service
+    service = broker.serve(Lookup)
+
+
+def test_ttl_cache():
+    cache = TTLCache(maxsize=2, ttl=.05)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.put('c', 3)
+    assert cache.get('a') is None
+    assert cache.get('c') == 3
+    time.sleep(.06)
+    assert cache.get('c') is None
+
+    generation = cache.generation
+    cache.clear()
+    cache.put('a', 1, generation)
+    assert cache.get('a') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 3, 1)
+
+
+def test_cache():
+    cs = CellaservProxy()
+    first = cs.lookup.table(1)
+    assert cs.lookup.table(1) == first
+    assert cs.lookup.table(x=1) != first
+    # 1 and true are different arguments
+    assert cs.lookup.table(True)['x'] is True
+
+    cs.lookup.reset()
+    assert cs.lookup.table(1) != first
+
+    stats = cs.lookup.stats()
+    assert stats['caches']['table']['hits'] == 1
+    assert stats['caches']['table']['size'] == 1
+    assert stats['actions']['table']['calls'] == 5
+
+
+def test_ttl():
+    cs = CellaservProxy()
+    first = cs.lookup.short()
+    assert cs.lookup.short() == first
+    time.sleep(.15)
+    assert cs.lookup.short() != first
+
+
+def test_errors_not_cached():
+    cs = CellaservProxy()
+    calls = service.calls
+    for _ in range(2):
+        with raises(ReplyError):
+            cs.lookup.fail()
+    assert service.calls == calls + 2
+
+
+def test_invalidate_on_event():
+    cs = CellaservProxy()
+    first = cs.lookup.table(2)
+    cs('table.updated')
+
+    deadline = time.monotonic() + 2
+    while len(service._action_caches['table']):
+        assert time.monotonic() < deadline
+        time.sleep(.01)
+    assert cs.lookup.table(2) != first
+
+
+def test_invalidate_without_cache():
+    for action in ('reset', 'nope'):
+        with raises(ValueError) as excinfo:
+            service.invalidate_cache(action)
+        assert repr(action) in str(excinfo.value)
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import threading
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.client import (BadArguments, NoSuchMethod, NoSuchService,
+                              RequestTimeout, SynClient)
+from cellaserv.payload import BINARY
+from cellaserv.proxy import AsyncCellaservProxy, CellaservProxy, _ActionCodecs
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+
+
+class Camera(Service):
+    codec = 'binary'
+
+    @Service.action
+    def frame(self, size):
+        return {'size': size, 'pixels': b'\x00' * size}
+
+    @Service.action(codec='raw')
+    def echo(self, data=b''):
+        return data[::-1]
+
+    @Service.action(codec='json')
+    def settings(self, key):
+        return {key: 1}
+
+    @Service.action(cache_size=4)
+    def cached(self, x):
+        return [x, os.urandom(4)]
+
+    @staticmethod
+    @Service.action(executor='process')
+    def blur(pixels):
+        return bytes(reversed(pixels))
+
+
+class Busy(Service):
+    codec = 'binary'
+
+    @Service.action
+    def block(self, duration):
+        # Blocks the loop of the service
+        time.sleep(duration)
+
+    @Service.action
+    def read(self):
+        return 1
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global service
+    service = broker.serve(Camera)
+    broker.serve(Busy)
+
+
+def test_codecs():
+    cs = CellaservProxy(negotiate_codecs=True)
+    assert cs.camera.frame(3) == {'size': 3, 'pixels': b'\x00\x00\x00'}
+    assert cs.camera.echo(b'\x01\x02\xff') == b'\xff\x02\x01'
+    assert cs.camera.echo() is None
+    assert cs.camera.settings(key='a') == {'a': 1}
+    assert cs.camera.blur(b'\x01\x02') == b'\x02\x01'
+
+    first = cs.camera.cached(b'x')
+    assert cs.camera.cached(b'x') == first
+
+    actions = cs.camera.help_actions()
+    assert actions['frame']['codec'] == 'binary'
+    assert actions['echo']['codec'] == 'raw'
+    assert actions['settings']['codec'] == 'json'
+    # The default actions are always called in json
+    assert actions['help_actions']['codec'] == 'json'
+
+
+def test_wire_format():
+    client = SynClient(get_socket())
+    reply = client.request('frame', 'camera', data=BINARY.encode([1]))
+    assert BINARY.decode(reply) == {'size': 1, 'pixels': b'\x00'}
+
+    # Data that is not in the codec of the action is rejected, not passed as
+    # raw bytes
+    with raises(BadArguments):
+        client.request('frame', 'camera', data=b'[1]')
+    with raises(BadArguments):
+        client.request('settings', 'camera', data=b'\xff')
+
+
+def test_without_negotiation():
+    cs = CellaservProxy()
+    assert cs.camera.settings('a') == {'a': 1}
+    with raises(BadArguments):
+        cs.camera.frame(1)
+
+
+def test_request_many():
+    cs = CellaservProxy(negotiate_codecs=True)
+    results = cs.request_many([
+        ('camera', None, 'frame', [1]),
+        ('camera', None, 'echo', [b'ab']),
+        ('camera', None, 'settings', {'key': 'b'}),
+    ])
+    assert results == [{'size': 1, 'pixels': b'\x00'}, b'ba', {'b': 1}]
+
+
+def test_async_proxy():
+    loop = asyncio.new_event_loop()
+    cs = AsyncCellaservProxy(loop=loop, negotiate_codecs=True)
+    assert loop.run_until_complete(cs.camera.echo(b'ab')) == b'ba'
+    results = loop.run_until_complete(cs.request_many([
+        ('camera', None, 'frame', [2]),
+    ]))
+    assert results == [{'size': 2, 'pixels': b'\x00\x00'}]
+    loop.close()
+
+
+def test_unknown_codec():
+    with raises(ValueError):
+        class Bad(Service):
+            @Service.action(codec='xml')
+            def action(self):
+                pass
+
+
+def block(duration):
+    """Block the busy service for ``duration`` seconds."""
+    client = SynClient(get_socket())
+    thread = threading.Thread(target=client.request, args=('block', 'busy'),
+                              kwargs={'data': BINARY.encode([duration])})
+    thread.start()
+    time.sleep(.05)
+    return thread
+
+
+def test_deadline():
+    # Reading the codecs counts in the timeout of the call
+    cs = CellaservProxy(timeout=.3, negotiate_codecs=True)
+    thread = block(.6)
+    begin = time.monotonic()
+    with raises(RequestTimeout):
+        cs.busy.read()
+    assert time.monotonic() - begin < .45
+    thread.join()
+
+    # The service is called in json until its codecs are read again
+    assert cs._codecs.get('busy', None) == {}
+    with raises(BadArguments):
+        cs.busy.read(1)
+
+    cs = CellaservProxy(negotiate_codecs=True)
+    thread = block(.6)
+    begin = time.monotonic()
+    results = cs.request_many([('busy', None, 'read', None)] * 2, timeout=.3)
+    assert time.monotonic() - begin < .45
+    assert all(isinstance(r, RequestTimeout) for r in results)
+    thread.join()
+
+
+def test_negotiation_retry():
+    codecs = _ActionCodecs()
+    codecs.retry_interval = .05
+    codecs.learn('camera', None, NoSuchService('camera'))
+    assert codecs.get('camera', None) == {}
+    time.sleep(.1)
+    assert codecs.get('camera', None) is None
+
+    codecs.learn('camera', None, {'frame': {'codec': 'binary'}})
+    assert codecs.get('camera', None) == {'frame': BINARY}
+    # Services without help_actions use json
+    codecs.learn('date', None, NoSuchMethod('date', 'help_actions'))
+    time.sleep(.1)
+    assert codecs.get('date', None) == {}
+
+
+def test_unknown_codec():
+    codecs = _ActionCodecs()
+    codecs.learn('camera', None, {'frame': {'codec': 'binary'},
+                                  'stream': {'codec': 'h264'}})
+    # The actions with a codec unknown here are called in json
+    assert codecs.get('camera', None) == {'frame': BINARY}
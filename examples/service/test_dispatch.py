@@ -0,0 +1,93 @@
+from pytest import fixture, raises
+
+from cellaserv.client import BadArguments
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+
+
+class Dispatch(Service):
+    """Actions with all kinds of signatures."""
+
+    def __init__(self):
+        self.calls = 0
+        super().__init__()
+
+    @Service.action
+    def add(self, a, b=0):
+        """Add a and b."""
+        self.calls += 1
+        return a + b
+
+    @Service.action
+    def var(self, a, *args, **kwargs):
+        return [a, args, kwargs]
+
+    @Service.action
+    def keyword_only(self, a, *, b):
+        self.calls += 1
+        return [a, b]
+
+    @staticmethod
+    @Service.action
+    def static(x):
+        return x
+
+    @classmethod
+    @Service.action
+    def klass(cls, x):
+        return cls.__name__
+
+    @Service.action
+    async def coroutine(self, x):
+        self.calls += 1
+        return x
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global service
+    service = broker.serve(Dispatch)
+
+
+def test_dispatch():
+    cs = CellaservProxy()
+    assert cs.dispatch.add(1) == 1
+    assert cs.dispatch.add(a=1, b=2) == 3
+    assert cs.dispatch.var(1, 2, 3) == [1, [2, 3], {}]
+    assert cs.dispatch.var(a=1, b=2) == [1, [], {'b': 2}]
+    assert cs.dispatch.keyword_only(a=1, b=2) == [1, 2]
+    assert cs.dispatch.static(4) == 4
+    assert cs.dispatch.klass(4) == 'Dispatch'
+    assert cs.dispatch.coroutine(5) == 5
+
+
+def test_bad_arguments():
+    cs = CellaservProxy()
+    calls = service.calls
+    for action, args, kwargs in [
+            ('add', [], {}),
+            ('add', [1, 2, 3], {}),
+            ('add', [], {'a': 1, 'c': 2}),
+            ('add', [], {'b': 2}),
+            ('var', [], {}),
+            ('keyword_only', [1, 2], {}),
+            ('keyword_only', [], {'a': 1}),
+            ('coroutine', [], {}),
+    ]:
+        with raises(BadArguments):
+            getattr(cs.dispatch, action)(*args, **kwargs)
+    # The actions were not called
+    assert service.calls == calls
+    assert cs.dispatch.stats()['actions']['add']['errors'] == 4
+
+
+def test_help():
+    cs = CellaservProxy()
+    actions = cs.dispatch.help_actions()
+    assert actions['add'] == {'doc': "Add a and b.", 'sig': 'add(a, b=0)',
+                              'codec': 'json'}
+    assert actions['static']['sig'] == 'static(x)'
+    assert actions['klass']['sig'] == 'klass(x)'
+    assert actions['keyword_only']['sig'] == 'keyword_only(a, *, b)'
+    assert cs.dispatch.help()['doc'] == "Actions with all kinds of signatures."
+    assert service.help_actions() is service.help_actions()
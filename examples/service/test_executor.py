@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.client import ReplyError, SynClient
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+
+
+class Workers(Service):
+    max_workers = 4
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        super().__init__()
+
+    @Service.action
+    def sleep(self, duration):
+        time.sleep(duration)
+        return threading.current_thread().name
+
+    @Service.action(concurrency=1)
+    def limited(self, duration):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(duration)
+        with self.lock:
+            self.running -= 1
+
+    @Service.action(serialized=True)
+    def serial(self):
+        return threading.current_thread().name
+
+    @Service.action
+    def fail(self):
+        raise Exception("fail")
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global service
+    service = broker.serve(Workers)
+
+
+def test_concurrent():
+    client = SynClient(get_socket(), pipelined=True)
+    begin = time.monotonic()
+    futures = [client.request_async('sleep', 'workers', data=b'[0.2]')
+               for _ in range(4)]
+    threads = {json.loads(f.result(timeout=2).decode()) for f in futures}
+    assert time.monotonic() - begin < 0.6
+    assert len(threads) == 4
+    assert all(name.startswith('Workers-action') for name in threads)
+
+
+def test_concurrency_limit():
+    client = SynClient(get_socket(), pipelined=True)
+    futures = [client.request_async('limited', 'workers', data=b'[0.05]')
+               for _ in range(3)]
+    for future in futures:
+        future.result(timeout=2)
+    assert service.max_running == 1
+
+
+def test_serialized():
+    cs = CellaservProxy()
+    assert not cs.workers.serial().startswith('Workers-action')
+
+
+def test_error():
+    cs = CellaservProxy()
+    with raises(ReplyError):
+        cs.workers.fail()
+    stats = cs.workers.stats()
+    assert stats['actions']['fail']['errors'] == 1
@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+from pytest import fixture, raises
+
+from cellaserv import local
+from cellaserv.client import NoSuchMethod, NoSuchService, ReplyError, SynClient
+from cellaserv.protobuf.cellaserv_pb2 import Message, Publish
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+
+
+class Local(Service):
+    local_dispatch = True
+
+    def __init__(self, identification=None):
+        self.received = []
+        self.got_tick = threading.Event()
+        super().__init__(identification=identification)
+
+    @Service.action
+    def echo(self, x):
+        return x
+
+    @Service.action
+    def whoami(self):
+        return self.identification
+
+    @Service.action
+    def fail(self):
+        raise Exception("fail")
+
+    @Service.action
+    def forward(self, x):
+        # Blocking request from the loop of the target
+        client = SynClient(get_socket())
+        client.local_dispatch = True
+        return json.loads(client.request(
+            'echo', 'local', identification='other',
+            data=json.dumps([x]).encode()).decode())
+
+    @Service.event
+    def tick(self, i):
+        self.received.append(i)
+        self.got_tick.set()
+
+
+def wait_local(name, identification=None, timeout=5):
+    deadline = time.monotonic() + timeout
+    while local.lookup(name, identification) is None:
+        assert time.monotonic() < deadline, "Service not registered locally"
+        time.sleep(.01)
+
+
+# Timeout of the broker, see examples/conftest.py
+request_timeout = 1
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global routed, service, other
+    # Count the requests routed by the broker
+    routed = []
+    on_request = broker._on_request
+
+    def _on_request(connection, request):
+        routed.append(request.method)
+        on_request(connection, request)
+
+    broker._on_request = _on_request
+
+    service = broker.serve(Local)
+    other = broker.serve(Local, identification='other')
+    wait_local('local')
+    wait_local('local', 'other')
+
+
+def local_proxy():
+    client = SynClient(get_socket())
+    client.local_dispatch = True
+    return CellaservProxy(client=client)
+
+
+def test_request():
+    del routed[:]
+    cs = local_proxy()
+    assert cs.local.echo({'a': [1, 2]}) == {'a': [1, 2]}
+    assert cs.local['other'].whoami() == 'other'
+    assert cs.local.forward(3) == 3
+    assert routed == []
+
+    # Without local dispatch, requests go through the broker
+    assert CellaservProxy().local.echo(1) == 1
+    assert routed == ['echo']
+
+
+def test_request_errors():
+    cs = local_proxy()
+    with raises(ReplyError):
+        cs.local.fail()
+    with raises(ReplyError):
+        # Missing argument
+        cs.local.echo()
+    with raises(NoSuchMethod):
+        cs.local.nope()
+    # Not in this process, the broker replies
+    with raises(NoSuchService):
+        cs.nope.echo(1)
+
+
+def test_publish():
+    subscriber = SynClient(get_socket())
+    subscriber.subscribe('tick')
+    subscriber.request('list-events', 'cellaserv')
+
+    publisher = SynClient(get_socket())
+    publisher.local_dispatch = True
+    for i in range(3):
+        publisher.publish('tick', json.dumps({'i': i}).encode())
+
+    # The remote subscriber receives the events through the broker
+    for i in range(3):
+        msg = subscriber.read_message()
+        assert msg.type == Message.Publish
+        publish = Publish()
+        publish.ParseFromString(msg.content)
+        assert json.loads(publish.data.decode()) == {'i': i}
+
+    # Services receive each event once, in order
+    time.sleep(.1)
+    assert service.received == [0, 1, 2]
+    assert other.received == [0, 1, 2]
+    assert not service._local_echoes
+
+
+def in_loop(service, function, *args):
+    """Call ``function`` in the thread of ``service``, return its result."""
+    future = Future()
+    service._loop.call_soon_threadsafe(
+        lambda: future.set_result(function(*args)))
+    return future.result(1)
+
+
+def test_lost_echo():
+    del service.received[:]
+    service.local_echo_timeout = .1
+    data = json.dumps({'i': 42}).encode()
+    try:
+        # cellaserv never sends this copy back
+        in_loop(service, service._on_local_publish, 'tick', data, 1)
+        time.sleep(.2)
+        # A later event with the same data, published by another process
+        in_loop(service, service._dispatch_publish, 'tick', data)
+    finally:
+        del service.local_echo_timeout
+
+    assert service.received == [42, 42]
+    assert not service._local_echoes
+
+    # Lost copies of events that are not published anymore are forgotten too
+    service.local_echo_timeout = .1
+    try:
+        in_loop(service, service._on_local_publish, 'tick', data, 2)
+        time.sleep(.2)
+        in_loop(service, service._on_local_publish, 'tick', b'{"i": 0}', 1)
+    finally:
+        del service.local_echo_timeout
+    assert list(service._local_echoes) == [('tick', b'{"i": 0}')]
@@ -0,0 +1,80 @@
+import os
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.client import ReplyError, SynClient
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+
+
+class Compute(Service):
+    process_workers = 2
+
+    @staticmethod
+    @Service.action(executor='process')
+    def spin(duration):
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            pass
+        return os.getpid()
+
+    @staticmethod
+    @Service.action(executor='process')
+    def add(a, b):
+        return a + b
+
+    @staticmethod
+    @Service.action(executor='process')
+    def fail():
+        raise ValueError("fail")
+
+    @Service.action
+    def ping(self):
+        return os.getpid()
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    global service
+    service = broker.serve(Compute)
+
+
+def test_warm_up():
+    # The processes were started with the service
+    assert len(service._process_executor._processes) == 2
+
+
+def test_process():
+    cs = CellaservProxy()
+    assert cs.compute.add(a=1, b=2) == 3
+    assert cs.compute.add('a', 'b') == 'ab'
+    assert cs.compute.spin(0) != os.getpid()
+    assert cs.compute.ping() == os.getpid()
+    with raises(ReplyError):
+        cs.compute.fail()
+
+    sig = cs.compute.help_actions()['add']['sig']
+    assert sig == 'add(a, b)'
+
+
+def test_not_blocking():
+    client = SynClient(get_socket(), pipelined=True)
+    spin = client.request_async('spin', 'compute', data=b'[0.5]')
+    time.sleep(.05)
+
+    # The service still answers while the action runs
+    cs = CellaservProxy()
+    begin = time.monotonic()
+    assert cs.compute.add(1, 2) == 3
+    assert time.monotonic() - begin < 0.3
+    spin.result(timeout=2)
+
+
+def test_static_method_required():
+    with raises(TypeError):
+        class Bad(Service):
+            @Service.action(executor='process')
+            def compute(self):
+                pass
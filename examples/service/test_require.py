@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
+import socket
 import time
 from multiprocessing import Process
 
 from cellaserv.service import Service
+from cellaserv.testing import FakeBroker
 
 
 class ServiceA(Service):
@@ -64,5 +66,17 @@ def test_require():
     for p in processes:
         p.terminate()
 
+
+def test_no_dependencies():
+    # The broker is stopped: connecting to it is refused
+    with FakeBroker() as broker:
+        pass
+    sock, peer = socket.socketpair()
+    with broker.settings():
+        # Nothing to wait for, the service does not open a second connection
+        ServiceA(sock=sock)
+    sock.close()
+    peer.close()
+
 if __name__ == "__main__":
     test_require()
@@ -0,0 +1,98 @@
+from pytest import raises
+
+from cellaserv.client import ReplyError
+from cellaserv.metrics import Histogram, MetricsReporter, ServiceMetrics
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+from cellaserv.testing import FakeBroker
+
+
+class Test(Service):
+
+    @Service.action
+    def echo(self, x):
+        return x
+
+    @Service.action
+    def fail(self):
+        raise Exception("fail")
+
+
+def test_histogram():
+    histogram = Histogram()
+    for value in (0.000001, 0.0005, 0.0005, 3600 * 24):
+        histogram.record(value)
+
+    stats = histogram.to_dict()
+    assert stats['count'] == 4
+    assert stats['min'] == 0.000001
+    assert stats['max'] == 3600 * 24
+    assert sum(count for _, count in stats['buckets']) == 4
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for i in range(1, 1001):
+        histogram.record(i / 1e6)
+
+    # Buckets are accurate to about 3%
+    assert abs(histogram.percentile(50) - 500e-6) < 500e-6 * 0.04
+    assert abs(histogram.percentile(99) - 990e-6) < 990e-6 * 0.04
+    assert histogram.percentile(100) == 1000e-6
+
+    other = Histogram()
+    other.record(1.)
+    merged = histogram.copy()
+    merged.merge(other)
+    assert merged.count == 1001
+    assert merged.max == 1.
+    assert Histogram.from_dict(merged.to_dict()).counts == merged.counts
+
+    assert merged.since(histogram).count == 1
+
+
+def test_reporter():
+    metrics = ServiceMetrics()
+    reporter = MetricsReporter(metrics)
+    for _ in range(10):
+        metrics.record_action('echo', 0.001)
+    metrics.record_action('echo', 0.001, error=True)
+
+    report = reporter.report()
+    assert report['requests'] == 11
+    assert report['actions']['echo']['errors'] == 1
+    assert report['actions']['echo']['p50'] is not None
+
+    metrics.record_event('tick', 0.0001)
+    report = reporter.report()
+    assert report['requests'] == 0
+    assert report['actions'] == {}
+    assert report['events']['tick']['calls'] == 1
+
+
+def test_stats():
+    with FakeBroker() as broker, broker.settings():
+        broker.serve(Test)
+        cs = CellaservProxy()
+
+        for i in range(3):
+            assert cs.test.echo(i) == i
+        with raises(ReplyError):
+            cs.test.fail()
+
+        stats = cs.test.stats(reset=True)
+        assert stats['actions']['echo']['calls'] == 3
+        assert stats['actions']['echo']['errors'] == 0
+        assert stats['actions']['echo']['latency']['count'] == 3
+        assert stats['actions']['fail']['errors'] == 1
+
+        stats = cs.test.stats()
+        assert 'echo' not in stats['actions']
+
+
+def main():
+    t = Test()
+    t.run()
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,9 @@
 import importlib
+import socket
+
 import cellaserv.settings
+from cellaserv.client import SynClient
+from cellaserv.testing import FakeBroker
 
 
 class TestSettings:
@@ -26,3 +30,17 @@ class TestSettings:
 
     def test_get_socket(self):
         assert cellaserv.settings.get_socket(), "Could not connect to cellaserv"
+
+    def test_get_socket_unix(self, tmpdir):
+        path = str(tmpdir.join('cellaserv.sock'))
+        with FakeBroker(path=path) as broker, broker.settings():
+            sock = cellaserv.settings.get_socket()
+            assert sock.family == socket.AF_UNIX
+            assert SynClient(sock).request('list-services', 'cellaserv')
+
+    def test_get_socket_unix_fallback(self, tmpdir):
+        with FakeBroker() as broker, broker.settings():
+            cellaserv.settings.SOCKET = str(tmpdir.join('missing.sock'))
+            sock = cellaserv.settings.get_socket()
+            assert sock.family != socket.AF_UNIX
+            assert SynClient(sock).request('list-services', 'cellaserv')
@@ -0,0 +1,34 @@
+import json
+import logging
+
+from cellaserv import bench
+
+
+def test_bench_request(tmpdir):
+    output = str(tmpdir.join('results.json'))
+    bench.main(['request', 'bench', 'echo', '--fake', '--rate', '500',
+                '--duration', '.5', '--processes', '2', '--connections', '2',
+                '--data', '[42]', '--json', output])
+
+    with open(output) as f:
+        results = json.load(f)
+    # The rate is shared by the processes
+    assert results['sent'] == 250
+    assert results['completed'] == results['sent']
+    assert results['errors'] == {}
+    percentiles = results['latency']['percentiles']
+    assert percentiles['50'] <= percentiles['99'] <= results['latency']['max']
+
+    # Logging is enabled again once the benchmark is done
+    assert logging.getLogger('cellaserv').isEnabledFor(logging.ERROR)
+
+
+def test_bench_publish(tmpdir):
+    output = str(tmpdir.join('results.json'))
+    bench.main(['publish', 'bench.tick', '--fake', '--rate', '500',
+                '--duration', '.5', '--json', output])
+
+    with open(output) as f:
+        results = json.load(f)
+    assert results['sent'] == 250
+    assert results['completed'] == 250
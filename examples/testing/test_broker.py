@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+
+from pytest import fixture, raises
+
+from cellaserv.client import (
+    NoSuchIdentification,
+    NoSuchMethod,
+    NoSuchService,
+    RequestTimeout,
+    SynClient
+)
+from cellaserv.protobuf.cellaserv_pb2 import Message, Publish
+from cellaserv.proxy import CellaservProxy
+from cellaserv.service import Service
+from cellaserv.settings import get_socket
+from cellaserv.testing import serve_in_thread
+
+
+class Test(Service):
+
+    @Service.action
+    def echo(self, x):
+        return x
+
+    @Service.action
+    def whoami(self):
+        return self.identification
+
+    @Service.action
+    def sleep(self, duration):
+        time.sleep(duration)
+
+
+class Late(Service):
+    pass
+
+
+@Service.require('late')
+class Dependent(Service):
+
+    @Service.action
+    def ping(self):
+        return 'pong'
+
+
+# Timeout of the broker, see examples/conftest.py
+request_timeout = 0.2
+
+
+@fixture(scope='module', autouse=True)
+def services(broker):
+    broker.serve(Test)
+    broker.serve(Test, identification='left')
+
+
+def test_request():
+    cs = CellaservProxy()
+    assert cs.test.echo(42) == 42
+    assert cs.test.whoami() is None
+    assert cs.test['left'].whoami() == 'left'
+
+
+def test_request_errors():
+    cs = CellaservProxy()
+    with raises(NoSuchService):
+        cs.nope.echo(1)
+    with raises(NoSuchIdentification):
+        cs.test['right'].echo(1)
+    with raises(NoSuchMethod):
+        cs.test.nope()
+    with raises(RequestTimeout):
+        cs.test.sleep(.5)
+
+
+def test_list_services():
+    client = SynClient(get_socket())
+    data = json.loads(client.request('list-services', 'cellaserv').decode())
+    names = {(s['Name'], s['Identification']) for s in data}
+    assert ('test', '') in names
+    assert ('test', 'left') in names
+
+
+def test_publish():
+    subscriber = SynClient(get_socket())
+    subscriber.subscribe('tick')
+    subscriber.subscribe('log.*')
+    # Make sure the subscriptions are handled before publishing
+    subscriber.request('list-events', 'cellaserv')
+
+    publisher = SynClient(get_socket())
+    publisher.publish('tick', b'1')
+    publisher.publish('tock', b'2')
+    publisher.publish('log.test', b'3')
+
+    received = []
+    for _ in range(2):
+        msg = subscriber.read_message()
+        assert msg.type == Message.Publish
+        publish = Publish()
+        publish.ParseFromString(msg.content)
+        received.append((publish.event, publish.data))
+    assert received == [('tick', b'1'), ('log.test', b'3')]
+
+
+def test_require(broker):
+    # Dependent waits for late to register
+    dependent = threading.Thread(target=serve_in_thread, args=(Dependent,))
+    dependent.start()
+    time.sleep(.1)
+    assert ('dependent', '') not in broker.services()
+
+    broker.serve(Late)
+    dependent.join()
+    assert broker.wait_for_service('dependent')
+    assert CellaservProxy().dependent.ping() == 'pong'